@@ -0,0 +1,47 @@
+"""对比缓存未命中(小波变换 + 编码并写入缓存)与命中(内存映射读取编码结果)时发送端的耗时
+
+prepare 为创建传输对象的耗时(未命中时包含小波变换, rd 顺序时还包含全部编码), send 为依次取出
+全部数据块的耗时, 不包含接收端的解码与重建。
+
+用法: python -m benchmark.bench_cache --size 4096 --level 5 --order rd
+"""
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+from benchmark.common import generate_xray
+from main import get_parser, create_transmission
+from src.PyramidCache import PyramidCache
+
+def run_session(image, args, cache):
+    start = time.perf_counter()
+    # 屏蔽每个数据块的打印, 避免输出本身影响计时
+    with contextlib.redirect_stdout(io.StringIO()):
+        transmission, block_size, cache_key = create_transmission(image, args, cache=cache)
+        prepared = time.perf_counter()
+        while transmission.transmit_next() is not None:
+            pass
+        transmission.close()
+        if cache_key is not None:
+            cache.store(cache_key, transmission.sent_units, block_size, transmission.tile_size)
+    return prepared - start, time.perf_counter() - prepared, transmission.bytes_sent
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="sender time with a cold and a warm pyramid cache")
+    parser.add_argument("--size", type=int, default=4096, help="the side length of the synthetic 12-bit image")
+    args, rest = parser.parse_known_args()
+    # 其余参数与 main.py 相同, 例如 --wavelet --level --order --tile_size
+    return args, get_parser().parse_args(rest)
+
+if __name__ == '__main__':
+    args, transmission_args = parse_args()
+    image = generate_xray(args.size)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = PyramidCache(cache_dir)
+        results = {mode: run_session(image, transmission_args, cache) for mode in ("miss", "hit")}
+    print(f"{'cache':>5} {'prepare':>9} {'send':>8} {'bytes sent':>12}")
+    for mode, (prepare, send, bytes_sent) in results.items():
+        print(f"{mode:>5} {prepare:>8.3f}s {send:>7.3f}s {bytes_sent:>12}")
+    speedup = sum(results["miss"][:2]) / sum(results["hit"][:2])
+    print(f"a cache hit serves the pyramid {speedup:.1f}x faster")
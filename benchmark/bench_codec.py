@@ -0,0 +1,106 @@
+"""对比 encode_block/decode_block 临时文件实现与内存实现的单块延迟; 指定 --codecs 时改为比较注册的各种编码
+在每个子带上的编解码吞吐量(原始数据 MB/s)与压缩比
+
+用法:
+    python -m benchmark.bench_codec --size 4096 --level 5
+    python -m benchmark.bench_codec --size 4096 --level 5 --codecs jp2 zlib lzma
+    python -m benchmark.bench_codec --size 4096 --level 5 --codecs jp2 zlib --target_psnr 50
+"""
+import argparse
+import tempfile
+import imageio.v2 as imageio
+import numpy as np
+from benchmark.common import generate_xray, timeit
+from src.ImageProcess import ImageTransform
+from utils.util import encode_block, decode_block
+from utils.codec import get_codec, available_codecs
+from utils.quantization import choose_steps
+from utils.wavelet import synthesis_gains
+
+def encode_block_tempfile(block, quality_mode="dB"):
+    """旧版实现: 经 NamedTemporaryFile 写盘再读回"""
+    block_min, block_max = block.min(), block.max()
+    normalized_block = ((block - block_min) / (block_max - block_min) * 65535).astype(np.uint16)
+    with tempfile.NamedTemporaryFile(suffix=".jp2") as temp_file:
+        imageio.imwrite(temp_file.name, normalized_block, format="JP2", quality_mode=quality_mode)
+        with open(temp_file.name, "rb") as f:
+            compressed_data = f.read()
+    return compressed_data, block_min, block_max
+
+def decode_block_tempfile(compressed_data, block_min, block_max):
+    """旧版实现: 写入临时文件后再由 imageio 读取"""
+    with tempfile.NamedTemporaryFile(suffix=".jp2") as temp_file:
+        temp_file.write(compressed_data)
+        temp_file.flush()
+        decompressed_data = imageio.imread(temp_file.name, format="JP2")
+    return decompressed_data.astype(np.float32) / 65535 * (block_max - block_min) + block_min
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="per-block latency of the JPEG2000 codec path")
+    parser.add_argument("--size", type=int, default=4096, help="the side length of the synthetic 12-bit image")
+    parser.add_argument("--wavelet", type=str, default="db6", help="the type of wavelet")
+    parser.add_argument("--level", type=int, default=5, help="the level of wavelet")
+    parser.add_argument("--quality", type=str, choices=["rates", "dB"], default="dB", help="the quality of encode")
+    parser.add_argument("--repeat", type=int, default=3, help="repeat count, the best run is reported")
+    parser.add_argument("--codecs", type=str, nargs="+", choices=available_codecs(), default=None,
+                        help="compare these registered codecs per band instead of the tempfile/memory JPEG2000 paths")
+    parser.add_argument("--target_psnr", type=float, default=None,
+                        help="with --codecs, dead-zone quantize the bands for this PSNR (peak 4095) before encoding")
+    return parser.parse_args()
+
+def compare_codecs(coeffs, args):
+    """按子带比较各编码的编解码吞吐量与压缩比, 最后按编码汇总; 指定 --target_psnr 时先做死区量化
+
+    Args:
+        coeffs: 小波系数
+        args: 命令行参数
+    """
+    steps = {}
+    if args.target_psnr is not None:
+        bands = {(args.level - 1, "LL"): coeffs[args.level - 1][0]}
+        bands.update({(level, block_type): band for level in range(args.level)
+                      for block_type, band in zip(("LH", "HL", "HH"), coeffs[level][1:])})
+        steps = choose_steps(bands, synthesis_gains(args.wavelet, args.level),
+                             sum(band.size for band in bands.values()), target_psnr=args.target_psnr,
+                             integer=np.issubdtype(coeffs[0][1].dtype, np.integer))
+    print(f"{'level':>5} {'band':>4} {'shape':>12} {'codec':>5} {'ratio':>7} {'encode':>12} {'decode':>12}")
+    totals = {codec: np.zeros(4) for codec in args.codecs}
+    for level in range(args.level - 1, -1, -1):
+        for block_type, block in zip(("LL", "LH", "HL", "HH"), coeffs[level]):
+            for name in args.codecs:
+                codec = get_codec(name)
+                step = steps.get((level, block_type))
+                t_enc, encoded = timeit(codec.encode, block, args.quality, step, repeat=args.repeat)
+                t_dec, _ = timeit(codec.decode, *encoded, block.shape, step, repeat=args.repeat)
+                nbytes, compressed_size = block.nbytes, len(encoded[0])
+                totals[name] += (nbytes, compressed_size, t_enc, t_dec)
+                print(f"{level:>5} {block_type:>4} {str(block.shape):>12} {name:>5} {nbytes / compressed_size:>7.3f} "
+                      f"{nbytes / t_enc / 1e6:>7.1f} MB/s {nbytes / t_dec / 1e6:>7.1f} MB/s")
+    for name, (nbytes, compressed_size, t_enc, t_dec) in totals.items():
+        print(f"{'total':>23} {name:>5} {nbytes / compressed_size:>7.3f} {nbytes / t_enc / 1e6:>7.1f} MB/s "
+              f"{nbytes / t_dec / 1e6:>7.1f} MB/s")
+
+if __name__ == '__main__':
+    args = parse_args()
+    image = generate_xray(args.size)
+    coeffs, _ = ImageTransform(image, args.wavelet, args.level).wavelet_transform()
+    if args.codecs is not None:
+        compare_codecs(coeffs, args)
+        raise SystemExit
+
+    print(f"{'level':>5} {'band':>4} {'shape':>12} {'tempfile enc':>13} {'memory enc':>11} "
+          f"{'tempfile dec':>13} {'memory dec':>11}")
+    totals = np.zeros(4)
+    for level in range(args.level - 1, -1, -1):
+        for block_type, block in zip(("LL", "LH", "HL", "HH"), coeffs[level]):
+            t_enc_old, encoded = timeit(encode_block_tempfile, block, args.quality, repeat=args.repeat)
+            t_enc_new, _ = timeit(encode_block, block, args.quality, repeat=args.repeat)
+            t_dec_old, _ = timeit(decode_block_tempfile, *encoded, repeat=args.repeat)
+            t_dec_new, _ = timeit(decode_block, *encoded, repeat=args.repeat)
+            timings = np.array([t_enc_old, t_enc_new, t_dec_old, t_dec_new])
+            totals += timings
+            t = timings * 1000
+            print(f"{level:>5} {block_type:>4} {str(block.shape):>12} {t[0]:>11.1f}ms {t[1]:>9.1f}ms "
+                  f"{t[2]:>11.1f}ms {t[3]:>9.1f}ms")
+    t = totals * 1000
+    print(f"{'total':>23} {t[0]:>11.1f}ms {t[1]:>9.1f}ms {t[2]:>11.1f}ms {t[3]:>9.1f}ms")
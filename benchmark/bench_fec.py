@@ -0,0 +1,93 @@
+"""对比有损链路上三种恢复方式的有效吞吐率(goodput)与得到最终图像的时间
+
+arq 为 LinkSimulator.send 的按序超时重传, 数据块切分为与其余两种方式相同大小的数据包逐个发送;
+selective 为带校验和的数据包加选择性重传; fec 在 selective 的基础上每 --fec_group 个数据包附加一个
+XOR 校验包。goodput 为数据块帧体的比特数除以最终图像的时间, overhead 为包头、校验包与重传的字节数
+占数据块帧体的比例, 每个丢包率取 --repeat 个随机种子的平均值。selective/fec 交付的数据块与发送的
+数据块逐字节比较。
+
+用法: python -m benchmark.bench_fec --size 2048 --latency 0.05 --fec_group 8
+"""
+import argparse
+import numpy as np
+from benchmark.common import generate_xray
+from src.ErrorCorrection import SelectiveRepeatSession
+from src.ImageProcess import ImageTransform
+from src.LinkSimulator import LinkSimulator
+from src.Protocol import pack_block_body
+from src.Transmission import ProgressiveTransmission
+
+def encode_blocks(args):
+    image = generate_xray(args.size)
+    coeffs, _ = ImageTransform(image, args.wavelet, args.level).wavelet_transform()
+    transmission = ProgressiveTransmission(coeffs, args.level, quality=args.quality, tile_size=args.tile_size)
+    return list(iter(transmission.transmit_next, None))
+
+def run_arq(blocks, args, loss_rate, seed):
+    link = LinkSimulator(args.link_rate, args.latency, args.jitter, loss_rate, seed=seed,
+                         corrupt_rate=args.corrupt_rate)
+    # 与 SelectiveRepeatSession 的数据包大小相同
+    fragment_size = SelectiveRepeatSession(link, mtu=args.mtu).fragment_size
+    payload, sent, first = 0, 0, None
+    for encoded_block in blocks:
+        body = pack_block_body(encoded_block)
+        payload += len(body)
+        for offset in range(0, len(body), fragment_size):
+            size = min(fragment_size, len(body) - offset) + args.mtu - fragment_size
+            arrival = link.send(size, encoded_block.level, encoded_block.block_type, encoded_block.tile_index)
+            sent += size * link.timeline[-1]["attempts"]
+        first = arrival if first is None else first
+    final = link.time_to_complete()
+    return {"goodput": payload * 8 / final, "overhead": (sent - payload) / payload,
+            "time_to_first_image": first, "time_to_complete": final, "recovered": 0}
+
+def run_selective(blocks, args, loss_rate, seed, group_size):
+    link = LinkSimulator(args.link_rate, args.latency, args.jitter, loss_rate, seed=seed,
+                         corrupt_rate=args.corrupt_rate)
+    session = SelectiveRepeatSession(link, group_size, args.mtu)
+    delivered = session.run(blocks)
+    expected = {(block.level, block.block_type, block.tile_index): bytes(block.compressed_data) for block in blocks}
+    received = {(block.level, block.block_type, block.tile_index): bytes(block.compressed_data)
+                for _, block in delivered}
+    if len(delivered) != len(blocks) or received != expected:
+        raise ValueError(f"Delivered blocks differ from the sent blocks at loss rate {loss_rate}.")
+    return session.summary()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="goodput of ARQ, selective retransmission and XOR FEC on a lossy link")
+    parser.add_argument("--size", type=int, default=2048, help="the side length of the synthetic 12-bit image")
+    parser.add_argument("--wavelet", type=str, default="db6", help="the type of wavelet")
+    parser.add_argument("--level", type=int, default=5, help="the level of wavelet")
+    parser.add_argument("--quality", type=str, choices=["rates", "dB"], default="dB", help="the quality of encode")
+    parser.add_argument("--tile_size", type=int, default=256, help="the tile size of large subbands")
+    parser.add_argument("--link_rate", type=float, default=16e6, help="link rate in bits per second")
+    parser.add_argument("--latency", type=float, default=0.05, help="one-way link latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="link latency jitter in seconds")
+    parser.add_argument("--loss_rates", type=float, nargs="+", default=[0.0, 0.01, 0.02, 0.03, 0.05],
+                        help="the packet loss probabilities to measure")
+    parser.add_argument("--corrupt_rate", type=float, default=0.0, help="the probability of a bit error per packet")
+    parser.add_argument("--mtu", type=int, default=1400, help="the largest packet in bytes")
+    parser.add_argument("--fec_group", type=int, default=8, help="the number of packets per XOR parity packet")
+    parser.add_argument("--repeat", type=int, default=3, help="the number of random seeds averaged per loss rate")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    blocks = encode_blocks(args)
+    payload = sum(len(pack_block_body(block)) for block in blocks)
+    print(f"{len(blocks)} blocks, {payload} bytes, link {args.link_rate / 1e6:.1f} Mbps, "
+          f"latency {args.latency * 1000:.0f} ms")
+
+    modes = {
+        "arq": lambda loss_rate, seed: run_arq(blocks, args, loss_rate, seed),
+        "selective": lambda loss_rate, seed: run_selective(blocks, args, loss_rate, seed, None),
+        f"fec/{args.fec_group}": lambda loss_rate, seed: run_selective(blocks, args, loss_rate, seed, args.fec_group),
+    }
+    keys = ("goodput", "overhead", "time_to_first_image", "time_to_complete", "recovered")
+    print(f"{'loss':>5} {'mode':>10} {'goodput':>13} {'overhead':>9} {'first':>8} {'final':>8} {'recovered':>9}")
+    for loss_rate in args.loss_rates:
+        for mode, run in modes.items():
+            results = [run(loss_rate, seed) for seed in range(args.repeat)]
+            goodput, overhead, first, final, recovered = (np.mean([result[key] for result in results]) for key in keys)
+            print(f"{loss_rate:>5.0%} {mode:>10} {goodput / 1e6:>8.2f} Mbps {overhead:>9.1%} {first:>7.3f}s "
+                  f"{final:>7.3f}s {recovered:>9.1f}")
@@ -0,0 +1,72 @@
+"""对比整幅读入与流式读取(内存映射 + 按行条带小波变换)时发送端的峰值内存与耗时(仅 Linux)
+
+合成图像先在独立子进程中生成并保存为 .npy, 每种模式再在新的子进程中读取图像、进行小波变换并
+编码全部分块, 统计相对于导入完成后的 VmHWM 增量。VmHWM 包含已映射文件的驻留页, 这部分在
+内存紧张时可以被内核回收, 因此流式模式的结果偏保守。
+
+用法: python -m benchmark.bench_ingest --size 16384 --level 5 --tile_size 1024
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing as mp
+import os
+import tempfile
+import time
+import numpy as np
+from benchmark.common import generate_xray
+from benchmark.bench_memory import read_status_kb, reset_peak_rss
+from src.ImageProcess import ImageTransform, StreamingImageTransform, open_source_image
+from src.Transmission import ProgressiveTransmission
+
+def save_image(size, path):
+    np.save(path, generate_xray(size))
+
+def measure(mode, path, args, result):
+    reset_peak_rss()
+    baseline = read_status_kb("VmRSS")
+    start = time.perf_counter()
+    if mode == "stream":
+        image = open_source_image(path, work_dir=args.work_dir)
+        transformer = StreamingImageTransform(image, args.wavelet, args.level, args.strip_rows, args.work_dir)
+    else:
+        image = np.load(path)
+        transformer = ImageTransform(image, args.wavelet, args.level)
+    # 屏蔽每个数据块的打印, 避免输出本身影响计时
+    with contextlib.redirect_stdout(io.StringIO()):
+        coeffs, _ = transformer.wavelet_transform()
+        transmission = ProgressiveTransmission(coeffs, args.level, quality=args.quality, tile_size=args.tile_size)
+        del coeffs, transformer
+        while transmission.transmit_next() is not None:
+            pass
+    result.put((read_status_kb("VmHWM") - baseline, time.perf_counter() - start, transmission.bytes_sent))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="peak RSS of in-memory vs streaming ingest")
+    parser.add_argument("--size", type=int, default=16384, help="the side length of the synthetic 12-bit image")
+    parser.add_argument("--wavelet", type=str, default="db6", help="the type of wavelet")
+    parser.add_argument("--level", type=int, default=5, help="the level of wavelet")
+    parser.add_argument("--quality", type=str, choices=["rates", "dB"], default="dB", help="the quality of encode")
+    parser.add_argument("--tile_size", type=int, default=1024, help="the tile size of large subbands")
+    parser.add_argument("--strip_rows", type=int, default=256, help="the coefficient rows per strip")
+    parser.add_argument("--work_dir", type=str, default=None, help="the directory of the temporary files")
+    parser.add_argument("--modes", type=str, nargs="+", default=["memory", "stream"], help="modes to measure")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as image_dir:
+        path = os.path.join(image_dir, "xray.npy")
+        process = mp.Process(target=save_image, args=(args.size, path))
+        process.start()
+        process.join()
+
+        print(f"{args.size}x{args.size} 12-bit, {args.wavelet}, {args.level} levels, tile size {args.tile_size}")
+        print(f"{'mode':>7} {'peak RSS':>12} {'time':>9} {'bytes sent':>12}")
+        for mode in args.modes:
+            result = mp.Queue()
+            process = mp.Process(target=measure, args=(mode, path, args, result))
+            process.start()
+            peak_kb, elapsed, bytes_sent = result.get()
+            process.join()
+            print(f"{mode:>7} {peak_kb / 1024:>8.1f} MiB {elapsed:>8.3f}s {bytes_sent:>12}")
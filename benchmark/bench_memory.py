@@ -0,0 +1,55 @@
+"""测量接收端一次完整会话的峰值内存(仅 Linux, 读取 /proc/self/status 中的 VmHWM)
+
+每个尺寸在独立子进程中运行, 先完成图像生成与小波变换, 重置峰值后再统计
+ImageReconstruction 分配系数、逐块写入与重建带来的峰值增量。
+
+用法: python -m benchmark.bench_memory --sizes 4096 8192
+"""
+import argparse
+import multiprocessing as mp
+from benchmark.common import generate_xray
+from src.ImageProcess import ImageTransform
+from src.ImageReconstruction import ImageReconstruction
+
+def read_status_kb(key):
+    """读取 /proc/self/status 中以 kB 为单位的字段"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(key + ":"):
+                return int(line.split()[1])
+    raise KeyError(key)
+
+def reset_peak_rss():
+    """将 VmHWM 重置为当前 RSS"""
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+
+def measure(size, wavelet, level, result):
+    image = generate_xray(size)
+    coeffs, block_size = ImageTransform(image, wavelet, level).wavelet_transform()
+    reset_peak_rss()
+    baseline = read_status_kb("VmRSS")
+
+    reconstruction = ImageReconstruction(image, block_size, level, wavelet)
+    for level_idx in range(level - 1, -1, -1):
+        for block_type, block in zip(("LL", "LH", "HL", "HH"), coeffs[level_idx]):
+            reconstruction.place_block(level_idx, block_type, block)
+    reconstruction.reconstruct_image()
+    result.put(read_status_kb("VmHWM") - baseline)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="peak RSS of the receiver coefficient store")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[4096, 8192], help="image side lengths")
+    parser.add_argument("--wavelet", type=str, default="db6", help="the type of wavelet")
+    parser.add_argument("--level", type=int, default=5, help="the level of wavelet")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    for size in args.sizes:
+        result = mp.Queue()
+        process = mp.Process(target=measure, args=(size, args.wavelet, args.level, result))
+        process.start()
+        peak_kb = result.get()
+        process.join()
+        print(f"{size}x{size}: receiver peak RSS increase {peak_kb / 1024:.1f} MiB")
@@ -0,0 +1,60 @@
+"""对比同步编码与后台编码流水线的首次成像时间和细化间隔
+
+接收端在每个数据块到达后进行解码与增量重建; 指定 --link_rate 时额外按链路速率 sleep 模拟传输时间。
+
+用法: python -m benchmark.bench_pipeline --size 4096 --level 5 --workers 4 [--tile_size 512]
+"""
+import argparse
+import os
+import time
+import numpy as np
+from benchmark.common import generate_xray
+from src.ImageProcess import ImageTransform
+from src.Transmission import ProgressiveTransmission
+from src.ImageReconstruction import ImageReconstruction
+
+def run_session(image, coeffs, block_size, args, workers, executor):
+    transmission = ProgressiveTransmission(coeffs, args.level, quality=args.quality, schedule="compact",
+                                           workers=workers, prefetch=args.prefetch, executor=executor,
+                                           tile_size=args.tile_size)
+    reconstruction = ImageReconstruction(image, block_size, args.level, args.wavelet, args.tile_size)
+    start = time.perf_counter()
+    arrivals = []
+    while True:
+        encoded_block = transmission.transmit_next()
+        if encoded_block is None:
+            break
+        if args.link_rate > 0:
+            time.sleep(len(encoded_block.compressed_data) * 8 / args.link_rate)
+        level, block_type, restored_data, tile_index = transmission.decode_received_data(encoded_block)
+        reconstruction.place_block(level, block_type, restored_data, tile_index)
+        reconstruction.reconstruct_image()
+        arrivals.append(time.perf_counter() - start)
+    transmission.close()
+    return np.array(arrivals)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="synchronous vs pipelined block encoding")
+    parser.add_argument("--size", type=int, default=4096, help="the side length of the synthetic 12-bit image")
+    parser.add_argument("--wavelet", type=str, default="db6", help="the type of wavelet")
+    parser.add_argument("--level", type=int, default=5, help="the level of wavelet")
+    parser.add_argument("--quality", type=str, choices=["rates", "dB"], default="dB", help="the quality of encode")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="the number of background encode workers")
+    parser.add_argument("--prefetch", type=int, default=None, help="the max number of blocks encoded ahead")
+    parser.add_argument("--tile_size", type=int, default=None, help="the tile size of large subbands")
+    parser.add_argument("--link_rate", type=float, default=0, help="link rate in bits per second, 0 disables the sleep")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    image = generate_xray(args.size)
+    coeffs, block_size = ImageTransform(image, args.wavelet, args.level).wavelet_transform()
+
+    configs = [("sync", 0, "thread"), ("thread", args.workers, "thread"), ("process", args.workers, "process")]
+    print(f"cpu count: {os.cpu_count()}, workers: {args.workers}")
+    print(f"{'mode':>8} {'first image':>12} {'mean interval':>14} {'max interval':>13} {'final image':>12}")
+    for name, workers, executor in configs:
+        arrivals = run_session(image, coeffs, block_size, args, workers, executor)
+        intervals = np.diff(arrivals)
+        print(f"{name:>8} {arrivals[0]:>11.3f}s {intervals.mean():>13.3f}s {intervals.max():>12.3f}s "
+              f"{arrivals[-1]:>11.3f}s")
@@ -0,0 +1,69 @@
+"""对比固定层级顺序与率失真优化顺序的 MSE-字节曲线
+
+每个数据块到达后记录累计字节数与 ImageReconstruction.mse_losses, 以梯形法计算 MSE 对累计字节数
+(归一化到总字节数)的曲线下面积, 面积越小表示链路的前段带来的失真下降越多。early mse 为传输
+前 10% 字节时的 MSE。
+
+用法: python -m benchmark.bench_rd --size 2048 --level 5 --tile_size 128
+"""
+import argparse
+import numpy as np
+from benchmark.common import generate_xray
+from src.ImageProcess import ImageTransform
+from src.Transmission import ProgressiveTransmission
+from src.ImageReconstruction import ImageReconstruction
+from src.DisplaySink import NullSink
+
+def run_session(image, coeffs, block_size, args, order):
+    transmission = ProgressiveTransmission(coeffs, args.level, quality=args.quality, schedule=args.schedule,
+                                           tile_size=args.tile_size, bitplane_passes=args.bitplane_passes,
+                                           order=order, wavelet=args.wavelet)
+    reconstruction = ImageReconstruction(image, block_size, args.level, args.wavelet, args.tile_size, NullSink())
+    # 起点: 尚未收到任何数据时接收端的图像全为 0
+    bytes_list = [0]
+    mse_list = [float(np.mean(np.float32(image) ** 2))]
+    while True:
+        encoded_block = transmission.transmit_next()
+        if encoded_block is None:
+            break
+        level, block_type, restored_data, tile_index = transmission.decode_received_data(encoded_block)
+        reconstruction.add_received_block(level, block_type, restored_data, tile_index)
+        bytes_list.append(transmission.bytes_sent)
+    transmission.close()
+    mse_list.extend(reconstruction.mse_losses)
+    return np.array(bytes_list, dtype=np.float64), np.array(mse_list, dtype=np.float64)
+
+def curve_area(bytes_list, mse_list):
+    """MSE 对归一化累计字节数的曲线下面积(梯形法)"""
+    x = bytes_list / bytes_list[-1]
+    return float(np.sum(np.diff(x) * (mse_list[1:] + mse_list[:-1]) / 2))
+
+def mse_at(bytes_list, mse_list, fraction):
+    """传输了 fraction 比例的字节时接收端的 MSE"""
+    index = np.searchsorted(bytes_list, fraction * bytes_list[-1], side="right") - 1
+    return float(mse_list[index])
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="area under the MSE-vs-bytes curve per transmission order")
+    parser.add_argument("--size", type=int, default=2048, help="the side length of the synthetic 12-bit image")
+    parser.add_argument("--wavelet", type=str, default="db6", help="the type of wavelet")
+    parser.add_argument("--level", type=int, default=5, help="the level of wavelet")
+    parser.add_argument("--quality", type=str, choices=["rates", "dB"], default="dB", help="the quality of encode")
+    parser.add_argument("--schedule", type=str, choices=["full", "compact"], default="compact",
+                        help="the transmission schedule")
+    parser.add_argument("--tile_size", type=int, default=128, help="the tile size of large subbands")
+    parser.add_argument("--bitplane_passes", type=int, default=None, help="the number of bit-plane passes")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    image = generate_xray(args.size)
+    coeffs, block_size = ImageTransform(image, args.wavelet, args.level).wavelet_transform()
+
+    results = {order: run_session(image, coeffs, block_size, args, order) for order in ("level", "rd")}
+    print(f"{'order':>6} {'blocks':>6} {'bytes sent':>12} {'area':>10} {'early mse':>10} {'final mse':>10}")
+    for order, (bytes_list, mse_list) in results.items():
+        print(f"{order:>6} {len(bytes_list) - 1:>6} {int(bytes_list[-1]):>12} {curve_area(bytes_list, mse_list):>10.4f} "
+              f"{mse_at(bytes_list, mse_list, 0.1):>10.4f} {mse_list[-1]:>10.4f}")
+    ratio = curve_area(*results["rd"]) / curve_area(*results["level"])
+    print(f"rd order reduces the area under the MSE-vs-bytes curve by {(1 - ratio) * 100:.1f}%")
@@ -0,0 +1,65 @@
+"""对比逐块接收时完整重建、增量重建与低分辨率预览(ImageReconstruction.render)的耗时
+
+用法: python -m benchmark.bench_reconstruction --size 4096 --level 5
+"""
+import argparse
+import time
+import numpy as np
+from benchmark.common import generate_xray
+from src.ImageProcess import ImageTransform
+from src.ImageReconstruction import ImageReconstruction
+from src.DisplaySink import Preview, upscale
+from utils.wavelet import approximation_offset
+
+def run_session(image, coeffs, block_size, level, wavelet, mode):
+    """按传输顺序逐块写入未经编码的系数, 每块之后重建一次
+
+    Args:
+        mode: "full" 每次从最深层完整重建, "incremental" 增量重建到原图尺寸,
+            "preview" 增量重建到已有细节的最浅层级并放大到原图尺寸
+
+    Returns:
+        step_times: 每一步重建的耗时（秒）
+        final_image: 最终重建结果
+    """
+    reconstruction = ImageReconstruction(image, block_size, level, wavelet)
+    step_times = []
+    final_image = None
+    for level_idx in range(level - 1, -1, -1):
+        for block_type, block in zip(("LL", "LH", "HL", "HH"), coeffs[level_idx]):
+            reconstruction.place_block(level_idx, block_type, block)
+            start = time.perf_counter()
+            if mode == "preview":
+                final_image, resolution = reconstruction.render()
+                if resolution > 0:
+                    final_image = upscale(final_image, Preview(reconstruction.image_shape, 2 ** resolution,
+                                                               approximation_offset(wavelet, resolution)))
+            else:
+                final_image = reconstruction.reconstruct_image(incremental=mode == "incremental")
+            step_times.append(time.perf_counter() - start)
+    return step_times, final_image
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="incremental vs full inverse-DWT reconstruction")
+    parser.add_argument("--size", type=int, default=4096, help="the side length of the synthetic 12-bit image")
+    parser.add_argument("--wavelet", type=str, default="db6", help="the type of wavelet")
+    parser.add_argument("--level", type=int, default=5, help="the level of wavelet")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    image = generate_xray(args.size)
+    coeffs, block_size = ImageTransform(image, args.wavelet, args.level).wavelet_transform()
+
+    full_times, full_image = run_session(image, coeffs, block_size, args.level, args.wavelet, "full")
+    incr_times, incr_image = run_session(image, coeffs, block_size, args.level, args.wavelet, "incremental")
+    preview_times, preview_image = run_session(image, coeffs, block_size, args.level, args.wavelet, "preview")
+
+    print(f"{'step':>4} {'full':>10} {'incremental':>12} {'preview':>10}")
+    for step, (t_full, t_incr, t_preview) in enumerate(zip(full_times, incr_times, preview_times)):
+        print(f"{step:>4} {t_full * 1000:>8.1f}ms {t_incr * 1000:>10.1f}ms {t_preview * 1000:>8.1f}ms")
+    total_full, total_incr, total_preview = sum(full_times), sum(incr_times), sum(preview_times)
+    print(f"total: full {total_full:.3f}s, incremental {total_incr:.3f}s, preview {total_preview:.3f}s, "
+          f"saved {(1 - total_incr / total_full) * 100:.1f}% / {(1 - total_preview / total_full) * 100:.1f}%")
+    print(f"max abs difference of final images: {np.abs(full_image - incr_image).max():.3e}, "
+          f"{np.abs(full_image - preview_image).max():.3e}")
@@ -0,0 +1,62 @@
+"""对比整幅图像传输与感兴趣区域优先传输时, 感兴趣区域达到诊断质量所需的时间
+
+每个数据块在 LinkSimulator 模拟链路上的到达时刻与接收端记录的 roi_mse_losses 对应, 感兴趣区域的
+PSNR(峰值 4095)首次达到 --target_psnr 的到达时刻即为达到诊断质量的时间。
+
+用法: python -m benchmark.bench_roi --size 4096 --level 5 --roi 1024 1024 1536 1536
+"""
+import argparse
+import numpy as np
+from benchmark.common import generate_xray
+from src.ImageProcess import ImageTransform
+from src.Transmission import ProgressiveTransmission
+from src.ImageReconstruction import ImageReconstruction
+from src.LinkSimulator import LinkSimulator
+from src.DisplaySink import NullSink
+
+def run_session(image, coeffs, block_size, args, roi):
+    link = LinkSimulator(args.link_rate, args.latency, seed=0)
+    transmission = ProgressiveTransmission(coeffs, args.level, quality=args.quality, schedule="compact",
+                                           tile_size=args.tile_size, link=link, wavelet=args.wavelet, roi=roi)
+    # 两种方式都在接收端统计同一区域的 MSE
+    reconstruction = ImageReconstruction(image, block_size, args.level, args.wavelet, transmission.tile_size,
+                                         NullSink(), args.roi)
+    while True:
+        encoded_block = transmission.transmit_next()
+        if encoded_block is None:
+            break
+        level, block_type, restored_data, tile_index = transmission.decode_received_data(encoded_block)
+        reconstruction.add_received_block(level, block_type, restored_data, tile_index)
+    transmission.close()
+    arrivals = np.array([entry["arrival"] for entry in link.timeline])
+    psnr = 10 * np.log10(4095 ** 2 / np.maximum(np.array(reconstruction.roi_mse_losses), 1e-12))
+    reached = np.nonzero(psnr >= args.target_psnr)[0]
+    diagnostic = arrivals[reached[0]] if reached.size else float("nan")
+    return len(arrivals), transmission.bytes_sent, diagnostic, link.time_to_complete(), psnr[-1]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="time until the region of interest reaches diagnostic quality")
+    parser.add_argument("--size", type=int, default=4096, help="the side length of the synthetic 12-bit image")
+    parser.add_argument("--wavelet", type=str, default="db6", help="the type of wavelet")
+    parser.add_argument("--level", type=int, default=5, help="the level of wavelet")
+    parser.add_argument("--quality", type=str, choices=["rates", "dB"], default="dB", help="the quality of encode")
+    parser.add_argument("--tile_size", type=int, default=128, help="the tile size of large subbands")
+    parser.add_argument("--roi", type=int, nargs=4, default=[1024, 1024, 1536, 1536],
+                        metavar=("X0", "Y0", "X1", "Y1"), help="the region of interest in pixels")
+    parser.add_argument("--target_psnr", type=float, default=45.0, help="the ROI PSNR regarded as diagnostic")
+    parser.add_argument("--link_rate", type=float, default=16e6, help="link rate in bits per second")
+    parser.add_argument("--latency", type=float, default=0.05, help="one-way link latency in seconds")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    image = generate_xray(args.size)
+    coeffs, block_size = ImageTransform(image, args.wavelet, args.level).wavelet_transform()
+
+    results = {mode: run_session(image, coeffs, block_size, args, roi)
+               for mode, roi in (("full", None), ("roi", args.roi))}
+    print(f"{'mode':>5} {'blocks':>6} {'bytes sent':>12} {'roi ready':>10} {'final':>8} {'roi psnr':>9}")
+    for mode, (blocks, bytes_sent, diagnostic, final, psnr) in results.items():
+        print(f"{mode:>5} {blocks:>6} {bytes_sent:>12} {diagnostic:>9.2f}s {final:>7.2f}s {psnr:>8.2f}dB")
+    ratio = results["roi"][2] / results["full"][2]
+    print(f"the region of interest reaches {args.target_psnr:.0f} dB in {ratio * 100:.1f}% of the full-image time")
@@ -0,0 +1,60 @@
+"""对比 full 与 compact 两种传输计划的总传输字节数与得到最终图像的时间
+
+processing 为发送端编码、接收端解码与重建的实际耗时, first/final 为 LinkSimulator 模拟链路上
+第一次近似图像与最终图像的到达时间。
+
+用法: python -m benchmark.bench_schedule --size 4096 --level 5
+"""
+import argparse
+import time
+from benchmark.common import generate_xray
+from src.ImageProcess import ImageTransform
+from src.Transmission import ProgressiveTransmission
+from src.ImageReconstruction import ImageReconstruction
+from src.LinkSimulator import LinkSimulator
+
+def run_session(image, coeffs, block_size, args, schedule):
+    link = LinkSimulator(args.link_rate, args.latency, args.jitter, args.loss_rate, seed=0)
+    transmission = ProgressiveTransmission(coeffs, args.level, quality=args.quality, schedule=schedule,
+                                           tile_size=args.tile_size, link=link)
+    reconstruction = ImageReconstruction(image, block_size, args.level, args.wavelet, args.tile_size)
+    start = time.perf_counter()
+    blocks = 0
+    while True:
+        encoded_block = transmission.transmit_next()
+        if encoded_block is None:
+            break
+        level, block_type, restored_data, tile_index = transmission.decode_received_data(encoded_block)
+        reconstruction.place_block(level, block_type, restored_data, tile_index)
+        reconstruction.reconstruct_image()
+        blocks += 1
+    elapsed = time.perf_counter() - start
+    mse = reconstruction.calculate_mse(reconstruction.origin_image, reconstruction.reconstruct_image())
+    return blocks, transmission.bytes_sent, elapsed, link.time_to_first_image(), link.time_to_complete(), mse
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="bytes and time-to-final-image per transmission schedule")
+    parser.add_argument("--size", type=int, default=4096, help="the side length of the synthetic 12-bit image")
+    parser.add_argument("--wavelet", type=str, default="db6", help="the type of wavelet")
+    parser.add_argument("--level", type=int, default=5, help="the level of wavelet")
+    parser.add_argument("--quality", type=str, choices=["rates", "dB"], default="dB", help="the quality of encode")
+    parser.add_argument("--tile_size", type=int, default=None, help="the tile size of large subbands")
+    parser.add_argument("--link_rate", type=float, default=16e6, help="link rate in bits per second")
+    parser.add_argument("--latency", type=float, default=0.05, help="one-way link latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="link latency jitter in seconds")
+    parser.add_argument("--loss_rate", type=float, default=0.0, help="packet loss probability")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    image = generate_xray(args.size)
+    coeffs, block_size = ImageTransform(image, args.wavelet, args.level).wavelet_transform()
+
+    results = {schedule: run_session(image, coeffs, block_size, args, schedule) for schedule in ("full", "compact")}
+    print(f"{'schedule':>8} {'blocks':>6} {'bytes sent':>12} {'processing':>11} {'first':>8} {'final':>8} "
+          f"{'final mse':>10}")
+    for schedule, (blocks, bytes_sent, elapsed, first, final, mse) in results.items():
+        print(f"{schedule:>8} {blocks:>6} {bytes_sent:>12} {elapsed:>10.2f}s {first:>7.2f}s {final:>7.2f}s "
+              f"{mse:>10.4f}")
+    saved = 1 - results["compact"][1] / results["full"][1]
+    print(f"compact schedule saves {saved * 100:.1f}% of the payload")
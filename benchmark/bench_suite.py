@@ -0,0 +1,244 @@
+"""传输与重建流水线的可复现性能测试, 结果保存为 JSON, 并可以比较两次运行找出性能退化
+
+对每个 (图像尺寸, 小波, 层数) 组合, 使用固定随机种子生成的合成 12 位图像, 分别测量:
+    wavelet_transform   ImageTransform.wavelet_transform
+    encode_block        compact 计划中全部子带的编码, --codecs 中的每种编码各测一次
+    decode_block        上述子带的解码
+    transmit_next       ProgressiveTransmission 依次取出全部数据块(同步编码)
+    reconstruct_image   写入全部系数后从最深层完整重建
+每项重复 --repeat 次取最短耗时, 同时记录中位数与吞吐量(原始数据 MB/s); 编解码项另外记录压缩比。
+
+用法:
+    python -m benchmark.bench_suite --sizes 512 1024 2048 --output before.json
+    python -m benchmark.bench_suite --sizes 512 1024 2048 --output after.json
+    python -m benchmark.bench_suite --compare before.json after.json --threshold 0.1
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+import pywt
+from benchmark.common import generate_xray
+from src.ImageProcess import ImageTransform
+from src.Transmission import ProgressiveTransmission
+from src.ImageReconstruction import ImageReconstruction
+from src.DisplaySink import NullSink
+from utils.codec import get_codec, available_codecs
+
+def measure(func, repeat):
+    """多次运行函数, 返回最短耗时、耗时中位数与最后一次的返回值
+
+    Args:
+        func: 被计时的无参函数
+        repeat: 重复次数
+
+    Returns:
+        best: 最短耗时（秒）
+        median: 耗时中位数（秒）
+        result: 函数返回值
+    """
+    times, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), float(np.median(times)), result
+
+def compact_bands(coeffs, level):
+    """compact 计划传输的子带: 最深一层的 LL 与每一层的 LH/HL/HH
+
+    Returns:
+        bands: [(level, block_type, data), ...]
+    """
+    bands = []
+    for level_idx in range(level - 1, -1, -1):
+        LL, LH, HL, HH = coeffs[level_idx]
+        if level_idx == level - 1:
+            bands.append((level_idx, "LL", LL))
+        bands.extend([(level_idx, "LH", LH), (level_idx, "HL", HL), (level_idx, "HH", HH)])
+    return bands
+
+def run_config(size, wavelet, level, args):
+    """测量一个 (尺寸, 小波, 层数) 组合的各个阶段
+
+    Returns:
+        results: [{"name", "codec", "size", "wavelet", "level", "seconds", "median", "nbytes", "throughput"}, ...],
+            编解码项还包含 "ratio"
+    """
+    image = generate_xray(size, args.seed)
+    coeffs, block_size = ImageTransform(image, wavelet, level).wavelet_transform()
+    bands = compact_bands(coeffs, level)
+    raw_bytes = sum(data.nbytes for _, _, data in bands)
+
+    def encode_all(codec):
+        return [codec.encode(data, args.quality) for _, _, data in bands]
+
+    def decode_all(codec, encoded_bands):
+        return [codec.decode(*encoded, data.shape) for encoded, (_, _, data) in zip(encoded_bands, bands)]
+
+    def transmit_all():
+        transmission = ProgressiveTransmission(coeffs, level, quality=args.quality, schedule="compact",
+                                               tile_size=args.tile_size)
+        while transmission.transmit_next() is not None:
+            pass
+        transmission.close()
+        return transmission.bytes_sent
+
+    reconstruction = ImageReconstruction(None, block_size, level, wavelet, sink=NullSink())
+    for level_idx, block_type, data in bands:
+        reconstruction.place_block(level_idx, block_type, data)
+
+    stages = [("wavelet_transform", "jp2", lambda: ImageTransform(image, wavelet, level).wavelet_transform(),
+               image.nbytes)]
+    for codec_name in args.codecs:
+        codec = get_codec(codec_name)
+        stages.append(("encode_block", codec_name, lambda codec=codec: encode_all(codec), raw_bytes))
+        stages.append(("decode_block", codec_name, lambda codec=codec: decode_all(codec, encoded[codec.name]),
+                       raw_bytes))
+    stages.append(("transmit_next", "jp2", transmit_all, raw_bytes))
+    stages.append(("reconstruct_image", "jp2", lambda: reconstruction.reconstruct_image(incremental=False),
+                   image.nbytes))
+    results = []
+    encoded = {}
+    for name, codec_name, func, nbytes in stages:
+        best, median, result = measure(func, args.repeat)
+        extra = {}
+        if name == "encode_block":
+            encoded[codec_name] = result
+            extra["ratio"] = raw_bytes / sum(len(compressed_data) for compressed_data, _, _ in result)
+        results.append({
+            "name": name,
+            "codec": codec_name,
+            "size": size,
+            "wavelet": wavelet,
+            "level": level,
+            "seconds": best,
+            "median": median,
+            "nbytes": nbytes,
+            "throughput": nbytes / best / 1e6 if best > 0 else None,
+            **extra,
+        })
+    return results
+
+def environment():
+    """运行环境信息, 比较两次运行时用于确认结果可比"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pywt": pywt.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+def run_suite(args):
+    """运行全部组合
+
+    Returns:
+        report: {"meta": {...}, "results": [...]}
+    """
+    results = []
+    for size in args.sizes:
+        for wavelet in args.wavelets:
+            for level in args.levels:
+                # 屏蔽小波变换与每个数据块的打印, 避免输出本身影响计时
+                with contextlib.redirect_stdout(io.StringIO()):
+                    config_results = run_config(size, wavelet, level, args)
+                results.extend(config_results)
+                for result in config_results:
+                    ratio = f" ratio {result['ratio']:.3f}" if "ratio" in result else ""
+                    print(f"{result['name']:>18} {result['codec']:>5} {size:>6} {wavelet:>6} {level:>3} "
+                          f"{result['seconds']:>9.4f}s {result['throughput']:>9.1f} MB/s{ratio}")
+    meta = {**environment(), "seed": args.seed, "repeat": args.repeat, "quality": args.quality,
+            "tile_size": args.tile_size, "codecs": args.codecs}
+    return {"meta": meta, "results": results}
+
+def compare(baseline, current, threshold, min_delta=0.0):
+    """比较两次运行, 按最短耗时之比标出退化与提升
+
+    Args:
+        baseline: 基准运行的 report
+        current: 当前运行的 report
+        threshold: 耗时变化超过该比例时视为退化或提升
+        min_delta: 耗时变化的绝对值不超过该值（秒）时视为计时噪声
+
+    Returns:
+        regressions: 退化的测试项数
+    """
+    def key(result):
+        # 加入编码名称之前保存的结果只有 JPEG2000
+        return result["name"], result.get("codec", "jp2"), result["size"], result["wavelet"], result["level"]
+
+    base_results = {key(result): result for result in baseline["results"]}
+    regressions = 0
+    print(f"baseline {baseline['meta'].get('commit')} vs current {current['meta'].get('commit')}, "
+          f"threshold {threshold * 100:.0f}%")
+    print(f"{'stage':>18} {'codec':>5} {'size':>6} {'wavelet':>7} {'level':>5} {'baseline':>10} {'current':>10} "
+          f"{'change':>8}")
+    for result in current["results"]:
+        base = base_results.get(key(result))
+        if base is None:
+            continue
+        ratio = result["seconds"] / base["seconds"]
+        if abs(result["seconds"] - base["seconds"]) <= min_delta:
+            status = ""
+        elif ratio > 1 + threshold:
+            status = "REGRESSION"
+            regressions += 1
+        elif ratio < 1 - threshold:
+            status = "improved"
+        else:
+            status = ""
+        print(f"{result['name']:>18} {result.get('codec', 'jp2'):>5} {result['size']:>6} {result['wavelet']:>7} "
+              f"{result['level']:>5} "
+              f"{base['seconds']:>9.4f}s {result['seconds']:>9.4f}s {(ratio - 1) * 100:>+7.1f}% {status}")
+    print(f"{regressions} regression(s)")
+    return regressions
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="reproducible benchmark suite of the transmit/reconstruct pipeline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 1024, 2048, 4096, 8192],
+                        help="side lengths of the synthetic 12-bit images")
+    parser.add_argument("--wavelets", type=str, nargs="+", default=["db6", "int53"], help="wavelets to measure")
+    parser.add_argument("--levels", type=int, nargs="+", default=[3, 5], help="wavelet levels to measure")
+    parser.add_argument("--quality", type=str, choices=["rates", "dB"], default="dB", help="the quality of encode")
+    parser.add_argument("--codecs", type=str, nargs="+", choices=available_codecs(), default=["jp2"],
+                        help="codecs whose encode_block/decode_block stages are measured")
+    parser.add_argument("--tile_size", type=int, default=None, help="the tile size used by transmit_next")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per stage, the fastest one is reported")
+    parser.add_argument("--seed", type=int, default=0, help="the seed of the synthetic images")
+    parser.add_argument("--output", type=str, default="data/result/benchmark.json", help="where to save the results")
+    parser.add_argument("--compare", type=str, nargs=2, default=None, metavar=("BASELINE", "CURRENT"),
+                        help="compare two saved runs instead of running the suite")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative slowdown above which a stage is flagged as a regression")
+    parser.add_argument("--min_delta", type=float, default=0.005,
+                        help="absolute change in seconds below which a difference is treated as timing noise")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.compare is not None:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        # 有退化时以非零状态退出, 便于在持续集成中使用
+        sys.exit(1 if compare(baseline, current, args.threshold, args.min_delta) else 0)
+
+    report = run_suite(args)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {len(report['results'])} results to {args.output}")
@@ -0,0 +1,45 @@
+"""对比浮点 db6 小波与整数可逆 5/3 小波的变换速度、压缩后大小与重建误差
+
+用法: python -m benchmark.bench_wavelet --size 4096 --level 5 --wavelets db6 int53
+"""
+import argparse
+import numpy as np
+from benchmark.common import generate_xray, timeit
+from src.ImageProcess import ImageTransform
+from src.ImageReconstruction import ImageReconstruction
+from src.DisplaySink import NullSink
+from utils.util import encode_block, decode_block
+
+def run(image, wavelet, args):
+    t_forward, (coeffs, block_size) = timeit(lambda: ImageTransform(image, wavelet, args.level).wavelet_transform())
+    reconstruction = ImageReconstruction(image, block_size, args.level, wavelet, sink=NullSink())
+    compressed_bytes = 0
+    for level in range(args.level - 1, -1, -1):
+        LL, LH, HL, HH = coeffs[level]
+        bands = {"LL": LL, "LH": LH, "HL": HL, "HH": HH} if level == args.level - 1 else {"LH": LH, "HL": HL, "HH": HH}
+        for block_type, block in bands.items():
+            compressed_data, block_min, block_max = encode_block(block, args.quality)
+            compressed_bytes += len(compressed_data)
+            reconstruction.place_block(level, block_type, decode_block(compressed_data, block_min, block_max))
+    t_inverse, final_image = timeit(reconstruction.reconstruct_image, incremental=False)
+    max_error = np.abs(final_image.astype(np.float64) - image).max()
+    return t_forward, t_inverse, compressed_bytes, max_error
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="floating-point vs integer lifting wavelet")
+    parser.add_argument("--size", type=int, default=4096, help="the side length of the synthetic 12-bit image")
+    parser.add_argument("--level", type=int, default=5, help="the level of wavelet")
+    parser.add_argument("--wavelets", type=str, nargs="+", default=["db6", "int53"], help="wavelets to compare")
+    parser.add_argument("--quality", type=str, choices=["rates", "dB"], default="dB", help="the quality of encode")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    image = generate_xray(args.size)
+    raw_bytes = image.size * 12 // 8
+    print(f"{'wavelet':>8} {'forward':>9} {'inverse':>9} {'compressed':>12} {'bits/pixel':>10} {'max error':>10}")
+    for wavelet in args.wavelets:
+        t_forward, t_inverse, compressed_bytes, max_error = run(image, wavelet, args)
+        print(f"{wavelet:>8} {t_forward:>8.3f}s {t_inverse:>8.3f}s {compressed_bytes:>12} "
+              f"{compressed_bytes * 8 / image.size:>10.3f} {max_error:>10.4f}")
+    print(f"raw 12-bit size: {raw_bytes} bytes")
@@ -0,0 +1,48 @@
+import time
+import cv2
+import numpy as np
+
+def generate_xray(size=4096, seed=0):
+    """生成合成的 12 位灰度图像, 处理流程与 data/ImageGenerate.py 相同(三次插值放大、锐化、对比度拉伸)
+
+    Args:
+        size: 图像边长
+        seed: 随机种子
+
+    Returns:
+        image_12bit: uint16 类型, 取值范围 0-4095 的图像
+    """
+    rng = np.random.default_rng(seed)
+    # 低分辨率随机场经三次插值放大, 得到平滑的"组织"结构
+    coarse = rng.random((max(size // 64, 4), max(size // 64, 4)), dtype=np.float32)
+    image = cv2.resize(coarse, (size, size), interpolation=cv2.INTER_CUBIC)
+    # 叠加少量细节噪声, 避免高频子带全为零
+    image += rng.normal(0, 0.02, (size, size)).astype(np.float32)
+
+    # 锐化滤镜
+    sharpen_kernel = np.array([[0, -1, 0],
+                               [-1, 5, -1],
+                               [0, -1, 0]], dtype=np.float32)
+    image = cv2.filter2D(image, -1, sharpen_kernel)
+
+    # 对比度拉伸到 12 位色深（0-4095）
+    min_val, max_val = image.min(), image.max()
+    return ((image - min_val) / (max_val - min_val) * 4095).astype(np.uint16)
+
+def timeit(func, *args, repeat=1, **kwargs):
+    """多次运行函数并返回最短耗时与最后一次的返回值
+
+    Args:
+        func: 被计时的函数
+        repeat: 重复次数
+
+    Returns:
+        best: 最短耗时（秒）
+        result: 函数返回值
+    """
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
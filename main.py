@@ -1,11 +1,23 @@
-from src.ImageProcess import ImageTransform
+from src.ImageProcess import ImageTransform, StreamingImageTransform, open_source_image, transform_image
 from src.Transmission import ProgressiveTransmission
 from src.ImageReconstruction import ImageReconstruction
+from src.LinkSimulator import LinkSimulator
+from src.ErrorCorrection import SelectiveRepeatSession
+from src.DisplaySink import create_sink
+from src.PyramidCache import PyramidCache
+from utils.codec import available_codecs
+from utils.metrics import peak_value
+from concurrent.futures import Executor
 import cv2
+import json
 import argparse
 import matplotlib.pyplot as plt
+from utils import tracing
 
-def parse_args():
+# 流式读取且未指定分块边长时使用的分块边长, 避免整个子带一次性编码
+STREAM_TILE_SIZE = 1024
+
+def get_parser():
     parser = argparse.ArgumentParser(description="parameter list of Progressive transmission system")
     parser.add_argument(
         "--result_dir",
@@ -38,38 +50,372 @@ def parse_args():
         default="dB",
         help="the quality of encode, choose between 'rates' or 'dB'"
     )
+    parser.add_argument(
+        "--codec",
+        type=str,
+        nargs="+",
+        choices=available_codecs(),
+        default=["jp2"],
+        help="the coefficient codec, or one codec per level from level 0 with the last one reused for deeper levels"
+    )
+    parser.add_argument(
+        "--target_psnr",
+        type=float,
+        default=None,
+        help="quantize every subband with a dead-zone step chosen to reach this PSNR in dB"
+    )
+    parser.add_argument(
+        "--target_bpp",
+        type=float,
+        default=None,
+        help="quantize every subband with a dead-zone step chosen to fit this many bits per pixel"
+    )
     parser.add_argument(
         "--band_width",
         type=int,
         default=16777216,
         help="the size of block"
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--schedule",
+        type=str,
+        choices=["full", "compact"],
+        default="full",
+        help="the transmission schedule, 'compact' only sends the LL of the deepest level"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="the number of background encode workers, 0 encodes each block synchronously"
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=None,
+        help="the max number of blocks being encoded ahead of transmission"
+    )
+    parser.add_argument(
+        "--tile_size",
+        type=int,
+        default=None,
+        help="split subbands larger than this into tiles that are encoded and transmitted separately"
+    )
+    parser.add_argument(
+        "--link_rate",
+        type=float,
+        default=None,
+        help="simulate a link of this many bits per second, e.g. 16e6 for a 16 Mbps line"
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="the one-way latency of the simulated link in seconds"
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.0,
+        help="the standard deviation of the simulated link latency in seconds"
+    )
+    parser.add_argument(
+        "--loss_rate",
+        type=float,
+        default=0.0,
+        help="the packet loss probability of the simulated link"
+    )
+    parser.add_argument(
+        "--corrupt_rate",
+        type=float,
+        default=0.0,
+        help="the probability that a packet on the simulated link arrives with a bit error"
+    )
+    parser.add_argument(
+        "--recovery",
+        type=str,
+        choices=["arq", "selective"],
+        default="arq",
+        help="how the simulated link recovers lost blocks: in-order timeout retransmission, or checksummed "
+             "datagrams with retransmission of only the blocks the receiver could not recover"
+    )
+    parser.add_argument(
+        "--fec_group",
+        type=int,
+        default=None,
+        help="in selective mode, send one XOR parity packet per this many packets so a single loss needs no retransmission"
+    )
+    parser.add_argument(
+        "--display",
+        type=str,
+        choices=["interactive", "headless", "dump"],
+        default="interactive",
+        help="where reconstructions go: a matplotlib window, nowhere, or one file per step"
+    )
+    parser.add_argument(
+        "--dump_dir",
+        type=str,
+        default="data/result/frames",
+        help="the address to save the frames in dump mode"
+    )
+    parser.add_argument(
+        "--dump_format",
+        type=str,
+        choices=["png", "npy"],
+        default="png",
+        help="the file format of the frames in dump mode"
+    )
+    parser.add_argument(
+        "--bitplane_passes",
+        type=int,
+        default=None,
+        help="send every tile as this many bit-plane passes, most significant first, interleaved across levels"
+    )
+    parser.add_argument(
+        "--order",
+        type=str,
+        choices=["level", "rd"],
+        default="level",
+        help="the transmission order, 'rd' sends the units with the largest estimated MSE drop per byte first"
+    )
+    parser.add_argument(
+        "--roi",
+        type=int,
+        nargs=4,
+        default=None,
+        metavar=("X0", "Y0", "X1", "Y1"),
+        help="a region of interest in pixels whose tiles on every level are sent before the background"
+    )
+    parser.add_argument(
+        "--cache_dir",
+        type=str,
+        default=None,
+        help="keep encoded pyramids in this directory so repeat transmissions skip transform and encode"
+    )
+    parser.add_argument(
+        "--cache_size",
+        type=int,
+        default=1024,
+        help="the size budget of the pyramid cache in MiB, least recently used entries are evicted"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="memory-map the input and transform it in row strips, for images too large to hold in memory"
+    )
+    parser.add_argument(
+        "--strip_rows",
+        type=int,
+        default=256,
+        help="the number of coefficient rows computed per strip in stream mode"
+    )
+    parser.add_argument(
+        "--raw_shape",
+        type=int,
+        nargs=2,
+        default=None,
+        metavar=("ROWS", "COLS"),
+        help="the shape of a headerless .raw/.bin input image"
+    )
+    parser.add_argument(
+        "--raw_dtype",
+        type=str,
+        default="uint16",
+        help="the pixel type of a headerless .raw/.bin input image"
+    )
+    parser.add_argument(
+        "--work_dir",
+        type=str,
+        default=None,
+        help="the directory of the temporary subband files in stream mode, defaults to the system temp dir"
+    )
+    parser.add_argument(
+        "--metric_stride",
+        type=int,
+        default=1,
+        help="evaluate the quality metrics on every n-th row and column only, trading accuracy for speed"
+    )
+    parser.add_argument(
+        "--ssim",
+        action="store_true",
+        help="also track the SSIM of every reconstruction against the reference image"
+    )
+    parser.add_argument(
+        "--full_idwt",
+        action="store_true",
+        help="inverse-transform to full resolution at every step instead of showing the coarse levels upscaled"
+    )
+    parser.add_argument(
+        "--estimate_distortion",
+        action="store_true",
+        help="estimate the receiver MSE at the sender from the energy of the coefficients not yet sent"
+    )
+    parser.add_argument(
+        "--trace",
+        type=str,
+        default=None,
+        help="record per-stage timings and save a Chrome trace / Perfetto timeline to this json file"
+    )
+    return parser
+
+def load_image(args, path=None):
+    """读取输入图像, 流式模式下以内存映射方式打开
+
+    Args:
+        args: 命令行参数
+        path: 图像路径, 默认为 args.input_image
+
+    Returns:
+        image: 二维图像数组, 流式模式下为 np.memmap; 普通模式下读取失败时为 None
+    """
+    path = path if path is not None else args.input_image
+    if args.stream:
+        return open_source_image(path, args.raw_shape, args.raw_dtype, args.work_dir)
+    return cv2.imread(path, cv2.IMREAD_GRAYSCALE | cv2.IMREAD_ANYDEPTH)
+
+def create_transmission(image, args, link=None, roi=None, cache=None, executor="thread"):
+    """创建传输对象, 缓存命中时直接使用缓存的编码结果, 否则执行小波变换
+
+    Args:
+        image: 原始图像
+        args: 命令行参数
+        link: LinkSimulator 对象
+        roi: 感兴趣区域 (x0, y0, x1, y1)
+        cache: PyramidCache 对象, None 表示不使用缓存
+        executor: 后台编码方式, "thread" 或 "process"; 传入共享的 Executor 实例时小波变换也提交到
+            该 Executor 中进行(流式模式除外)
+
+    Returns:
+        transmission: ProgressiveTransmission 对象
+        block_size: 每一层系数的尺寸
+        cache_key: 传输结束后需要写入缓存的键, 不使用缓存或已命中时为 None
+    """
+    tile_size = args.tile_size
+    if tile_size is None and args.stream:
+        tile_size = STREAM_TILE_SIZE
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.key(image, wavelet=args.wavelet, level=args.level, quality=args.quality, codec=args.codec,
+                              schedule=args.schedule, tile_size=tile_size, bitplane_passes=args.bitplane_passes,
+                              order=args.order, roi=roi, target_psnr=args.target_psnr, target_bpp=args.target_bpp)
+        cached = cache.load(cache_key)
+        if cached is not None:
+            print(f"Pyramid cache hit: {cache_key[:16]}, skipping wavelet transform and encoding.")
+            transmission = ProgressiveTransmission(None, args.level, args.band_width, tile_size=cached.tile_size,
+                                                   link=link, encoded_units=cached.units)
+            return transmission, cached.block_size, None
+
+    # 目标 PSNR 按输入图像的位深换算
+    peak = peak_value(image) if args.target_psnr is not None else 4095.0
+    # 创建ImageTransform对象, 流式模式下按条带变换, 子带保存在临时文件中
+    if args.stream:
+        transformer = StreamingImageTransform(image, args.wavelet, args.level, args.strip_rows, args.work_dir)
+        coeffs, block_size = transformer.wavelet_transform()
+    elif isinstance(executor, Executor):
+        coeffs, block_size = executor.submit(transform_image, image, args.wavelet, args.level).result()
+    else:
+        transformer = ImageTransform(image, args.wavelet, args.level)
+        # 执行小波变换
+        coeffs, block_size = transformer.wavelet_transform()
+    transmission = ProgressiveTransmission(coeffs, args.level, args.band_width, args.quality, args.schedule,
+                                           args.workers, args.prefetch, executor, tile_size=tile_size, link=link,
+                                           bitplane_passes=args.bitplane_passes, order=args.order,
+                                           wavelet=args.wavelet, roi=roi, keep_sent=cache is not None,
+                                           estimate_distortion=args.estimate_distortion, codec=args.codec,
+                                           target_psnr=args.target_psnr, target_bpp=args.target_bpp, peak=peak)
+    return transmission, block_size, cache_key
+
+def resume_transmission(transmission, session_info, resume):
+    """处理接收端 HELLO 中的断点续传请求, 会话参数与断点一致时跳过接收端已收到的数据单元
+
+    Args:
+        transmission: 尚未开始传输的 ProgressiveTransmission 对象
+        session_info: 本次会话的 SESSION 内容, 写入跳过的数据块个数 "resumed"
+        resume: HELLO 中的 {"session": 断点的 SESSION 内容, "units": [[level, block_type, [row, col], 次数], ...]},
+            位平面模式下每个数据单元末尾附加已收到的各次细化的最低位平面列表; 可以为 None
+    """
+    session_info["resumed"] = 0
+    if not resume:
+        return
+    # 经过一次 JSON 往返后再比较, 元组与列表视为相同
+    expected = json.loads(json.dumps({key: value for key, value in session_info.items() if key != "resumed"}))
+    if resume.get("session") != expected:
+        print("The checkpoint of the receiver does not match this session, sending everything.")
+        return
+    acknowledged, planes = {}, {}
+    for level, block_type, tile_index, count, *received_planes in resume["units"]:
+        unit = (level, block_type, tuple(tile_index))
+        acknowledged[unit] = count
+        if received_planes:
+            planes[unit] = set(received_planes[0])
+    session_info["resumed"] = transmission.resume(acknowledged, planes)
+
+def parse_args():
+    args = get_parser().parse_args()
     return args
 
 if __name__ == '__main__':
     args = parse_args()
+    if args.trace is not None:
+        tracing.enable()
+    if args.display != "interactive":
+        # 批处理与性能测试时不创建任何 GUI 窗口
+        plt.switch_backend("Agg")
     # 读取图像
-    image = cv2.imread(args.input_image, cv2.IMREAD_GRAYSCALE)
+    image = load_image(args)
     print(f"image shape: {image.shape}")
-    # 创建ImageTransform对象
-    transformer = ImageTransform(image, args.wavelet, args.level)
-    # 执行小波变换
-    coeffs, block_size = transformer.wavelet_transform()
-
-    transmission = ProgressiveTransmission(coeffs, args.level, args.band_width, args.quality)
-    reconstruction = ImageReconstruction(image, block_size, args.level, args.wavelet)
-
-    while True:
-        encoded_block = transmission.transmit_next()
-        if encoded_block is None:
-            break
-        level, block_type, restored_data = transmission.decode_received_data(encoded_block)
-        reconstruction.add_received_block(level, block_type, restored_data)
-    plt.pause(2)
+
+    link = None
+    if args.link_rate is not None:
+        link = LinkSimulator(args.link_rate, args.latency, args.jitter, args.loss_rate, corrupt_rate=args.corrupt_rate)
+    # 选择性重传时由 SelectiveRepeatSession 驱动链路, 传输对象本身不模拟链路
+    session = None
+    if link is not None and args.recovery == "selective":
+        session = SelectiveRepeatSession(link, args.fec_group)
+    cache = None
+    if args.cache_dir is not None:
+        cache = PyramidCache(args.cache_dir, args.cache_size << 20)
+    transmission, block_size, cache_key = create_transmission(image, args, link if session is None else None,
+                                                              args.roi, cache)
+    sink = create_sink(args.display, args.dump_dir, args.dump_format)
+    # 指定感兴趣区域时发送端可能自动分块, 以发送端实际使用的分块边长为准
+    # 流式模式下不在接收端保留原图的 float32 副本, 不计算 MSE 损失
+    reference = None if args.stream else image
+    reconstruction = ImageReconstruction(reference, block_size, args.level, args.wavelet, transmission.tile_size,
+                                         sink, args.roi, args.metric_stride, args.ssim, not args.full_idwt)
+
+    if session is None:
+        blocks = iter(transmission.transmit_next, None)
+    else:
+        # 有损链路上按交付顺序重建, 丢失的数据块在重传或恢复后补上
+        blocks = (encoded_block for _, encoded_block in session.run(iter(transmission.transmit_next, None)))
+    for encoded_block in blocks:
+        level, block_type, restored_data, tile_index = transmission.decode_received_data(encoded_block)
+        reconstruction.add_received_block(level, block_type, restored_data, tile_index)
+    transmission.close()
+    if cache_key is not None:
+        cache.store(cache_key, transmission.sent_units, block_size, transmission.tile_size)
+    print(f"Total bytes sent: {transmission.bytes_sent}")
+    if link is not None:
+        summary = link.summary() if session is None else session.summary()
+        print(f"Simulated link: first image at {summary['time_to_first_image']:.3f}s, "
+              f"final image at {summary['time_to_complete']:.3f}s, "
+              f"{summary['retransmissions']} retransmissions.")
+        if session is not None:
+            print(f"Selective recovery: goodput {summary['goodput'] / 1e6:.2f} Mbps, "
+                  f"overhead {summary['overhead']:.1%}, {summary['recovered']} packets recovered by parity, "
+                  f"{summary['corrupted']} corrupted packets dropped.")
+        link.save_timeline(args.result_dir)
+    sink.close()
 
     transmission.plot_efficiency(args.result_dir)
-    reconstruction.plot_loss(args.result_dir)
+    if reconstruction.psnr_values:
+        print(f"Final PSNR: {reconstruction.psnr_values[-1]:.2f} dB" +
+              (f", SSIM: {reconstruction.ssim_values[-1]:.4f}" if reconstruction.ssim_values else ""))
+    reconstruction.plot_loss(args.result_dir, transmission.distortion_estimates)
+    if args.trace is not None:
+        tracing.save_trace(args.trace)
+        tracing.print_summary()
         
 
 
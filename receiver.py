@@ -0,0 +1,228 @@
+from src.ImageReconstruction import ImageReconstruction
+from src.AsyncReceiver import AsyncReceiver
+from src.DisplaySink import create_sink
+from src.Checkpoint import ReceiverCheckpoint
+from src.Protocol import (connect, recv_frame, send_json, parse_json, parse_block, verify_block,
+                          FRAME_HELLO, FRAME_SESSION, FRAME_BLOCK, FRAME_END, FRAME_ERROR)
+from src.Transmission import decode_encoded_block
+import cv2
+import time
+import asyncio
+import argparse
+import matplotlib.pyplot as plt
+from utils import tracing
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="receiver of the progressive transmission system")
+    parser.add_argument(
+        "--address",
+        type=str,
+        default="127.0.0.1:9000",
+        help="the address of the sender, 'host:port' for TCP or a path for a Unix socket"
+    )
+    parser.add_argument(
+        "--image",
+        type=str,
+        default=None,
+        help="the name of the image to request from a server.py that serves a directory of images"
+    )
+    parser.add_argument(
+        "--reference_image",
+        type=str,
+        default=None,
+        help="the address of the original image, used to compute the mse loss"
+    )
+    parser.add_argument(
+        "--metric_stride",
+        type=int,
+        default=1,
+        help="evaluate the quality metrics on every n-th row and column only, trading accuracy for speed"
+    )
+    parser.add_argument(
+        "--ssim",
+        action="store_true",
+        help="also track the SSIM of every reconstruction against the reference image"
+    )
+    parser.add_argument(
+        "--full_idwt",
+        action="store_true",
+        help="inverse-transform to full resolution at every step instead of showing the coarse levels upscaled"
+    )
+    parser.add_argument(
+        "--result_dir",
+        type=str,
+        default="data/result",
+        help="the address to save the loss curve"
+    )
+    parser.add_argument(
+        "--roi",
+        type=int,
+        nargs=4,
+        default=None,
+        metavar=("X0", "Y0", "X1", "Y1"),
+        help="ask the sender to stream this region of interest in pixels before the background"
+    )
+    parser.add_argument(
+        "--use_asyncio",
+        action="store_true",
+        help="read frames on an asyncio loop and decode/reconstruct in worker threads"
+    )
+    parser.add_argument(
+        "--decode_workers",
+        type=int,
+        default=2,
+        help="the number of decode threads of the asyncio receiver"
+    )
+    parser.add_argument(
+        "--display",
+        type=str,
+        choices=["interactive", "headless", "dump"],
+        default="interactive",
+        help="where reconstructions go: a matplotlib window, nowhere, or one file per step"
+    )
+    parser.add_argument(
+        "--dump_dir",
+        type=str,
+        default="data/result/frames",
+        help="the address to save the frames in dump mode"
+    )
+    parser.add_argument(
+        "--dump_format",
+        type=str,
+        choices=["png", "npy"],
+        default="png",
+        help="the file format of the frames in dump mode"
+    )
+    parser.add_argument(
+        "--checkpoint",
+        type=str,
+        default=None,
+        help="save the received coefficients to this .npz file, and resume from it if it exists"
+    )
+    parser.add_argument(
+        "--checkpoint_interval",
+        type=float,
+        default=2.0,
+        help="the minimum seconds between two checkpoints during a transfer"
+    )
+    parser.add_argument(
+        "--trace",
+        type=str,
+        default=None,
+        help="record per-stage timings and save a Chrome trace / Perfetto timeline to this json file"
+    )
+    args = parser.parse_args()
+    return args
+
+def receive(address, reference, sink=None, roi=None, image=None, metric_stride=1, ssim=False, preview=True,
+            checkpoint=None):
+    """同步接收一次完整的传输, 每个数据块到达后立即解码、重建并刷新显示
+
+    Args:
+        address: 发送端地址
+        reference: 原始图像, 可以为 None
+        sink: 重建结果的输出端
+        roi: 感兴趣区域 (x0, y0, x1, y1), 在 HELLO 中发送给发送端
+        image: 向 server.py 请求的图像名, 在 HELLO 中发送给发送端
+        metric_stride: 有原图时画质指标的采样间隔
+        ssim: 有原图时是否记录 SSIM
+        preview: 第 0 层细节到达之前是否只显示低分辨率的近似图像
+        checkpoint: ReceiverCheckpoint 对象, 传输过程中定期保存断点, 连接中断时也保存; 断点文件存在时
+            请求发送端跳过其中的数据单元, 传输完成后删除断点文件。有数据块因校验和不一致被丢弃时保留
+            断点, 再次运行只会重新请求这些数据块
+
+    Raises:
+        ValueError: 发送端拒绝会话请求时报错
+
+    Returns:
+        reconstruction: ImageReconstruction 对象
+    """
+    sock = connect(address)
+    with sock:
+        start = time.perf_counter()
+        resume = checkpoint.resume_request() if checkpoint is not None else None
+        send_json(sock, FRAME_HELLO, {"roi": roi, "image": image, "resume": resume})
+        frame_type, body = recv_frame(sock)
+        if frame_type == FRAME_ERROR:
+            raise ValueError(f"Session rejected: {parse_json(body)['error']}")
+        if frame_type != FRAME_SESSION:
+            raise ValueError(f"Expected a SESSION frame, got frame type {frame_type}.")
+        session = parse_json(body)
+        block_size = [tuple(size) for size in session["block_size"]]
+        reconstruction = ImageReconstruction(reference, block_size, session["level"], session["wavelet"],
+                                             session["tile_size"], sink, session.get("roi"), metric_stride, ssim,
+                                             preview)
+        if session.get("resumed"):
+            # 发送端已跳过断点中的数据单元, 先显示断点中的系数
+            checkpoint.restore(reconstruction)
+            reconstruction.refresh()
+            print(f"Resumed from the checkpoint, the sender skipped {session['resumed']} units.")
+
+        bytes_received = 0
+        corrupted = 0
+        try:
+            while True:
+                frame_type, body = recv_frame(sock)
+                if frame_type == FRAME_END:
+                    break
+                if frame_type != FRAME_BLOCK:
+                    raise ValueError(f"Unexpected frame type {frame_type}.")
+                bytes_received += len(body)
+                if not verify_block(body):
+                    # 损坏的数据块不写入系数, 不计入断点清单
+                    corrupted += 1
+                    print("Dropped a block with a checksum mismatch.")
+                    continue
+                encoded_block = parse_block(body)
+                arrival = time.perf_counter() - start
+                restored_data = decode_encoded_block(encoded_block)
+                reconstruction.add_received_block(encoded_block.level, encoded_block.block_type, restored_data,
+                                                  encoded_block.tile_index)
+                print(f"Received {encoded_block.block_type} block {encoded_block.tile_index} from level "
+                      f"{encoded_block.level} at {arrival:.3f}s, displayed at {time.perf_counter() - start:.3f}s.")
+                if checkpoint is not None:
+                    checkpoint.maybe_save(reconstruction, session)
+        except OSError:
+            if checkpoint is not None:
+                checkpoint.save(reconstruction, session)
+                print(f"Connection lost, checkpoint saved to {checkpoint.path}.")
+            raise
+    if corrupted:
+        print(f"{corrupted} corrupted blocks were dropped.")
+        if checkpoint is not None:
+            checkpoint.save(reconstruction, session)
+            print(f"Checkpoint kept at {checkpoint.path}, run again to fetch only the dropped blocks.")
+    elif checkpoint is not None:
+        checkpoint.remove()
+    print(f"Total bytes received: {bytes_received} in {time.perf_counter() - start:.3f}s")
+    return reconstruction
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.trace is not None:
+        tracing.enable()
+    if args.display != "interactive":
+        plt.switch_backend("Agg")
+    sink = create_sink(args.display, args.dump_dir, args.dump_format)
+    reference = None
+    if args.reference_image is not None:
+        reference = cv2.imread(args.reference_image, cv2.IMREAD_GRAYSCALE | cv2.IMREAD_ANYDEPTH)
+
+    checkpoint = None
+    if args.checkpoint is not None:
+        checkpoint = ReceiverCheckpoint(args.checkpoint, args.checkpoint_interval)
+
+    if args.use_asyncio:
+        receiver = AsyncReceiver(reference, args.decode_workers, sink, args.roi, args.image, args.metric_stride,
+                                 args.ssim, not args.full_idwt, checkpoint)
+        reconstruction = asyncio.run(receiver.run(args.address))
+    else:
+        reconstruction = receive(args.address, reference, sink, args.roi, args.image, args.metric_stride, args.ssim,
+                                 not args.full_idwt, checkpoint)
+    sink.close()
+
+    if reference is not None:
+        reconstruction.plot_loss(args.result_dir)
+    if args.trace is not None:
+        tracing.save_trace(args.trace)
+        tracing.print_summary()
@@ -0,0 +1,70 @@
+from main import get_parser, load_image, create_transmission, resume_transmission
+from src.PyramidCache import PyramidCache
+from utils import tracing
+from src.Protocol import (listen, recv_frame, send_json, parse_json, send_block, send_frame,
+                          FRAME_HELLO, FRAME_SESSION, FRAME_END)
+import time
+
+def parse_args():
+    parser = get_parser()
+    parser.description = "sender of the progressive transmission system, serves one image over a socket"
+    parser.add_argument(
+        "--address",
+        type=str,
+        default="127.0.0.1:9000",
+        help="the address to listen on, 'host:port' for TCP or a path for a Unix socket"
+    )
+    args = parser.parse_args()
+    return args
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.trace is not None:
+        tracing.enable()
+    # 读取图像, 小波变换在收到 HELLO、确定感兴趣区域后进行(缓存命中时跳过)
+    image = load_image(args)
+    print(f"image shape: {image.shape}")
+    cache = None
+    if args.cache_dir is not None:
+        cache = PyramidCache(args.cache_dir, args.cache_size << 20)
+
+    server = listen(args.address)
+    print(f"Waiting for a receiver on {args.address}")
+    conn, _ = server.accept()
+    with conn:
+        frame_type, body = recv_frame(conn)
+        if frame_type != FRAME_HELLO:
+            raise ValueError(f"Expected a HELLO frame, got frame type {frame_type}.")
+        # 接收端可以在 HELLO 中指定感兴趣区域, 否则使用发送端命令行参数
+        request = parse_json(body)
+        roi = request.get("roi") or args.roi
+        transmission, block_size, cache_key = create_transmission(image, args, roi=roi, cache=cache)
+        session_info = {
+            "image_shape": list(image.shape),
+            "wavelet": args.wavelet,
+            "level": args.level,
+            "block_size": [list(size) for size in block_size],
+            "tile_size": transmission.tile_size,
+            "bitplane_passes": args.bitplane_passes,
+            "roi": roi,
+        }
+        # 接收端带有断点时跳过已经收到的数据单元
+        resume_transmission(transmission, session_info, request.get("resume"))
+        send_json(conn, FRAME_SESSION, session_info)
+
+        start = time.perf_counter()
+        while True:
+            encoded_block = transmission.transmit_next()
+            if encoded_block is None:
+                break
+            send_block(conn, encoded_block)
+        send_frame(conn, FRAME_END)
+        transmission.close()
+        # 断点续传时只发送了一部分数据单元, 不写入缓存
+        if cache_key is not None and transmission.keep_sent:
+            cache.store(cache_key, transmission.sent_units, block_size, transmission.tile_size)
+    server.close()
+    print(f"Total bytes sent: {transmission.bytes_sent} in {time.perf_counter() - start:.3f}s")
+    if args.trace is not None:
+        tracing.save_trace(args.trace)
+        tracing.print_summary()
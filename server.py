@@ -0,0 +1,143 @@
+from main import get_parser, load_image, create_transmission, resume_transmission
+from src.PyramidCache import PyramidCache
+from src.TransmissionServer import TransmissionServer
+from utils import tracing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import os
+import signal
+import asyncio
+
+def parse_args():
+    parser = get_parser()
+    parser.description = "long-running server of the progressive transmission system, serves many sessions at once"
+    parser.add_argument(
+        "--address",
+        type=str,
+        default="127.0.0.1:9000",
+        help="the address to listen on, 'host:port' for TCP or a path for a Unix socket"
+    )
+    parser.add_argument(
+        "--image_dir",
+        type=str,
+        default="data/input",
+        help="the directory of the images that receivers may request by name"
+    )
+    parser.add_argument(
+        "--executor",
+        type=str,
+        choices=["thread", "process"],
+        default="process",
+        help="the type of the worker pool shared by all sessions for wavelet transform and encoding"
+    )
+    parser.add_argument(
+        "--quantum",
+        type=int,
+        default=1 << 16,
+        help="the bytes each session may send per scheduling round"
+    )
+    parser.add_argument(
+        "--report_interval",
+        type=float,
+        default=10.0,
+        help="print per-session and aggregate throughput every this many seconds, 0 disables"
+    )
+    parser.add_argument(
+        "--trace_events",
+        type=int,
+        default=1000000,
+        help="the max number of trace events kept in memory with --trace, the oldest are dropped"
+    )
+    # 服务端默认使用全部 CPU 作为共享的工作进程
+    parser.set_defaults(workers=os.cpu_count())
+    args = parser.parse_args()
+    return args
+
+def ignore_sigint():
+    """工作进程忽略 Ctrl-C, 由主进程负责关闭进程池"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def resolve_image(image_dir, name):
+    """把会话请求中的图像名解析为 image_dir 下的路径, 拒绝指向 image_dir 之外的名称
+
+    Args:
+        image_dir: 图像文件夹目录
+        name: 请求的图像名
+
+    Raises:
+        ValueError: 图像名为空、越出 image_dir 或文件不存在时报错
+
+    Returns:
+        path: 图像路径
+    """
+    if not name:
+        raise ValueError("The session request does not name an image.")
+    root = os.path.realpath(image_dir)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+        raise ValueError(f"Unknown image: {name}.")
+    return path
+
+def make_session_factory(args, executor, cache=None):
+    """创建 TransmissionServer 使用的会话工厂
+
+    Args:
+        args: 命令行参数
+        executor: 所有会话共享的 Executor
+        cache: PyramidCache 对象, None 表示不使用缓存
+
+    Returns:
+        open_session: open_session(request) -> (transmission, session_info, on_finish)
+    """
+    def open_session(request):
+        image = load_image(args, resolve_image(args.image_dir, request.get("image")))
+        if image is None:
+            raise ValueError(f"Failed to read image: {request.get('image')}.")
+        # 接收端可以在 HELLO 中指定感兴趣区域, 否则使用服务端命令行参数
+        roi = request.get("roi") or args.roi
+        transmission, block_size, cache_key = create_transmission(image, args, roi=roi, cache=cache,
+                                                                  executor=executor)
+        session_info = {
+            "image_shape": list(image.shape),
+            "wavelet": args.wavelet,
+            "level": args.level,
+            "block_size": [list(size) for size in block_size],
+            "tile_size": transmission.tile_size,
+            "bitplane_passes": args.bitplane_passes,
+            "roi": roi,
+        }
+        # 接收端带有断点时跳过已经收到的数据单元, 此时只发送一部分数据单元, 不写入缓存
+        resume_transmission(transmission, session_info, request.get("resume"))
+        on_finish = None
+        if cache_key is not None and transmission.keep_sent:
+            def store_sent():
+                cache.store(cache_key, transmission.sent_units, block_size, transmission.tile_size)
+            on_finish = store_sent
+        return transmission, session_info, on_finish
+    return open_session
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.trace is not None:
+        # 进程池中的编码与小波变换不在本进程中记录, 时间线中体现为 transmit_next 等待的时间
+        tracing.enable(args.trace_events)
+    cache = None
+    if args.cache_dir is not None:
+        cache = PyramidCache(args.cache_dir, args.cache_size << 20)
+    if args.executor == "process":
+        pool = ProcessPoolExecutor(max_workers=args.workers, initializer=ignore_sigint)
+    else:
+        pool = ThreadPoolExecutor(max_workers=args.workers)
+    with pool as executor:
+        server = TransmissionServer(make_session_factory(args, executor, cache), args.quantum, args.report_interval)
+        try:
+            asyncio.run(server.serve(args.address))
+        except KeyboardInterrupt:
+            pass
+    summary = server.summary()
+    print(f"Served {summary['completed']} sessions, {summary['bytes']} bytes in {summary['uptime']:.3f}s, "
+          f"{summary['throughput'] / 1e6:.2f} Mbps aggregate.")
+    os.makedirs(args.result_dir, exist_ok=True)
+    server.save_stats(args.result_dir)
+    if args.trace is not None:
+        tracing.save_trace(args.trace)
+        tracing.print_summary()
@@ -0,0 +1,165 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.ImageReconstruction import ImageReconstruction
+from src.Protocol import (open_connection, read_frame, pack_json, parse_json, parse_block, verify_block,
+                          FRAME_HELLO, FRAME_SESSION, FRAME_BLOCK, FRAME_END, FRAME_ERROR)
+from src.Transmission import decode_encoded_block
+
+class AsyncReceiver:
+    def __init__(self, reference=None, decode_workers=2, sink=None, roi=None, image=None, metric_stride=1,
+                 ssim=False, preview=True, checkpoint=None):
+        """基于 asyncio 的接收端, socket 读取留在事件循环中, 解码与重建在线程池中执行
+
+        重建进行期间到达的数据块会被合并: 重建结束后一次性写入所有已解码的数据块, 只再重建一次,
+        因此显示总是对应最新的状态, 不会积压中间结果。
+
+        Args:
+            reference: 原始图像, 用于计算 MSE 损失, 可以为 None
+            decode_workers: 解码线程数
+            sink: 重建结果的输出端, 默认为交互式 matplotlib 显示
+            roi: 感兴趣区域 (x0, y0, x1, y1), 在 HELLO 中发送给发送端
+            image: 向 server.py 请求的图像名, 在 HELLO 中发送给发送端
+            metric_stride: 有原图时画质指标的采样间隔
+            ssim: 有原图时是否记录 SSIM
+            preview: 第 0 层细节到达之前是否只显示低分辨率的近似图像(见 ImageReconstruction.render)
+            checkpoint: ReceiverCheckpoint 对象, 用法与 receiver.receive 相同; 断点在重建线程中保存
+        """
+        self.reference = reference
+        self.roi = roi
+        self.image = image
+        self.metric_stride = metric_stride
+        self.ssim = ssim
+        self.preview = preview
+        self.checkpoint = checkpoint
+        self.session = None
+        self.sink = sink
+        self.decode_executor = ThreadPoolExecutor(max_workers=decode_workers)
+        # 系数写入与逆变换只在这一个线程中进行, 避免与重建并发修改系数
+        self.reconstruct_executor = ThreadPoolExecutor(max_workers=1)
+        self.reconstruction = None
+        self.blocks_received = 0
+        self.bytes_received = 0
+        self.corrupted = 0
+        self.reconstructions = 0
+
+    async def run(self, address):
+        """连接发送端并接收完整的一次传输
+
+        Args:
+            address: "host:port" 或 Unix socket 路径
+
+        Returns:
+            reconstruction: ImageReconstruction 对象
+        """
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        reader, writer = await open_connection(address)
+        resume = self.checkpoint.resume_request() if self.checkpoint is not None else None
+        writer.write(pack_json(FRAME_HELLO, {"roi": self.roi, "image": self.image, "resume": resume}))
+        await writer.drain()
+
+        frame_type, body = await read_frame(reader)
+        if frame_type == FRAME_ERROR:
+            writer.close()
+            raise ValueError(f"Session rejected: {parse_json(body)['error']}")
+        if frame_type != FRAME_SESSION:
+            raise ValueError(f"Expected a SESSION frame, got frame type {frame_type}.")
+        session = self.session = parse_json(body)
+        block_size = [tuple(size) for size in session["block_size"]]
+        self.reconstruction = ImageReconstruction(self.reference, block_size, session["level"],
+                                                  session["wavelet"], session["tile_size"], self.sink,
+                                                  session.get("roi"), self.metric_stride, self.ssim,
+                                                  self.preview)
+        if session.get("resumed"):
+            # 发送端已跳过断点中的数据单元, 先显示断点中的系数
+            self.checkpoint.restore(self.reconstruction)
+            self.reconstruction.refresh()
+            print(f"Resumed from the checkpoint, the sender skipped {session['resumed']} units.")
+
+        # 按到达顺序保存解码任务, None 表示传输结束
+        decoded = asyncio.Queue()
+        consumer = asyncio.create_task(self._reconstruct_loop(decoded, start))
+        try:
+            while True:
+                frame_type, body = await read_frame(reader)
+                if frame_type == FRAME_END:
+                    break
+                if frame_type != FRAME_BLOCK:
+                    raise ValueError(f"Unexpected frame type {frame_type}.")
+                self.bytes_received += len(body)
+                if not verify_block(body):
+                    # 损坏的数据块不写入系数, 不计入断点清单
+                    self.corrupted += 1
+                    print("Dropped a block with a checksum mismatch.")
+                    continue
+                encoded_block = parse_block(body)
+                self.blocks_received += 1
+                future = loop.run_in_executor(self.decode_executor, self._decode, encoded_block)
+                decoded.put_nowait(future)
+            decoded.put_nowait(None)
+            await consumer
+        except (OSError, asyncio.IncompleteReadError):
+            if self.checkpoint is not None:
+                # 排在正在进行的重建之后, 断点只包含已经写入系数矩阵的数据单元
+                await loop.run_in_executor(self.reconstruct_executor, self.checkpoint.save, self.reconstruction,
+                                           session)
+                print(f"Connection lost, checkpoint saved to {self.checkpoint.path}.")
+            raise
+        finally:
+            consumer.cancel()
+            writer.close()
+            self.decode_executor.shutdown()
+            self.reconstruct_executor.shutdown()
+        if self.corrupted:
+            print(f"{self.corrupted} corrupted blocks were dropped.")
+            if self.checkpoint is not None:
+                self.checkpoint.save(self.reconstruction, session)
+                print(f"Checkpoint kept at {self.checkpoint.path}, run again to fetch only the dropped blocks.")
+        elif self.checkpoint is not None:
+            self.checkpoint.remove()
+        print(f"Received {self.blocks_received} blocks ({self.bytes_received} bytes) in "
+              f"{time.perf_counter() - start:.3f}s with {self.reconstructions} reconstructions.")
+        return self.reconstruction
+
+    @staticmethod
+    def _decode(encoded_block):
+        restored_data = decode_encoded_block(encoded_block)
+        return encoded_block.level, encoded_block.block_type, restored_data, encoded_block.tile_index
+
+    async def _reconstruct_loop(self, decoded, start):
+        """取出已解码的数据块, 合并重建期间积压的数据块后重建并刷新显示
+
+        Args:
+            decoded: 解码任务队列
+            start: 会话开始的时刻
+        """
+        loop = asyncio.get_running_loop()
+        finished = False
+        while not finished:
+            # 至少等待一个数据块, 然后取走所有已经解码完成的数据块
+            batch = []
+            future = await decoded.get()
+            while future is not None:
+                batch.append(await future)
+                if decoded.empty():
+                    break
+                future = decoded.get_nowait()
+            finished = future is None
+            if not batch:
+                continue
+
+            # 逆变换、预览放大与画质指标都在线程池中进行, 事件循环只负责显示
+            frame = await loop.run_in_executor(self.reconstruct_executor, self._apply, batch)
+            self.reconstructions += 1
+            # 交互式绘图只能在主线程中进行
+            self.reconstruction.show_frame(*frame)
+            print(f"Reconstructed {len(batch)} block(s) at {time.perf_counter() - start:.3f}s.")
+
+    def _apply(self, batch):
+        for level, block_type, restored_data, tile_index in batch:
+            self.reconstruction.place_block(level, block_type, restored_data, tile_index)
+        frame = self.reconstruction.prepare_frame()
+        if self.checkpoint is not None:
+            self.checkpoint.maybe_save(self.reconstruction, self.session)
+        return frame
@@ -0,0 +1,123 @@
+import json
+import os
+import time
+import numpy as np
+from utils.bitplane import dequantize
+from utils.tracing import span
+
+class ReceiverCheckpoint:
+    def __init__(self, path, interval=2.0):
+        """接收端状态的断点文件, 连接中断后重新连接时只接收尚未到达的数据单元
+
+        断点文件是一个 .npz: manifest 为 JSON 字符串, 记录会话的 SESSION 内容与已到达的数据单元
+        [[level, block_type, [row, col], 次数], ...], 位平面模式下次数为已收到的细化次数, 并在末尾附加
+        已收到的各次细化的最低位平面列表, 中间某次细化丢失时发送端只补发这一次; 每个数据单元
+        保存其在系数矩阵中的区域, 位平面模式下改为保存已收到的幅值(能放入 uint16 时使用 uint16)与符号,
+        量化步长与最低位平面记录在 manifest 中, 恢复时由它们重新得到系数。只保存已到达的区域, 不保存
+        未接收的零, 也不压缩, 保存一次的耗时与写入同样大小的文件相当。先写入临时文件再重命名,
+        中断时不会留下写了一半的断点。
+
+        Args:
+            path: 断点文件路径
+            interval: 传输过程中两次保存之间的最短间隔（秒）
+        """
+        self.path = path
+        self.interval = interval
+        self.last_save = time.perf_counter()
+
+    def resume_request(self):
+        """读取断点文件中的会话与数据单元清单, 放入 HELLO 的 "resume" 字段
+
+        Returns:
+            resume: {"session": SESSION 内容, "units": 数据单元清单}, 没有断点文件时为 None
+        """
+        if not os.path.exists(self.path):
+            return None
+        with np.load(self.path) as checkpoint:
+            return json.loads(str(checkpoint["manifest"]))
+
+    def restore(self, reconstruction):
+        """把断点文件中的系数写入 ImageReconstruction
+
+        Args:
+            reconstruction: 按本次会话的 SESSION 创建的 ImageReconstruction 对象
+
+        Returns:
+            restored: 恢复的数据单元个数
+        """
+        with span("restore_checkpoint", "checkpoint"), np.load(self.path) as checkpoint:
+            manifest = json.loads(str(checkpoint["manifest"]))
+            units = manifest["units"]
+            for level, block_type, tile_index, count, *planes in units:
+                unit = (level, block_type, tuple(tile_index))
+                name = self._name(unit)
+                if name in manifest["bitplanes"]:
+                    step, plane_lo = manifest["bitplanes"][name]
+                    magnitude = checkpoint[f"{name}_magnitude"].astype(np.uint32)
+                    negative = checkpoint[f"{name}_negative"]
+                    reconstruction.bitplanes[unit] = (magnitude, negative, step, plane_lo)
+                    if planes:
+                        reconstruction.planes[unit] = set(planes[0])
+                    block_data = dequantize(magnitude, negative, step, plane_lo)
+                else:
+                    block_data = checkpoint[name]
+                reconstruction.place_block(level, block_type, block_data, unit[2])
+                reconstruction.received[unit] = count
+        print(f"Restored {len(units)} units from checkpoint {self.path}.")
+        return len(units)
+
+    def maybe_save(self, reconstruction, session):
+        """距离上一次保存超过 interval 时保存断点
+
+        Args:
+            reconstruction: ImageReconstruction 对象
+            session: SESSION 内容
+        """
+        if time.perf_counter() - self.last_save >= self.interval:
+            self.save(reconstruction, session)
+
+    def save(self, reconstruction, session):
+        """保存断点
+
+        Args:
+            reconstruction: ImageReconstruction 对象
+            session: SESSION 内容
+        """
+        with span("save_checkpoint", "checkpoint") as event:
+            arrays = {}
+            units = []
+            bitplanes = {}
+            for unit, count in reconstruction.received.items():
+                name = self._name(unit)
+                if unit in reconstruction.bitplanes:
+                    magnitude, negative, step, plane_lo = reconstruction.bitplanes[unit]
+                    if magnitude.size and magnitude.max() <= np.iinfo(np.uint16).max:
+                        magnitude = magnitude.astype(np.uint16)
+                    arrays[f"{name}_magnitude"], arrays[f"{name}_negative"] = magnitude, negative
+                    bitplanes[name] = [step, plane_lo]
+                    units.append([unit[0], unit[1], list(unit[2]), count,
+                                  sorted(reconstruction.planes.get(unit, ()))])
+                    continue
+                view = reconstruction.tile_view(*unit)
+                if view is None:
+                    continue
+                arrays[name] = view
+                units.append([unit[0], unit[1], list(unit[2]), count])
+            manifest = {"session": {key: value for key, value in session.items() if key != "resumed"},
+                        "units": units, "bitplanes": bitplanes}
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "wb") as f:
+                np.savez(f, manifest=np.array(json.dumps(manifest)), **arrays)
+            os.replace(temp_path, self.path)
+            event.set(units=len(units), bytes=os.path.getsize(self.path))
+        self.last_save = time.perf_counter()
+
+    def remove(self):
+        """传输完成后删除断点文件"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    @staticmethod
+    def _name(unit):
+        level, block_type, (row, col) = unit
+        return f"{level}_{block_type}_{row}_{col}"
@@ -0,0 +1,127 @@
+import os
+import cv2
+import numpy as np
+import matplotlib.pyplot as plt
+from collections import namedtuple
+
+# 低分辨率预览图像在原图中的位置: 下标为 i 的像素位于原图坐标 scale * i + offset 处, shape 为原图尺寸
+Preview = namedtuple("Preview", ["shape", "scale", "offset"])
+
+def upscale(image, preview):
+    """把低分辨率的预览图像按其在原图中的位置双线性放大到原图尺寸
+
+    Args:
+        image: 预览图像
+        preview: Preview
+
+    Returns:
+        放大后的 float32 图像
+    """
+    shape, scale, offset = preview
+    matrix = np.float32([[scale, 0, offset], [0, scale, offset]])
+    return cv2.warpAffine(np.asarray(image, dtype=np.float32), matrix, (shape[1], shape[0]),
+                          flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+class NullSink:
+    """不做任何显示的输出端, 用于无显示器的服务器与性能测试"""
+
+    # 是否需要原图尺寸的图像; 为 True 时 ImageReconstruction 在显示之前放大预览, 可以放在工作线程中进行
+    full_size = False
+
+    def show(self, image, step, preview=None):
+        """接收一帧重建结果
+
+        Args:
+            image: 重建得到的图像
+            step: 重建步骤序号
+            preview: image 为低分辨率预览时其在原图中的位置(Preview), 由输出端按需放大; None 表示原图尺寸
+        """
+        pass
+
+    def close(self):
+        """结束显示"""
+        pass
+
+class FrameDumpSink(NullSink):
+    full_size = True
+
+    def __init__(self, output_dir, fmt="png"):
+        """将每一步的重建结果保存为文件的输出端
+
+        Args:
+            output_dir: 保存帧的文件夹目录
+            fmt: 文件格式, "png" 保存裁剪到 uint16 的图像, "npy" 保存 float32 原始数据
+        """
+        if fmt not in ("png", "npy"):
+            raise ValueError(f"Unknown frame format: {fmt}.")
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self.fmt = fmt
+
+    def show(self, image, step, preview=None):
+        # 每一帧都保存为原图尺寸, 便于逐帧比较
+        if preview is not None:
+            image = upscale(image, preview)
+        frame_path = os.path.join(self.output_dir, f"frame_{step:04d}.{self.fmt}")
+        if self.fmt == "npy":
+            np.save(frame_path, np.asarray(image, dtype=np.float32))
+        else:
+            cv2.imwrite(frame_path, np.clip(np.rint(image), 0, 65535).astype(np.uint16))
+
+class MatplotlibSink(NullSink):
+    def __init__(self, interval=0.1, hold=2):
+        """交互式 matplotlib 显示
+
+        Args:
+            interval: 每一帧显示后的停顿时间（秒）
+            hold: 结束时最后一帧保持显示的时间（秒）
+        """
+        self.interval = interval
+        self.hold = hold
+        self.figure = None
+        self.ax = None
+
+    def show(self, image, step, preview=None):
+        if self.figure is None or self.ax is None:
+            # 初始化绘图窗口
+            self.figure, self.ax = plt.subplots()
+            plt.ion()  # 打开交互模式
+
+        self.ax.clear()
+        if preview is None:
+            self.ax.imshow(image, cmap="gray")
+        else:
+            # 预览图像由 matplotlib 在绘制时按原图坐标拉伸, 不需要先放大
+            (rows, cols), scale, offset = preview
+            left = top = offset - scale / 2
+            extent = (left, left + scale * image.shape[1], top + scale * image.shape[0], top)
+            self.ax.imshow(image, cmap="gray", extent=extent)
+            self.ax.set_xlim(-0.5, cols - 0.5)
+            self.ax.set_ylim(rows - 0.5, -0.5)
+        self.ax.set_title("Progressive Image Reconstruction")
+        self.ax.axis("off")
+        plt.draw()
+        plt.pause(self.interval)  # 控制更新速度
+
+    def close(self):
+        if self.figure is not None:
+            plt.pause(self.hold)
+
+def create_sink(display, output_dir=None, fmt="png"):
+    """根据名称创建重建结果的输出端
+
+    Args:
+        display: "interactive", "headless" 或 "dump"
+        output_dir: dump 模式下保存帧的文件夹目录
+        fmt: dump 模式下的文件格式, "png" 或 "npy"
+
+    Returns:
+        sink: 输出端对象
+    """
+    if display == "interactive":
+        return MatplotlibSink()
+    if display == "headless":
+        return NullSink()
+    if display == "dump":
+        return FrameDumpSink(output_dir, fmt)
+    raise ValueError(f"Unknown display mode: {display}.")
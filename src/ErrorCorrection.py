@@ -0,0 +1,300 @@
+import heapq
+import struct
+import zlib
+from src.Protocol import CHECKSUM, pack_block_body, parse_block
+from utils.fec import recover_payload, xor_parity
+from utils.tracing import span
+
+# 数据包: 数据包头 group(I) index(H), 分片或校验, 覆盖前面全部内容的 CRC32 校验和, 网络字节序;
+# index 为 PARITY_INDEX 时为该组的校验包
+PACKET_HEADER = struct.Struct("!IH")
+PARITY_INDEX = 0xFFFF
+# 分片: 分片头 block(I) offset(I) length(I) 之后为数据块帧体的 [offset, offset + 分片长度) 部分,
+# block 为数据块的发送序号, length 为数据块帧体的总长度
+FRAGMENT_HEADER = struct.Struct("!III")
+# 校验: 组内分片个数(H), 之后为各分片长度(I)与各分片的 XOR 校验
+PARITY_HEADER = struct.Struct("!H")
+
+# 事件类型, 同一时刻先处理到达的数据包, 再检查数据组, 最后处理到达发送端的 NACK
+EVENT_ARRIVE = 0
+EVENT_CHECK = 1
+EVENT_NACK = 2
+
+def pack_packet(group, index, payload):
+    """打包数据包, 末尾附加 CRC32 校验和
+
+    Args:
+        group: FEC 组序号
+        index: 组内序号, 校验包为 PARITY_INDEX
+        payload: 分片或校验
+
+    Returns:
+        packet: 数据包字节串
+    """
+    packet = PACKET_HEADER.pack(group, index) + payload
+    return packet + CHECKSUM.pack(zlib.crc32(packet))
+
+def parse_packet(packet):
+    """检查数据包的校验和并解析数据包头
+
+    Args:
+        packet: 数据包字节串
+
+    Returns:
+        group: FEC 组序号
+        index: 组内序号
+        payload: 分片或校验; 数据包损坏时三者均为 None
+    """
+    if len(packet) < PACKET_HEADER.size + CHECKSUM.size:
+        return None, None, None
+    checksum, = CHECKSUM.unpack_from(packet, len(packet) - CHECKSUM.size)
+    if zlib.crc32(packet[:-CHECKSUM.size]) != checksum:
+        return None, None, None
+    group, index = PACKET_HEADER.unpack_from(packet)
+    return group, index, packet[PACKET_HEADER.size:-CHECKSUM.size]
+
+def pack_parity(fragments):
+    """计算一组分片的 XOR 校验
+
+    Args:
+        fragments: 同一组的分片列表
+
+    Returns:
+        payload: 校验包的内容
+    """
+    lengths, parity = xor_parity(fragments)
+    return PARITY_HEADER.pack(len(lengths)) + struct.pack(f"!{len(lengths)}I", *lengths) + parity
+
+def parse_parity(payload):
+    """解析校验包的内容
+
+    Args:
+        payload: pack_parity 得到的字节串
+
+    Returns:
+        lengths: 各分片长度
+        parity: XOR 校验
+    """
+    count, = PARITY_HEADER.unpack_from(payload)
+    lengths = list(struct.unpack_from(f"!{count}I", payload, PARITY_HEADER.size))
+    return lengths, payload[PARITY_HEADER.size + 4 * count:]
+
+class SelectiveRepeatSession:
+    def __init__(self, link, group_size=None, mtu=1400):
+        """在不可靠的数据包链路上传输数据块: 数据块帧体(带 CRC32 校验和)切分为不超过 mtu 字节的数据包,
+        每个数据包另有 CRC32 校验和, 可选地每 group_size 个数据包附加一个 XOR 校验包, 接收端只请求重传
+        无法恢复的数据包
+
+        在 LinkSimulator.send_datagram 的模拟时钟上按时间顺序模拟收发双方: 一组的最后一个数据包预计
+        到达时接收端检查该组, 丢失或损坏的数据包能由校验包恢复时直接恢复, 否则发送 NACK 列出需要重传
+        的组内序号(已收到校验包时少请求一个, 最后一个由校验包恢复)。NACK 经过一个单向时延到达发送端,
+        发送端先发送重传的数据包再发送新数据, 重传的数据包再次丢失时重新请求, 直到全部数据块交付。
+        NACK 很小, 假定不会丢失。数据块的分片到齐后立即交付, 不等待前面丢失的数据块。
+
+        Args:
+            link: LinkSimulator 对象
+            group_size: 每组的数据包个数, None 表示不使用 FEC, 只做选择性重传
+            mtu: 数据包的最大字节数
+
+        Raises:
+            ValueError: group_size 超出数据包头可以表示的范围, 或 mtu 放不下包头时报错
+        """
+        if group_size is not None and not 1 <= group_size < PARITY_INDEX:
+            raise ValueError(f"FEC group size must be in [1, {PARITY_INDEX}), got {group_size}.")
+        overhead = PACKET_HEADER.size + FRAGMENT_HEADER.size + CHECKSUM.size
+        if mtu <= overhead:
+            raise ValueError(f"MTU must be larger than the {overhead} byte packet overhead, got {mtu}.")
+        self.link = link
+        self.group_size = group_size
+        self.fragment_size = mtu - overhead
+        self.stats = {
+            "blocks": 0,                # 数据块个数
+            "payload_bytes": 0,         # 数据块帧体的总字节数(不含重复)
+            "packets": 0,               # 链路上发送的数据包个数
+            "bytes": 0,                 # 链路上发送的总字节数
+            "parity_bytes": 0,          # 校验包字节数
+            "retransmissions": 0,       # 重传的数据包个数
+            "retransmitted_bytes": 0,   # 重传的字节数
+            "nacks": 0,                 # 接收端发出的 NACK 个数
+            "corrupted": 0,             # 校验和不一致而丢弃的数据包个数
+            "recovered": 0,             # 由校验包恢复的数据包个数
+            "time_to_first_image": None,
+            "time_to_complete": None,
+        }
+
+    def run(self, blocks):
+        """按顺序发送数据块, 直到接收端收到或恢复全部数据块
+
+        Args:
+            blocks: EncodedBlock 的可迭代对象, 按传输顺序逐个取出
+
+        Returns:
+            delivered: [(交付时刻, EncodedBlock), ...], 按交付时刻排序
+        """
+        blocks = iter(blocks)
+        rng = self.link.rng
+        outgoing = []       # 发送端: 当前数据块尚未发出的 (分片, (level, block_type, tile_index))
+        groups = []         # 发送端: 每组已发出的 [(分片, 标签), ...], 用于校验与重传
+        latest = []         # 每组当前一轮发送的数据包中最晚的预计到达时刻
+        pending = {}        # 组 -> 本轮尚未发出的重传数据包个数
+        received = []       # 接收端: 每组的 {组内序号: 分片}
+        parities = []       # 接收端: 每组的 (各分片长度, XOR 校验)
+        assembling = {}     # 接收端: 数据块序号 -> [帧体缓冲区, 已收到的字节数]
+        delivered = []
+        retransmit = []     # 等待重传的 (组, 组内序号), 按 NACK 到达的顺序
+        events = []
+        sequence = 0
+        now = 0.0
+        open_group = False
+        exhausted = False
+
+        def push(time, kind, *payload):
+            nonlocal sequence
+            heapq.heappush(events, (time, kind, sequence, payload))
+            sequence += 1
+
+        def send(group, index, payload, label):
+            packet = pack_packet(group, index, payload)
+            arrival, status = self.link.send_datagram(len(packet), *label, not_before=now)
+            self.stats["packets"] += 1
+            self.stats["bytes"] += len(packet)
+            latest[group] = max(latest[group], arrival)
+            if status == "corrupted":
+                # 随机翻转一位, 由接收端的校验和发现
+                packet = bytearray(packet)
+                packet[int(rng.integers(len(packet)))] ^= 1 << int(rng.integers(8))
+                packet = bytes(packet)
+            if status != "lost":
+                push(arrival, EVENT_ARRIVE, packet)
+            return len(packet)
+
+        def close(group):
+            if self.group_size is not None:
+                payload = pack_parity([fragment for fragment, _ in groups[group]])
+                self.stats["parity_bytes"] += send(group, PARITY_INDEX, payload, (None, "parity", (0, 0)))
+            push(latest[group], EVENT_CHECK, group)
+
+        def accept(time, group, index, fragment):
+            received[group][index] = fragment
+            block, offset, length = FRAGMENT_HEADER.unpack_from(fragment)
+            data = fragment[FRAGMENT_HEADER.size:]
+            body, size = assembling.get(block) or (bytearray(length), 0)
+            body[offset:offset + len(data)] = data
+            size += len(data)
+            if size < length:
+                assembling[block] = (body, size)
+                return
+            assembling.pop(block, None)
+            # 数据块帧体的校验和再做一次端到端检查
+            delivered.append((time, parse_block(bytes(body))))
+            # 事件按时间顺序处理, 第一个交付的数据块(不一定是发送的第一个)即第一次近似图像
+            if self.stats["time_to_first_image"] is None:
+                self.stats["time_to_first_image"] = time
+
+        def arrive(time, packet):
+            group, index, payload = parse_packet(packet)
+            if payload is None:
+                self.stats["corrupted"] += 1
+                return
+            if index == PARITY_INDEX:
+                parities[group] = parse_parity(payload)
+            elif index in received[group]:
+                return
+            else:
+                accept(time, group, index, payload)
+            if parities[group] is not None:
+                lengths, parity = parities[group]
+                missing = [i for i in range(len(lengths)) if i not in received[group]]
+                if len(missing) == 1:
+                    fragment = recover_payload(lengths, parity, received[group], missing[0])
+                    self.stats["recovered"] += 1
+                    accept(time, group, missing[0], fragment)
+
+        def check(time, group):
+            missing = [i for i in range(len(groups[group])) if i not in received[group]]
+            if not missing:
+                return
+            if parities[group] is not None:
+                missing = missing[:-1]
+            self.stats["nacks"] += 1
+            push(time + self.link.latency, EVENT_NACK, group, missing)
+
+        with span("selective_repeat", "link") as event:
+            while True:
+                has_data = bool(retransmit or outgoing) or not exhausted
+                if events and (events[0][0] <= max(self.link.busy_until, now) or not has_data):
+                    time, kind, _, payload = heapq.heappop(events)
+                    now = max(now, time)
+                    if kind == EVENT_ARRIVE:
+                        arrive(time, *payload)
+                    elif kind == EVENT_CHECK:
+                        check(time, *payload)
+                    else:
+                        group, indices = payload
+                        retransmit.extend((group, index) for index in indices)
+                        pending[group] = len(indices)
+                        latest[group] = 0.0
+                    continue
+                if not has_data:
+                    break
+
+                if retransmit:
+                    # 重传优先于新数据
+                    group, index = retransmit.pop(0)
+                    fragment, label = groups[group][index]
+                    self.stats["retransmitted_bytes"] += send(group, index, fragment, label)
+                    self.stats["retransmissions"] += 1
+                    pending[group] -= 1
+                    if pending[group] == 0:
+                        push(latest[group], EVENT_CHECK, group)
+                    continue
+
+                if not outgoing:
+                    encoded_block = next(blocks, None)
+                    if encoded_block is None:
+                        exhausted = True
+                        if open_group:
+                            close(len(groups) - 1)
+                            open_group = False
+                        continue
+                    body = pack_block_body(encoded_block)
+                    label = (encoded_block.level, encoded_block.block_type, encoded_block.tile_index)
+                    block = self.stats["blocks"]
+                    outgoing = [(FRAGMENT_HEADER.pack(block, offset, len(body)) +
+                                 body[offset:offset + self.fragment_size], label)
+                                for offset in range(0, len(body), self.fragment_size)]
+                    self.stats["blocks"] += 1
+                    self.stats["payload_bytes"] += len(body)
+                if not open_group:
+                    groups.append([])
+                    latest.append(0.0)
+                    received.append({})
+                    parities.append(None)
+                    open_group = True
+                group = len(groups) - 1
+                fragment, label = outgoing.pop(0)
+                groups[group].append((fragment, label))
+                send(group, len(groups[group]) - 1, fragment, label)
+                if len(groups[group]) == (self.group_size or 1):
+                    close(group)
+                    open_group = False
+
+            delivered.sort(key=lambda item: item[0])
+            if delivered:
+                self.stats["time_to_complete"] = delivered[-1][0]
+            event.set(**{key: value for key, value in self.stats.items() if value is not None})
+        return delivered
+
+    def summary(self):
+        """传输统计信息
+
+        Returns:
+            summary: stats 加上有效吞吐率 goodput(数据块帧体的比特数除以完成时间, bit/s)与
+                额外开销 overhead(包头、校验包与重传的字节数占数据块帧体字节数的比例)
+        """
+        summary = dict(self.stats)
+        complete = summary["time_to_complete"]
+        summary["goodput"] = summary["payload_bytes"] * 8 / complete if complete else None
+        payload = summary["payload_bytes"]
+        summary["overhead"] = (summary["bytes"] - payload) / payload if payload else 0.0
+        return summary
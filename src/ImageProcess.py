@@ -1,5 +1,54 @@
+import os
+import tempfile
+import cv2
 import numpy as np
-import pywt
+from utils.wavelet import dwt2, dwt2_strips, coeff_len, is_integer_wavelet
+from utils.tracing import span, traced
+
+def open_source_image(path, raw_shape=None, raw_dtype="uint16", work_dir=None):
+    """以内存映射方式打开源图像, 不把整幅图像读入内存
+
+    .npy 直接以只读方式映射; .raw/.bin 为无文件头的像素数据, 需要给出尺寸与数据类型;
+    PNG/TIFF 等压缩格式无法直接映射, 解码一次后写入 work_dir 下的临时文件再映射, 解码期间
+    仍需要一份图像大小的内存, 严格受限的场景应预先转换为 .npy 或 .raw。
+
+    Args:
+        path: 图像路径
+        raw_shape: .raw/.bin 图像的尺寸 (rows, cols)
+        raw_dtype: .raw/.bin 图像的数据类型, 默认为 uint16(12 位 X 光图像)
+        work_dir: 临时文件所在的文件夹, 默认为系统临时目录
+
+    Returns:
+        image: 只读的二维 np.memmap
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npy":
+        return np.load(path, mmap_mode="r")
+    if ext in (".raw", ".bin"):
+        if raw_shape is None:
+            raise ValueError(f"The shape of the raw image is required: {path}.")
+        return np.memmap(path, dtype=raw_dtype, mode="r", shape=tuple(raw_shape))
+
+    decoded = cv2.imread(path, cv2.IMREAD_GRAYSCALE | cv2.IMREAD_ANYDEPTH)
+    if decoded is None:
+        raise ValueError(f"Failed to read image: {path}.")
+    image = np.memmap(tempfile.TemporaryFile(dir=work_dir), dtype=decoded.dtype, mode="w+", shape=decoded.shape)
+    image[:] = decoded
+    return image
+
+
+def transform_image(image, wavelet, level):
+    """对图像进行多层小波变换, 定义在模块级别以便提交到进程池
+
+    Args:
+        image: 输入的图像
+        wavelet: 使用的小波名称
+        level: 小波变换的层数
+
+    Returns:
+        coeffs, block_size: 与 ImageTransform.wavelet_transform 相同
+    """
+    return ImageTransform(image, wavelet, level).wavelet_transform()
 
 class ImageTransform:
     def __init__(self, image, wavelet='db2', level=3):
@@ -7,10 +56,11 @@ class ImageTransform:
 
         Args:
             image: 输入的图像，二维数组
-            wavelet: 使用的小波名称，默认是'db2'
+            wavelet: 使用的小波名称，默认是'db2', "int53" 为整数可逆 5/3 小波
             level: 小波变换的层数，默认是3
         """             
-        self.image = np.float32(image)
+        # 整数小波直接在整数像素上计算, 保证可以无损重建
+        self.image = np.int32(image) if is_integer_wavelet(wavelet) else np.float32(image)
         self.wavelet = wavelet
         self.level = level
         self.coeffs = []
@@ -19,6 +69,7 @@ class ImageTransform:
         self.HL = None      # 垂直高频部分
         self.HH = None      # 细节高频部分
 
+    @traced("wavelet_transform", "transform")
     def wavelet_transform(self):
         """对图像进行多层小波变换，生成多层分解后的频域信息。
 
@@ -29,11 +80,58 @@ class ImageTransform:
         current_image = self.image
         block_size = []
         for i in range(self.level):
-            coeff = pywt.dwt2(current_image, self.wavelet)
+            with span("dwt2", "transform", level=i):
+                coeff = dwt2(current_image, self.wavelet)
             LL, (LH, HL, HH) = coeff
             block_size.append(LL.shape)
             self.coeffs.append((LL, LH, HL, HH))
             # 为下一层的小波变换做准备
             current_image = LL
         print(f"Wavelet transform complete. Levels: {self.level}")
-        return self.coeffs, block_size
\ No newline at end of file
+        return self.coeffs, block_size
+
+class StreamingImageTransform(ImageTransform):
+    def __init__(self, image, wavelet='db2', level=3, strip_rows=256, work_dir=None):
+        """按行条带进行小波变换的图像变换类, 用于超大图像
+
+        源图像(通常为 open_source_image 得到的 np.memmap)不转换为 float32 副本, 每一层的四个
+        子带写入 work_dir 下已删除的临时文件并以内存映射访问, 下一层从上一层的 LL 按条带读取。
+        峰值内存只与条带大小有关; 子带文件在最后一个引用(传输队列中的分块)释放后即被回收。
+
+        Args:
+            image: 输入的图像, 二维数组或 np.memmap
+            wavelet: 使用的小波名称，默认是'db2'
+            level: 小波变换的层数，默认是3
+            strip_rows: 每个条带输出的系数行数
+            work_dir: 子带临时文件所在的文件夹, 默认为系统临时目录
+        """
+        self.image = image
+        self.wavelet = wavelet
+        self.level = level
+        self.strip_rows = strip_rows
+        self.work_dir = work_dir
+        self.coeffs = []
+
+    @traced("wavelet_transform", "transform")
+    def wavelet_transform(self):
+        """逐层按条带进行小波变换, 返回值与 ImageTransform.wavelet_transform 相同
+
+        Returns:
+            coeffs: 变换后的频域矩阵, 每个子带为 np.memmap, 本对象不再保留子带的引用
+            block_size: 每个level中block_size的大小, 长度为level
+        """
+        dtype = np.int32 if is_integer_wavelet(self.wavelet) else np.float32
+        current_image = self.image
+        block_size = []
+        for i in range(self.level):
+            shape = (coeff_len(current_image.shape[0], self.wavelet), coeff_len(current_image.shape[1], self.wavelet))
+            bands = tuple(np.memmap(tempfile.TemporaryFile(dir=self.work_dir), dtype=dtype, mode="w+", shape=shape)
+                          for _ in range(4))
+            with span("dwt2_strips", "transform", level=i):
+                dwt2_strips(current_image, self.wavelet, bands, self.strip_rows)
+            block_size.append(shape)
+            self.coeffs.append(bands)
+            current_image = bands[0]
+        print(f"Streaming wavelet transform complete. Levels: {self.level}")
+        coeffs, self.coeffs = self.coeffs, []
+        return coeffs, block_size
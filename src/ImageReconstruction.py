@@ -1,114 +1,286 @@
 import os
 import numpy as np
-import pywt 
 import matplotlib.pyplot as plt
 from matplotlib import rcParams
+from src.DisplaySink import MatplotlibSink, Preview, upscale
+from utils.wavelet import (idwt2, is_integer_wavelet, image_extent, idwt_len, approximation_gain,
+                           approximation_offset)
+from utils.bitplane import RefinementPass, dequantize
+from utils.tracing import span, traced
+from utils.metrics import QualityMetrics, mse
 
 rcParams['font.family'] = 'SimHei'  # SimHei 是黑体，你也可以使用其他字体，如 Microsoft YaHei
 rcParams['axes.unicode_minus'] = False  # 解决负号显示为方块的问题
 class ImageReconstruction:
-    def __init__(self, origin_image, block_size, level = 3, wavelet="db2"):
+    def __init__(self, origin_image, block_size, level = 3, wavelet="db2", tile_size=None, sink=None, roi=None,
+                 metric_stride=1, ssim=False, preview=True):
         """图像重建类，逐步重建图像
 
         Args:
-            origin_image: 原始图像
+            origin_image: 原始图像, 用于计算 MSE 损失; 接收端没有原图时为 None
             block_size: 每个level中block_size的大小
             level: 小波变换的层数，默认是3
             wavelet: 使用的小波名称，默认是'db2'
+            tile_size: 发送端的分块边长, None 表示每个子带作为一个整体传输
+            sink: 重建结果的输出端(见 src/DisplaySink.py), 默认为交互式 matplotlib 显示
+            roi: 感兴趣区域 (x0, y0, x1, y1), 有原图时额外记录该区域内的 MSE 损失
+            metric_stride: 有原图时每隔多少行、列采样计算画质指标, 1 表示逐像素计算
+            ssim: 有原图时是否额外记录 SSIM
+            preview: 第 0 层细节到达之前只逆变换到已有细节的最浅层级, 显示该分辨率下的近似图像并由
+                输出端放大; False 时每一步都逆变换到原图尺寸
         """        
 
-        self.origin_image = np.float32(origin_image)
-        self.image_shape = origin_image.shape
+        self.origin_image = None if origin_image is None else np.float32(origin_image)
         self.wavelet = wavelet
         self.level = level
         self.block_size = block_size
-        #init coeffs to zero due to block_size
-        self.coeffs = [np.zeros((4 * block_size[i][0], 4 * block_size[i][1])) for i in range(level)]
-        self.figure = None
-        self.ax = None
+        self.tile_size = tile_size
+        # 每一层按 block_size 分配同尺寸的细节子带, 未接收的位置为 0, 整数小波使用 int32, 其余使用 float32
+        # 只有最深一层需要预先分配 LL, 中间层的 LL 由更深一层逆变换得到(见 reconstructed)
+        self.dtype = np.int32 if is_integer_wavelet(wavelet) else np.float32
+        self.coeffs = [
+            {block_type: np.zeros(block_size[i], dtype=self.dtype) for block_type in ("LH", "HL", "HH")}
+            for i in range(level)
+        ]
+        self.coeffs[level - 1]["LL"] = np.zeros(block_size[level - 1], dtype=self.dtype)
+        # 每一层逆变换结果的缓存, reconstructed[i] 为由第 i 层系数重建得到的上一层 LL(第 0 层即为完整图像)
+        self.reconstructed = [None] * level
+        # 需要重新计算的最深层级, None 表示缓存仍然有效
+        self.dirty_level = level - 1
+        # 已接收的数据单元 {(level, block_type, tile_index): 次数}, 位平面模式下每次细化计一次
+        self.received = {}
+        # 位平面模式下每个数据单元已收到的 (幅值, 符号, 量化步长, 最低位平面)
+        self.bitplanes = {}
+        # 位平面模式下每个数据单元已收到的细化 {(level, block_type, tile_index): {每次细化的最低位平面}},
+        # 中间某次细化丢失时断点续传据此只重新发送这一次
+        self.planes = {}
+        self.sink = sink if sink is not None else MatplotlibSink()
+        self.step = 0
         self.mse_losses = []
-        
+        self.roi = roi
+        self.roi_mse_losses = []
+        self.psnr_values = []
+        self.ssim_values = []
+        # 画质指标按行条带增量计算, changed_rows 为上一次计算之后重建图像中可能变化的行范围
+        self.metrics = None
+        if self.origin_image is not None:
+            self.metrics = QualityMetrics(self.origin_image, stride=metric_stride, ssim=ssim)
+        self.changed_rows = None
+        # 已收到细节系数的最浅层级, 等于 level 时只有最深一层的 LL
+        self.finest_level = level
+        self.preview = preview
+        # 上一次显示的分辨率, 0 为原图尺寸, k 为第 k 层的近似图像
+        self.shown_resolution = 0
+        # 完整重建图像的尺寸(与 reconstructed[0] 相同), 预览图像放大到该尺寸
+        self.image_shape = tuple(idwt_len(length, wavelet) for length in block_size[0])
+
 
-    def add_received_block(self, level, block_type, block_data):
+    def add_received_block(self, level, block_type, block_data, tile_index=(0, 0)):
         """接收频域信息， 并更新显示
 
         Args:
             level: 小波变换的层数
             block_type: 频域的类型
             block_data: 频域数据
+            tile_index: 数据块在子带中的分块坐标 (row, col)
         """        
-        block_size = self.block_size[level][0]
-        if block_type == "LL":
-            row_start, row_end = 0, block_size
-            col_start, col_end = 0, block_size
-        elif block_type == "LH":
-            row_start, row_end = 0, block_size
-            col_start, col_end = block_size, 2 * block_size
-        elif block_type == "HL":
-            row_start, row_end = block_size, 2 * block_size
-            col_start, col_end = 0, block_size
-        elif block_type == "HH":
-            row_start, row_end = block_size, 2 * block_size
-            col_start, col_end = block_size, 2 * block_size
-        
-        self.coeffs[level][row_start:row_end, col_start:col_end] = block_data
+        self.place_block(level, block_type, block_data, tile_index)
 
         # 更新显示
-        self._update_display()
+        self.refresh()
 
-    def _update_display(self):
-        """更新显示当前阶段的图像重建结果
-        """        
-        if self.figure is None or self.ax is None:
-            # 初始化绘图窗口
-            self.figure, self.ax = plt.subplots()
-            plt.ion()  # 打开交互模式
+    @traced("place_block", "reconstruction")
+    def place_block(self, level, block_type, block_data, tile_index=(0, 0)):
+        """将频域信息写入系数矩阵, 并标记需要重新逆变换的层级
+
+        Args:
+            level: 小波变换的层数
+            block_type: 频域的类型
+            block_data: 频域数据, 或位平面模式下的一次细化 RefinementPass
+            tile_index: 数据块在子带中的分块坐标 (row, col)
+        """
+        unit = (level, block_type, tile_index)
+        self.received[unit] = self.received.get(unit, 0) + 1
+        if isinstance(block_data, RefinementPass):
+            block_data = self._refine(unit, block_data)
+        if self.dtype == np.int32 and not np.issubdtype(block_data.dtype, np.integer):
+            # 死区量化后的整数小波系数反量化为浮点数, 写入整数系数前取整而不是截断
+            block_data = np.rint(block_data)
+        tile_size = self.tile_size or 0
+        row_start, col_start = tile_index[0] * tile_size, tile_index[1] * tile_size
+        rows, cols = block_data.shape
+
+        # 中间层的 LL 由更深一层逆变换得到, 重建时不会用到, 仅保存下来且无需作废缓存
+        if block_type == "LL" and level != self.level - 1:
+            if "LL" not in self.coeffs[level]:
+                self.coeffs[level]["LL"] = np.zeros(self.block_size[level], dtype=self.dtype)
+            self.coeffs[level]["LL"][row_start:row_start + rows, col_start:col_start + cols] = block_data
+            return
+        self.coeffs[level][block_type][row_start:row_start + rows, col_start:col_start + cols] = block_data
+        if self.metrics is not None:
+            start, end = image_extent(row_start, row_start + rows, level, self.wavelet, self.metrics.shape[0])
+            if self.changed_rows is not None:
+                start, end = min(start, self.changed_rows[0]), max(end, self.changed_rows[1])
+            self.changed_rows = (start, end)
+
+        if self.dirty_level is None or level > self.dirty_level:
+            self.dirty_level = level
+        if block_type != "LL":
+            self.finest_level = min(self.finest_level, level)
+
+    def tile_view(self, level, block_type, tile_index):
+        """数据单元在系数矩阵中对应的区域
+
+        Args:
+            level: 小波变换的层数
+            block_type: 频域的类型
+            tile_index: 数据块在子带中的分块坐标 (row, col)
+
+        Returns:
+            view: 系数矩阵的视图, 中间层的 LL 尚未收到时为 None
+        """
+        band = self.coeffs[level].get(block_type)
+        if band is None:
+            return None
+        if self.tile_size is None:
+            return band
+        row_start, col_start = tile_index[0] * self.tile_size, tile_index[1] * self.tile_size
+        return band[row_start:row_start + self.tile_size, col_start:col_start + self.tile_size]
+
+    def _refine(self, unit, refinement):
+        """把一次位平面细化累加到该数据单元已收到的幅值上, 并重建当前精度下的系数
+
+        Args:
+            unit: (level, block_type, tile_index)
+            refinement: RefinementPass
 
-        # 重建当前图像
-        reconstructed_image = self.reconstruct_image()
+        Returns:
+            block_data: 当前精度下的系数
+        """
+        if unit not in self.bitplanes:
+            self.bitplanes[unit] = (np.zeros(refinement.increment.shape, dtype=np.uint32),
+                                    np.zeros(refinement.increment.shape, dtype=bool), None, None)
+        magnitude, negative, _, plane_lo = self.bitplanes[unit]
+        self.planes.setdefault(unit, set()).add(refinement.plane_lo)
+        magnitude |= refinement.increment
+        negative |= refinement.negative
+        # 有损链路上选择性重传的细化可能晚于更低位平面的细化到达, 取已收到的最低位平面
+        plane_lo = refinement.plane_lo if plane_lo is None else min(plane_lo, refinement.plane_lo)
+        self.bitplanes[unit] = (magnitude, negative, refinement.step, plane_lo)
+        return dequantize(magnitude, negative, refinement.step, plane_lo)
+
+    def refresh(self):
+        """更新显示当前阶段的图像重建结果, 并记录画质指标
+
+        add_received_block 在每个数据块之后调用; 只用 place_block 写入系数(断点恢复、合并多个数据块)
+        时由调用方在写入完成后调用。
+        """
+        self.show_frame(*self.prepare_frame())
+
+    def prepare_frame(self):
+        """重建当前阶段的图像、放大预览并记录画质指标, 不涉及显示, 可以在工作线程中执行
+
+        Returns:
+            image: 要显示的图像
+            preview: 需要由输出端放大的预览信息 Preview, 已放大或完整图像时为 None
+        """
+        # 重建当前可用的最高分辨率图像
+        reconstructed_image, resolution = self.render()
+        preview = None
+        if resolution > 0:
+            preview = Preview(self.image_shape, 2 ** resolution, approximation_offset(self.wavelet, resolution))
+            if self.metrics is not None or self.sink.full_size:
+                # 画质指标针对显示出来的放大图像, 放大后整幅图像都会变化
+                with span("upscale", "reconstruction", resolution=resolution):
+                    reconstructed_image, preview = upscale(reconstructed_image, preview), None
+
+        if self.metrics is not None:
+            with span("quality_metrics", "metrics"):
+                # 预览之后第一次显示完整图像时整幅图像都与上一次不同
+                rows = self.changed_rows or (0, 0) if self.shown_resolution == 0 else None
+                quality = self.metrics.update(reconstructed_image, rows)
+                self.changed_rows = None
+                self.mse_losses.append(quality["mse"])  # 保存 MSE 损失
+                self.psnr_values.append(quality["psnr"])
+                if "ssim" in quality:
+                    self.ssim_values.append(quality["ssim"])
+                if self.roi is not None:
+                    x0, y0, x1, y1 = self.roi
+                    self.roi_mse_losses.append(
+                        self.calculate_mse(self.origin_image[y0:y1, x0:x1], reconstructed_image[y0:y1, x0:x1]))
+
+        self.shown_resolution = resolution
+        return reconstructed_image, preview
+
+    def show_frame(self, image, preview=None):
+        """把 prepare_frame 得到的图像交给输出端显示, 交互式绘图时需在主线程中调用
+
+        Args:
+            image: 要显示的图像
+            preview: Preview 或 None
+        """
+        with span("display", "display", step=self.step):
+            self.sink.show(image, self.step, preview)
+        self.step += 1
+
+    def render(self):
+        """重建当前可以显示的最高分辨率的图像
 
-        mse = self.calculate_mse(self.origin_image, reconstructed_image)
-        self.mse_losses.append(mse)  # 保存 MSE 损失
+        第 0 层的细节系数到达之前, 更浅层级的细节全为 0, 逆变换到原图尺寸只是对低分辨率图像插值;
+        此时只逆变换到已有细节的最浅层级, 返回该层的近似图像(已除以 LL 的直流增益, 与像素值同量级),
+        由输出端按 Preview 给出的位置放大显示。第 0 层细节到达后逆变换到原图尺寸。
 
-        self.ax.clear()
-        self.ax.imshow(reconstructed_image, cmap="gray")
-        self.ax.set_title("Progressive Image Reconstruction")
-        self.ax.axis("off")
-        plt.draw()
-        plt.pause(0.1)  # 控制更新速度
+        Returns:
+            image: 重建得到的图像, resolution 大于 0 时为长宽约 1/2^resolution 的近似图像
+            resolution: 图像的分辨率层级, 0 为原图尺寸
+        """
+        resolution = self.finest_level if self.preview else 0
+        image = self.reconstruct_image(stop_level=resolution)
+        if resolution > 0:
+            image = np.float32(image) * np.float32(approximation_gain(self.wavelet) ** -resolution)
+        return image, resolution
 
-    def reconstruct_image(self):
+    def reconstruct_image(self, incremental=True, stop_level=0):
         """使用小波逆变换从小波系数逐层重建图像，从最后一层开始，逐步恢复出原始图像
 
+        增量模式下只从最近一次收到数据的最深层级开始逆变换, 更深层级直接使用缓存的结果
+
+        Args:
+            incremental: 是否使用缓存的逐层重建结果, False 时从最深层重新计算全部层级
+            stop_level: 只逆变换到该层级为止, 返回第 stop_level 层的 LL(未除以直流增益); 0 为完整图像,
+                level 为接收到的最深一层 LL
+
         Returns:
             reconstructed_image: 重建得到的图像
         """        
-        # 从最后一层开始逐步重建
-        reconstructed_image = None
+        start_level = self.dirty_level if incremental else self.level - 1
+        if start_level is None:
+            return self._approximation(stop_level)
 
-        for level_idx in reversed(range(self.level)):
-            # 当前层的小波系数 (LL, LH, HL, HH)
+        for level_idx in range(start_level, stop_level - 1, -1):
             coeffs_level = self.coeffs[level_idx]
-            
-            # 切分各个方向的系数块
-            LL = coeffs_level[0:self.block_size[level_idx][0], 0:self.block_size[level_idx][1]]
-            LH = coeffs_level[0:self.block_size[level_idx][0], self.block_size[level_idx][1]:2*self.block_size[level_idx][1]]
-            HL = coeffs_level[self.block_size[level_idx][0]:2*self.block_size[level_idx][0], 0:self.block_size[level_idx][1]]
-            HH = coeffs_level[self.block_size[level_idx][0]:2*self.block_size[level_idx][0], self.block_size[level_idx][1]:2*self.block_size[level_idx][1]]
-
-            # 合并成一个系数元组
-            coeff_tuple = (LL, (LH, HL, HH))
-            
-            # 如果是最后一层，直接使用当前系数块重建图像
-            if reconstructed_image is None:
-                reconstructed_image = pywt.idwt2(coeff_tuple, wavelet=self.wavelet)
+            LH, HL, HH = coeffs_level["LH"], coeffs_level["HL"], coeffs_level["HH"]
+
+            # 最深一层使用接收到的 LL, 其余层级使用更深一层的重建结果作为 LL
+            if level_idx == self.level - 1:
+                LL = coeffs_level["LL"]
             else:
-                # 否则，进行上采样并重建
-                reconstructed_image = pywt.idwt2((reconstructed_image, coeff_tuple[1]), wavelet=self.wavelet)
-            reconstructed_image = self.crop_to_expected(reconstructed_image, level_idx - 1)
+                LL = self.reconstructed[level_idx + 1]
+
+            with span("idwt2", "reconstruction", level=level_idx):
+                reconstructed_image = idwt2((LL, (LH, HL, HH)), wavelet=self.wavelet)
+            self.reconstructed[level_idx] = self.crop_to_expected(reconstructed_image, level_idx - 1)
 
-        # 最终重建的图像已经恢复为原始尺寸
-        return reconstructed_image
+        # 更浅的层级仍需在之后逆变换
+        if start_level >= stop_level:
+            self.dirty_level = stop_level - 1 if stop_level > 0 else None
+        return self._approximation(stop_level)
+
+    def _approximation(self, level):
+        """第 level 层的 LL: 最深一层为接收到的系数, 其余为逆变换的缓存, 第 0 层即为完整图像"""
+        if level == self.level:
+            return self.coeffs[level - 1]["LL"]
+        return self.reconstructed[level]
     
     def crop_to_expected(self, image, level):
         """当逆变换的尺寸与正变换不相同时候对逆变换的结果进行裁剪处理
@@ -135,22 +307,48 @@ class ImageReconstruction:
         Returns:
             loss: 原图与重建图像之间的均方误差(mse)损失
         """        
-        return np.mean((original_image - reconstructed_image) ** 2)
+        rows, cols = original_image.shape
+        return mse(original_image, reconstructed_image[:rows, :cols])
     
-    def plot_loss(self, mes_losses_dir):
-        """绘制MSE损失的折线图, 并保存
+    def plot_loss(self, mes_losses_dir, estimated_losses=None):
+        """绘制MSE损失的折线图, 并保存; 记录了 PSNR / SSIM 时另外保存画质曲线
 
         Args:
             mes_losses_dir: 折线图保存的文件夹目录
+            estimated_losses: 发送端由未传输系数能量估计的每一步 MSE, None 表示不绘制
         """        
         # 绘制损失曲线
         plt.figure(figsize=(10, 6))
-        plt.plot(self.mse_losses, marker='o', linestyle='-', color='b', label="均方误差损失")
+        if self.mse_losses:
+            plt.plot(self.mse_losses, marker='o', linestyle='-', color='b', label="均方误差损失")
+        if self.roi_mse_losses:
+            plt.plot(self.roi_mse_losses, marker='.', linestyle='-', color='r', label="感兴趣区域的均方误差损失")
+        if estimated_losses:
+            plt.plot(estimated_losses, linestyle='--', color='g', label="发送端估计的均方误差损失")
+        if self.roi_mse_losses or estimated_losses:
+            plt.legend()
         plt.xlabel("图像重建步骤")
         plt.ylabel("均方误差损失")
         plt.title("图像重建过程中的均方误差损失")
         plt.grid(True)
         
-        mes_losses_dir = os.path.join(mes_losses_dir, "loss_curve.png")
-        plt.savefig(mes_losses_dir)
+        loss_curve_dir = os.path.join(mes_losses_dir, "loss_curve.png")
+        plt.savefig(loss_curve_dir)
         plt.close()  # 关闭当前图像，避免图像累积
+
+        if not self.psnr_values:
+            return
+        # 画质曲线: 左轴为 PSNR, 记录了 SSIM 时右轴为 SSIM
+        fig, psnr_axis = plt.subplots(figsize=(10, 6))
+        psnr_axis.plot(self.psnr_values, marker='o', linestyle='-', color='b', label="峰值信噪比")
+        psnr_axis.set_xlabel("图像重建步骤")
+        psnr_axis.set_ylabel("峰值信噪比 (dB)")
+        psnr_axis.grid(True)
+        if self.ssim_values:
+            ssim_axis = psnr_axis.twinx()
+            ssim_axis.plot(self.ssim_values, marker='.', linestyle='-', color='r', label="结构相似性")
+            ssim_axis.set_ylabel("结构相似性")
+            fig.legend(loc="lower right")
+        psnr_axis.set_title("图像重建过程中的画质")
+        fig.savefig(os.path.join(mes_losses_dir, "quality_curve.png"))
+        plt.close(fig)
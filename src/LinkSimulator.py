@@ -0,0 +1,149 @@
+import json
+import os
+import numpy as np
+
+class LinkSimulator:
+    def __init__(self, rate=16e6, latency=0.0, jitter=0.0, loss_rate=0.0, seed=None, corrupt_rate=0.0):
+        """链路模拟类，按带宽、时延、抖动与丢包率计算每个数据块的到达时间
+
+        使用模拟时钟而不是真实的 sleep: send 模拟可靠传输, 数据块按发送顺序依次占用链路, 丢失的
+        数据块在超时(一个往返时延)后重传, 接收端按顺序交付; send_datagram 模拟不可靠的数据包链路,
+        每个数据包只发送一次, 可能丢失或损坏, 由调用方负责纠错与重传(见 src/ErrorCorrection.py)。
+
+        Args:
+            rate: 链路速率（bit/s），默认 16 Mbps
+            latency: 单向传播时延（秒）
+            jitter: 时延抖动的标准差（秒）
+            loss_rate: 每次发送丢失的概率
+            seed: 随机种子
+            corrupt_rate: send_datagram 中未丢失的数据包在传输中损坏的概率
+        """
+        if rate <= 0:
+            raise ValueError(f"Link rate must be positive, got {rate}.")
+        if not 0 <= loss_rate < 1:
+            raise ValueError(f"Loss rate must be in [0, 1), got {loss_rate}.")
+        if not 0 <= corrupt_rate < 1:
+            raise ValueError(f"Corrupt rate must be in [0, 1), got {corrupt_rate}.")
+        self.rate = rate
+        self.latency = latency
+        self.jitter = jitter
+        self.loss_rate = loss_rate
+        self.corrupt_rate = corrupt_rate
+        self.rng = np.random.default_rng(seed)
+        self.busy_until = 0.0       # 链路空闲的时刻
+        self.last_arrival = 0.0     # 上一个数据块交付的时刻
+        self.timeline = []
+
+    def send(self, nbytes, level, block_type, tile_index=(0, 0)):
+        """模拟发送一个数据块
+
+        Args:
+            nbytes: 数据块字节数
+            level: 数据块所在的层级
+            block_type: 数据块类型
+            tile_index: 数据块在子带中的分块坐标
+
+        Returns:
+            arrival: 数据块在接收端交付的模拟时刻（秒）
+        """
+        transfer_time = nbytes * 8 / self.rate
+        start = self.busy_until
+        attempts = 1
+        # 每次丢包都要重新占用链路, 并等待一个往返时延的超时; 校验和不一致的数据块同样被丢弃
+        while self.rng.random() < self.loss_rate or (self.corrupt_rate and self.rng.random() < self.corrupt_rate):
+            start += transfer_time + 2 * self.latency
+            attempts += 1
+        self.busy_until = start + transfer_time
+
+        delay = self.latency
+        if self.jitter > 0:
+            delay = max(0.0, delay + self.rng.normal(0, self.jitter))
+        # 按顺序交付, 抖动不会让后发的数据块先到达
+        arrival = max(self.busy_until + delay, self.last_arrival)
+        self.last_arrival = arrival
+
+        self.timeline.append({
+            "level": level,
+            "block_type": block_type,
+            "tile_index": list(tile_index),
+            "bytes": nbytes,
+            "start": start,
+            "arrival": arrival,
+            "attempts": attempts,
+        })
+        return arrival
+
+    def send_datagram(self, nbytes, level, block_type, tile_index=(0, 0), not_before=0.0):
+        """模拟在不可靠链路上发送一个数据包, 不重传, 到达顺序不作保证
+
+        Args:
+            nbytes: 数据包字节数
+            level: 数据块所在的层级, 校验包为 None
+            block_type: 数据块类型, 校验包为 "parity"
+            tile_index: 数据块在子带中的分块坐标
+            not_before: 最早的发送时刻, 例如重传请求到达发送端的时刻
+
+        Returns:
+            arrival: 数据包到达接收端的模拟时刻, 丢失时为本应到达的时刻
+            status: "delivered", "lost" 或 "corrupted"
+        """
+        start = max(self.busy_until, not_before)
+        self.busy_until = start + nbytes * 8 / self.rate
+        delay = self.latency
+        if self.jitter > 0:
+            delay = max(0.0, delay + self.rng.normal(0, self.jitter))
+        arrival = self.busy_until + delay
+        status = "delivered"
+        if self.rng.random() < self.loss_rate:
+            status = "lost"
+        elif self.rng.random() < self.corrupt_rate:
+            status = "corrupted"
+        else:
+            self.last_arrival = max(self.last_arrival, arrival)
+
+        self.timeline.append({
+            "level": level,
+            "block_type": block_type,
+            "tile_index": list(tile_index),
+            "bytes": nbytes,
+            "start": start,
+            "arrival": arrival,
+            "attempts": 1,
+            "status": status,
+        })
+        return arrival, status
+
+    def time_to_first_image(self):
+        """第一个数据块到达的时刻, 即接收端可以显示第一次近似图像的时间"""
+        delivered = [entry["arrival"] for entry in self.timeline if entry.get("status", "delivered") == "delivered"]
+        return min(delivered) if delivered else None
+
+    def time_to_complete(self):
+        """最后一个数据块到达的时刻, 即得到最终图像的时间"""
+        return self.last_arrival if self.timeline else None
+
+    def summary(self):
+        """链路统计信息
+
+        Returns:
+            summary: 包含数据块数、总字节数、重传次数与关键时间点的字典
+        """
+        return {
+            "blocks": len(self.timeline),
+            "bytes": sum(entry["bytes"] for entry in self.timeline),
+            "retransmissions": sum(entry["attempts"] - 1 for entry in self.timeline),
+            "lost": sum(entry.get("status") == "lost" for entry in self.timeline),
+            "corrupted": sum(entry.get("status") == "corrupted" for entry in self.timeline),
+            "time_to_first_image": self.time_to_first_image(),
+            "time_to_complete": self.time_to_complete(),
+        }
+
+    def save_timeline(self, timeline_dir):
+        """将到达时间线与统计信息保存为 JSON
+
+        Args:
+            timeline_dir: 保存时间线的文件夹目录
+        """
+        timeline_path = os.path.join(timeline_dir, "link_timeline.json")
+        with open(timeline_path, "w") as f:
+            json.dump({"summary": self.summary(), "timeline": self.timeline}, f, indent=2)
@@ -0,0 +1,291 @@
+import asyncio
+import json
+import os
+import socket
+import struct
+import zlib
+from src.Transmission import EncodedBlock
+from utils.tracing import span
+from utils.codec import codec_id, codec_name
+
+# 帧格式: 公共帧头 | 帧体
+# 公共帧头: magic(2s) version(B) frame_type(B) body_length(I), 网络字节序
+FRAME_HEADER = struct.Struct("!2sBBI")
+MAGIC = b"PT"
+VERSION = 3
+
+# 帧类型
+FRAME_HELLO = 0     # 接收端 -> 发送端, JSON 帧体, 会话请求(可选的图像名、感兴趣区域与断点续传清单)
+FRAME_SESSION = 1   # 发送端 -> 接收端, JSON 帧体, 图像尺寸、小波、各层子带尺寸与断点续传跳过的数据块数
+FRAME_BLOCK = 2     # 发送端 -> 接收端, 数据块头 + 编码数据
+FRAME_END = 3       # 发送端 -> 接收端, 传输结束
+FRAME_ERROR = 4     # 发送端 -> 接收端, JSON 帧体, 无法建立会话的原因(例如请求的图像不存在)
+
+# 数据块头: codec(B) level(B) band(B) flags(B) tile_row(H) tile_col(H) rows(I) cols(I) min(d) max(d) step(d)
+# step 为死区量化步长, 0 表示未做死区量化
+BLOCK_HEADER = struct.Struct("!BBBBHHIIddd")
+# 数据块头之后为 CRC32 校验和, 覆盖数据块头与编码数据
+CHECKSUM = struct.Struct("!I")
+
+# codec 为编码编号, 由 utils/codec.py 的注册表分配(CODEC_JP2 = 0, CODEC_BITPLANE = 1)
+# flags: 数据块的最小/最大值为整数(整数小波的无损模式)
+FLAG_INTEGER = 1
+BAND_IDS = {"LL": 0, "LH": 1, "HL": 2, "HH": 3}
+BAND_NAMES = {band_id: band for band, band_id in BAND_IDS.items()}
+
+def parse_address(address):
+    """解析地址字符串, "host:port" 为 TCP 地址, 其余视为 Unix socket 路径
+
+    Args:
+        address: 地址字符串
+
+    Returns:
+        family: socket 地址族
+        address: socket 地址
+    """
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return socket.AF_INET, (host or "127.0.0.1", int(port))
+    return socket.AF_UNIX, address
+
+def listen(address):
+    """在指定地址上监听连接
+
+    Args:
+        address: "host:port" 或 Unix socket 路径
+
+    Returns:
+        server: 处于监听状态的 socket
+    """
+    family, address = parse_address(address)
+    server = socket.socket(family, socket.SOCK_STREAM)
+    if family == socket.AF_UNIX:
+        if os.path.exists(address):
+            os.unlink(address)
+    else:
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(address)
+    server.listen()
+    return server
+
+def connect(address):
+    """连接到指定地址
+
+    Args:
+        address: "host:port" 或 Unix socket 路径
+
+    Returns:
+        sock: 已连接的 socket
+    """
+    family, address = parse_address(address)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.connect(address)
+    if family == socket.AF_INET:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+def send_frame(sock, frame_type, header=b"", payload=b""):
+    """发送一帧, 帧头与数据通过 sendmsg 一次提交, 数据部分以 memoryview 发送避免拷贝
+
+    Args:
+        sock: 已连接的 socket
+        frame_type: 帧类型
+        header: 帧体中的头部字节
+        payload: 帧体中的数据部分
+    """
+    payload = memoryview(payload).cast("B")
+    buffers = [FRAME_HEADER.pack(MAGIC, VERSION, frame_type, len(header) + len(payload)) + header, payload]
+    remaining = sum(len(buffer) for buffer in buffers)
+    with span("send_frame", "wire", bytes=remaining):
+        _send_buffers(sock, buffers, remaining)
+
+def _send_buffers(sock, buffers, remaining):
+    """通过 sendmsg 发送全部缓冲区, 处理部分发送"""
+    while remaining:
+        sent = sock.sendmsg(buffers)
+        remaining -= sent
+        # 处理部分发送: 丢弃已发送的部分
+        while sent:
+            if sent >= len(buffers[0]):
+                sent -= len(buffers[0])
+                buffers.pop(0)
+            else:
+                buffers[0] = memoryview(buffers[0])[sent:]
+                sent = 0
+
+def recv_exactly(sock, size):
+    """接收固定长度的数据, 直接写入预先分配的缓冲区
+
+    Args:
+        sock: 已连接的 socket
+        size: 需要接收的字节数
+
+    Returns:
+        buffer: 长度为 size 的 memoryview
+    """
+    buffer = memoryview(bytearray(size))
+    received = 0
+    while received < size:
+        n = sock.recv_into(buffer[received:])
+        if n == 0:
+            raise ConnectionError("Connection closed while receiving a frame.")
+        received += n
+    return buffer
+
+def recv_frame(sock):
+    """接收一帧
+
+    Args:
+        sock: 已连接的 socket
+
+    Raises:
+        ValueError: 帧头的 magic 或版本号不匹配时报错
+
+    Returns:
+        frame_type: 帧类型
+        body: 帧体 memoryview
+    """
+    magic, version, frame_type, length = FRAME_HEADER.unpack(recv_exactly(sock, FRAME_HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Unexpected frame header: magic {magic!r}, version {version}.")
+    # 只统计帧体的接收时间, 等待下一帧的时间不计入
+    with span("recv_frame", "wire", bytes=length):
+        return frame_type, recv_exactly(sock, length)
+
+async def read_frame(reader):
+    """从 asyncio StreamReader 接收一帧
+
+    Args:
+        reader: asyncio.StreamReader
+
+    Raises:
+        ValueError: 帧头的 magic 或版本号不匹配时报错
+
+    Returns:
+        frame_type: 帧类型
+        body: 帧体 memoryview
+    """
+    magic, version, frame_type, length = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Unexpected frame header: magic {magic!r}, version {version}.")
+    return frame_type, memoryview(await reader.readexactly(length))
+
+async def open_connection(address):
+    """建立 asyncio 连接
+
+    Args:
+        address: "host:port" 或 Unix socket 路径
+
+    Returns:
+        reader: asyncio.StreamReader
+        writer: asyncio.StreamWriter
+    """
+    family, address = parse_address(address)
+    if family == socket.AF_UNIX:
+        return await asyncio.open_unix_connection(address)
+    return await asyncio.open_connection(*address)
+
+def pack_frame(frame_type, body=b""):
+    """将一帧打包为字节串, 用于 asyncio StreamWriter"""
+    return FRAME_HEADER.pack(MAGIC, VERSION, frame_type, len(body)) + body
+
+def pack_json(frame_type, message):
+    """将控制帧打包为字节串, 用于 asyncio StreamWriter"""
+    return pack_frame(frame_type, json.dumps(message).encode("utf-8"))
+
+def send_json(sock, frame_type, message):
+    """发送 JSON 帧体的控制帧(HELLO / SESSION)"""
+    sock.sendall(pack_json(frame_type, message))
+
+def parse_json(body):
+    """解析 JSON 帧体"""
+    return json.loads(bytes(body).decode("utf-8"))
+
+def pack_block_header(encoded_block):
+    """打包数据块头与校验和
+
+    Args:
+        encoded_block: EncodedBlock
+
+    Returns:
+        header: 数据块头与 CRC32 校验和的字节串
+    """
+    flags = FLAG_INTEGER if isinstance(encoded_block.block_min, int) else 0
+    header = BLOCK_HEADER.pack(
+        codec_id(encoded_block.codec), encoded_block.level, BAND_IDS[encoded_block.block_type], flags,
+        encoded_block.tile_index[0], encoded_block.tile_index[1], encoded_block.shape[0], encoded_block.shape[1],
+        encoded_block.block_min, encoded_block.block_max, encoded_block.step or 0.0,
+    )
+    return header + CHECKSUM.pack(zlib.crc32(encoded_block.compressed_data, zlib.crc32(header)))
+
+def pack_block_body(encoded_block):
+    """把数据块帧体(数据块头、校验和与编码数据)拼接为一个字节串, 用于按数据包发送与 FEC 校验
+
+    Args:
+        encoded_block: EncodedBlock
+
+    Returns:
+        body: FRAME_BLOCK 的帧体
+    """
+    return pack_block_header(encoded_block) + bytes(encoded_block.compressed_data)
+
+def verify_block(body):
+    """检查数据块帧体的 CRC32 校验和
+
+    Args:
+        body: FRAME_BLOCK 的帧体
+
+    Returns:
+        valid: 帧体完整且校验和一致
+    """
+    size = BLOCK_HEADER.size + CHECKSUM.size
+    if len(body) < size:
+        return False
+    body = memoryview(body)
+    checksum, = CHECKSUM.unpack_from(body, BLOCK_HEADER.size)
+    return zlib.crc32(body[size:], zlib.crc32(body[:BLOCK_HEADER.size])) == checksum
+
+def pack_block(encoded_block):
+    """将数据块帧打包为帧头与编码数据两部分, 用于 asyncio StreamWriter.writelines, 编码数据不做拷贝
+
+    Args:
+        encoded_block: EncodedBlock
+
+    Returns:
+        buffers: [帧头 + 数据块头, 编码数据]
+    """
+    header = pack_block_header(encoded_block)
+    payload = memoryview(encoded_block.compressed_data).cast("B")
+    return [FRAME_HEADER.pack(MAGIC, VERSION, FRAME_BLOCK, len(header) + len(payload)) + header, payload]
+
+def send_block(sock, encoded_block):
+    """发送一个编码后的数据块
+
+    Args:
+        sock: 已连接的 socket
+        encoded_block: EncodedBlock
+    """
+    send_frame(sock, FRAME_BLOCK, pack_block_header(encoded_block), encoded_block.compressed_data)
+
+def parse_block(body):
+    """解析数据块帧体, 编码数据为帧体的 memoryview 切片, 不做拷贝
+
+    Args:
+        body: FRAME_BLOCK 的帧体
+
+    Raises:
+        ValueError: 校验和不一致(数据块在传输中损坏)时报错, 接收端可以先用 verify_block 检查
+
+    Returns:
+        encoded_block: EncodedBlock
+    """
+    if not verify_block(body):
+        raise ValueError("Checksum mismatch, the block was corrupted in transit.")
+    codec, level, band, flags, tile_row, tile_col, rows, cols, block_min, block_max, step = \
+        BLOCK_HEADER.unpack_from(body)
+    codec = codec_name(codec)
+    if flags & FLAG_INTEGER:
+        block_min, block_max = int(block_min), int(block_max)
+    return EncodedBlock(BAND_NAMES[band], level, (tile_row, tile_col), (rows, cols),
+                        memoryview(body)[BLOCK_HEADER.size + CHECKSUM.size:], block_min, block_max, codec,
+                        step or None)
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+import numpy as np
+from src.Transmission import EncodedBlock
+
+# 缓存命中时的结果: units 为按传输顺序排列的 [(EncodedBlock, original_size), ...],
+# block_size 为每一层系数的尺寸, tile_size 为编码时实际使用的分块边长
+CachedPyramid = namedtuple("CachedPyramid", ["units", "block_size", "tile_size"])
+
+class PyramidCache:
+    def __init__(self, cache_dir, max_bytes=1 << 30):
+        """编码后金字塔的磁盘缓存, 同一图像以相同参数重复传输时跳过小波变换与编码
+
+        每个缓存项是 cache_dir 下以键命名的文件夹, payload.bin 按传输顺序拼接所有编码数据,
+        index.json 记录每个数据块的偏移、长度、尺寸与最小/最大值。命中时通过内存映射读取
+        payload.bin, 数据块为映射的 memoryview 切片, 不做拷贝。index.json 的修改时间作为最近
+        使用时间, 总大小超过 max_bytes 时删除最久未使用的缓存项。
+
+        Args:
+            cache_dir: 缓存文件夹目录
+            max_bytes: 缓存总大小上限（字节）
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(image, **params):
+        """由图像内容与传输参数计算缓存键
+
+        Args:
+            image: 原始图像
+            params: 影响编码结果与传输顺序的参数(小波、层数、编码方式、分块、传输计划等)
+
+        Returns:
+            key: sha256 十六进制字符串
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps({"shape": list(image.shape), "dtype": str(image.dtype), **params},
+                                 sort_keys=True).encode("utf-8"))
+        digest.update(np.ascontiguousarray(image).data)
+        return digest.hexdigest()
+
+    def load(self, key):
+        """读取缓存项
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            CachedPyramid, 未命中时为 None
+        """
+        entry_dir = os.path.join(self.cache_dir, key)
+        index_path = os.path.join(entry_dir, "index.json")
+        if not os.path.exists(index_path):
+            return None
+        with open(index_path) as f:
+            index = json.load(f)
+        # 更新最近使用时间
+        os.utime(index_path)
+
+        payload = memoryview(np.memmap(os.path.join(entry_dir, "payload.bin"), dtype=np.uint8, mode="r"))
+        units = [
+            (EncodedBlock(unit["block_type"], unit["level"], tuple(unit["tile_index"]), tuple(unit["shape"]),
+                          payload[unit["offset"]:unit["offset"] + unit["length"]],
+                          unit["block_min"], unit["block_max"], unit["codec"], unit.get("step")),
+             unit["original_size"])
+            for unit in index["units"]
+        ]
+        return CachedPyramid(units, [tuple(size) for size in index["block_size"]], index["tile_size"])
+
+    def store(self, key, units, block_size, tile_size):
+        """写入缓存项, 并按最近使用时间淘汰超出大小上限的缓存项
+
+        Args:
+            key: 缓存键
+            units: 按传输顺序排列的 [(EncodedBlock, original_size), ...]
+            block_size: 每一层系数的尺寸
+            tile_size: 编码时实际使用的分块边长
+        """
+        total = sum(len(encoded_block.compressed_data) for encoded_block, _ in units)
+        if total > self.max_bytes:
+            print(f"Encoded pyramid ({total} bytes) exceeds the cache budget, not cached.")
+            return
+
+        # 先写入临时文件夹再重命名, 其他进程不会读到写了一半的缓存项
+        temp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp-")
+        index_units = []
+        offset = 0
+        with open(os.path.join(temp_dir, "payload.bin"), "wb") as f:
+            for encoded_block, original_size in units:
+                f.write(encoded_block.compressed_data)
+                length = len(encoded_block.compressed_data)
+                # 整数小波的最小/最大值保持为 int, 解码时以此区分无损路径
+                block_min, block_max = encoded_block.block_min, encoded_block.block_max
+                if not isinstance(block_min, int):
+                    block_min, block_max = float(block_min), float(block_max)
+                index_units.append({
+                    "block_type": encoded_block.block_type,
+                    "level": encoded_block.level,
+                    "tile_index": list(encoded_block.tile_index),
+                    "shape": list(encoded_block.shape),
+                    "offset": offset,
+                    "length": length,
+                    "block_min": block_min,
+                    "block_max": block_max,
+                    "codec": encoded_block.codec,
+                    "step": encoded_block.step,
+                    "original_size": original_size,
+                })
+                offset += length
+        with open(os.path.join(temp_dir, "index.json"), "w") as f:
+            json.dump({"block_size": [list(size) for size in block_size], "tile_size": tile_size,
+                       "units": index_units}, f)
+
+        entry_dir = os.path.join(self.cache_dir, key)
+        if os.path.exists(entry_dir):
+            shutil.rmtree(temp_dir)
+        else:
+            os.rename(temp_dir, entry_dir)
+        self.evict()
+
+    def evict(self):
+        """删除最久未使用的缓存项, 直到总大小不超过上限
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            index_path = os.path.join(self.cache_dir, name, "index.json")
+            if name.startswith(".") or not os.path.exists(index_path):
+                continue
+            entry_dir = os.path.join(self.cache_dir, name)
+            size = sum(os.path.getsize(os.path.join(entry_dir, file)) for file in os.listdir(entry_dir))
+            entries.append((os.path.getmtime(index_path), size, entry_dir))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_dir in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir)
+            total -= size
+            print(f"Evicted {os.path.basename(entry_dir)} from the pyramid cache.")
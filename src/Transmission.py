@@ -1,13 +1,69 @@
+import heapq
 import os
-from utils.util import encode_block, decode_block
+from collections import deque, namedtuple
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
+from utils.codec import get_codec
+from utils.quantization import choose_steps, deadzone_quantize, deadzone_dequantize
+from utils.bitplane import PASS_HEADER, plan_passes, encode_pass, decode_pass, quantize, dequantize
+from utils.wavelet import synthesis_gains, roi_footprint
+from utils.tracing import span, traced
 import matplotlib.pyplot as plt
 from matplotlib import rcParams
 
 rcParams['font.family'] = 'SimHei'  # SimHei 是黑体，你也可以使用其他字体，如 Microsoft YaHei
 rcParams['axes.unicode_minus'] = False  # 解决负号显示为方块的问题
 
+# 指定感兴趣区域但未指定分块边长时使用的分块边长
+ROI_TILE_SIZE = 128
+
+# 一次传输的数据包, tile_index 为数据块在子带中的分块坐标 (row, col), 未分块时为 (0, 0); shape 为解码后的尺寸
+# codec 为注册的整块编码名称(见 utils/codec.py, 默认 "jp2") 或 "bitplane"(一次位平面细化, block_min/block_max 不使用)
+# step 为死区量化步长(见 utils/quantization.py), None 表示按最小/最大值量化到 16 位
+EncodedBlock = namedtuple("EncodedBlock", ["block_type", "level", "tile_index", "shape", "compressed_data",
+                                           "block_min", "block_max", "codec", "step"], defaults=("jp2", None))
+
+def encode_unit(data, quality, plane=None, codec="jp2", step=None):
+    """编码传输队列中的一个单元, 定义在模块级别以便提交到进程池
+
+    Args:
+        data: 频域数据
+        quality: JPEG2000 编码方式
+        plane: None 表示整块编码, 否则为位平面传输 (step, plane_hi, plane_lo)
+        codec: 整块编码时使用的编码名称(见 utils/codec.py)
+        step: 整块编码时的死区量化步长, None 表示按最小/最大值量化到 16 位
+
+    Returns:
+        codec: 编码类型
+        compressed_data: 编码后的数据块
+        block_min: 块中最小的元素
+        block_max: 块中最大的元素
+    """
+    if plane is None:
+        compressed_data, block_min, block_max = get_codec(codec).encode(data, quality, step)
+        return codec, compressed_data, block_min, block_max
+    return "bitplane", encode_pass(data, *plane), 0.0, 0.0
+
+def decode_encoded_block(encoded_block):
+    """按编码类型解码数据包
+
+    Args:
+        encoded_block: EncodedBlock
+
+    Returns:
+        restored_data: 整块编码解码后的频域数据, 或位平面传输解码后的 RefinementPass
+    """
+    if encoded_block.codec == "bitplane":
+        return decode_pass(encoded_block.compressed_data, encoded_block.shape)
+    return get_codec(encoded_block.codec).decode(encoded_block.compressed_data, encoded_block.block_min,
+                                                 encoded_block.block_max, encoded_block.shape, encoded_block.step)
+
 class ProgressiveTransmission:
-    def __init__(self, coeffs, level, bandwidth=16777216, quality = "dB"):
+    def __init__(self, coeffs, level, bandwidth=16777216, quality = "dB", schedule="full",
+                 workers=0, prefetch=None, executor="thread", tile_size=None, link=None, bitplane_passes=None,
+                 order="level", wavelet=None, roi=None, encoded_units=None, keep_sent=False,
+                 estimate_distortion=False, codec="jp2", target_psnr=None, target_bpp=None, peak=4095.0):
         """渐进传输类，支持编码与纠错
 
         Args:
@@ -15,19 +71,114 @@ class ProgressiveTransmission:
             level: 小波变换的层数
             bandwidth: 每次传输的最大数据量（字节），默认 16777216
             quality: 编码方式， dB 或者 rates
+            schedule: 传输计划， "full" 传输每一层的 LL, LH, HL, HH；
+                "compact" 只传输最深一层的 LL, 其余层级的 LL 由接收端逆变换得到
+            workers: 后台编码的工作线程/进程数, 0 表示在 transmit_next 中同步编码
+            prefetch: 同时处于编码中或已编码待发送的数据块上限, 默认为 max(workers, 1) + 1
+            executor: 后台编码方式, "thread" 或 "process", 也可以传入共享的 Executor 实例
+            tile_size: 分块边长, 大于该尺寸的子带被切分为多个分块分别编码与传输, None 表示不分块
+            link: LinkSimulator 对象, 用于模拟每个数据块在链路上的到达时间, None 表示不模拟
+            bitplane_passes: 位平面传输次数, 每个分块的系数由高位平面到低位平面分为这么多次传输,
+                各层级交错进行; None 表示每个分块以 JPEG2000 一次传输
+            order: 传输顺序, "level" 按层级由深到浅、子带 LL/LH/HL/HH 的固定顺序;
+                "rd" 预先编码全部传输单元, 按估计的失真下降量与编码字节数之比从大到小传输
+            wavelet: 小波名称, "rd" 顺序用它把系数域的失真换算到图像域, None 表示各子带增益相同;
+                指定 roi 时必须给出
+            roi: 感兴趣区域 (x0, y0, x1, y1), 图像像素坐标; 与区域在各层的系数范围相交的分块先于
+                其余分块传输, 两部分内部保持 order 的顺序。未指定 tile_size 时按 ROI_TILE_SIZE 分块
+            encoded_units: 已编码并排好顺序的 [(EncodedBlock, original_size), ...](例如 PyramidCache 的
+                缓存项), 给出时 coeffs 可以为 None, 按原顺序直接发送, 不再排序与编码
+            keep_sent: 是否在 sent_units 中保存已发送的 (EncodedBlock, original_size), 用于写入缓存
+            estimate_distortion: 是否在 distortion_estimates 中记录每个数据块发送后接收端的估计 MSE,
+                由尚未传输的系数能量乘以子带增益得到, 不需要原图; 像素数按参与重建的系数个数近似,
+                不计 JPEG2000 自身的量化误差。使用 encoded_units 时不记录
+            codec: 整块编码使用的编码名称(见 utils/codec.py), 或按层级给出的名称列表(下标为层级,
+                比列表更深的层级使用最后一个名称); 位平面传输不使用
+            target_psnr: 目标 PSNR(dB), 给出时每个子带改用死区均匀量化, 步长由 choose_steps 按目标选择,
+                替代按最小/最大值量化到 16 位; 不能与 bitplane_passes 同时使用
+            target_bpp: 目标码率(比特/像素, 按量化值的零阶熵估计), 与 target_psnr 二选一
+            peak: target_psnr 的峰值, 默认为 12 位图像的 4095
         """        
+        if schedule not in ("full", "compact"):
+            raise ValueError(f"Unknown transmission schedule: {schedule}.")
+        if order not in ("level", "rd"):
+            raise ValueError(f"Unknown transmission order: {order}.")
+        if roi is not None and wavelet is None:
+            raise ValueError("The wavelet is required to map the region of interest to coefficients.")
+        if roi is not None and tile_size is None and encoded_units is None:
+            tile_size = ROI_TILE_SIZE
+        if (target_psnr is not None or target_bpp is not None) and bitplane_passes is not None:
+            raise ValueError("Bit-plane passes cannot be combined with a quantization target.")
         self.coeffs = coeffs
         self.level = level
         self.bandwidth = bandwidth
-        self.transmission_queue = self._create_transmission_queue()
+        self.schedule = schedule
+        self.tile_size = tile_size
+        self.link = link
+        self.bitplane_passes = bitplane_passes
+        self.order = order
+        self.wavelet = wavelet
+        self.roi = roi
+        # 感兴趣区域在每一层的系数范围
+        self.footprints = None
+        if roi is not None and encoded_units is None:
+            self.footprints = roi_footprint(roi, wavelet, [self.coeffs[i][1].shape for i in range(level)])
+        # 每个子带的死区量化步长 {(level, block_type): step}, 缺省的子带按最小/最大值量化到 16 位
+        self.steps = {}
+        if (target_psnr is not None or target_bpp is not None) and encoded_units is None:
+            self.steps = self._choose_steps(target_psnr, target_bpp, peak)
+        self.encoded_units = deque(encoded_units or [])
+        self.transmission_queue = self._create_transmission_queue() if encoded_units is None else []
+        self.keep_sent = keep_sent
+        self.sent_units = []
         self.efficiency_list = []
+        self.bytes_sent = 0
         self.quality = quality
+        self.codecs = [codec] if isinstance(codec, str) else list(codec)
+        for name in self.codecs:
+            get_codec(name)
+
+        # 后台编码流水线: pending 按队列顺序保存 (block_type, level, tile_index, data, plane, future)
+        self.pending = deque()
+        self.prefetch = prefetch if prefetch is not None else max(workers, 1) + 1
+        self.owns_executor = not isinstance(executor, Executor)
+        if not self.owns_executor:
+            self.executor = executor
+        elif workers <= 0:
+            self.executor = None
+        elif executor == "thread":
+            self.executor = ThreadPoolExecutor(max_workers=workers)
+        elif executor == "process":
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            raise ValueError(f"Unknown executor type: {executor}.")
+        # 发送端失真估计: distortion 为尚未传输部分的失真, unit_benefits 为每次传输的失真下降量
+        self.distortion = None
+        self.unit_benefits = {}
+        self.distortion_estimates = []
+        if encoded_units is None and (order == "rd" or estimate_distortion):
+            benefits, units, total = self._distortion_benefits(self.transmission_queue)
+            if estimate_distortion:
+                self.distortion = total
+                self.unit_benefits = {(*entry[:3], entry[4]): benefit
+                                      for entry, benefit in zip(self.transmission_queue, benefits)}
+                self.num_pixels = sum(band.size for band in self._reconstruction_bands().values())
+            if order == "rd":
+                self.transmission_queue = self._rate_distortion_order(self.transmission_queue, benefits, units)
+        if self.footprints is not None:
+            in_roi = [self._intersects_roi(entry) for entry in self.transmission_queue]
+            self.transmission_queue = ([entry for entry, inside in zip(self.transmission_queue, in_roi) if inside] +
+                                       [entry for entry, inside in zip(self.transmission_queue, in_roi) if not inside])
+            print(f"{sum(in_roi)} of {len(in_roi)} units cover the region of interest.")
+        # 传输队列中的分块持有各自的数据, 不再保留整个金字塔, 子带在最后一个分块发送后即可释放
+        self.coeffs = None
 
     def _create_transmission_queue(self):
         """创建传输队列，按渐进式顺序（从最细节到低频）进行排序
 
         Returns:
-            queue: 传输队列
+            queue: 传输队列 [(block_type, level, tile_index, data, plane, encoded), ...],
+                encoded 为预先编码的结果, None 表示发送时再编码
         """        
         queue = []
         
@@ -35,20 +186,200 @@ class ProgressiveTransmission:
         for level in range(self.level - 1, -1, -1):
             LL, LH, HL, HH = self.coeffs[level]
             # 每一层的细节优先传输（从最细节到低频）
-            queue.append(('LL', level, LL))
-            queue.append(('LH', level, LH))
-            queue.append(('HL', level, HL))
-            queue.append(('HH', level, HH))
-        
-        return queue
+            # compact 模式下中间层的 LL 可由更深一层的四个子带精确得到, 不再重复传输
+            if self.schedule == "full" or level == self.level - 1:
+                queue.extend(self._split_tiles('LL', level, LL))
+            queue.extend(self._split_tiles('LH', level, LH))
+            queue.extend(self._split_tiles('HL', level, HL))
+            queue.extend(self._split_tiles('HH', level, HH))
+
+        if self.bitplane_passes is None:
+            return [(block_type, level, tile_index, data, None, None) for block_type, level, tile_index, data in queue]
+
+        # 位平面模式: 第 k 次传输依次包含所有层级、子带、分块的第 k 组位平面
+        planned = [(unit, plan_passes(unit[3], self.bitplane_passes)) for unit in queue]
+        return [
+            (block_type, level, tile_index, data, (step, *passes[k]), None)
+            for k in range(self.bitplane_passes)
+            for (block_type, level, tile_index, data), (step, passes) in planned
+            if k < len(passes)
+        ]
+
+    def _reconstruction_bands(self):
+        """参与重建的子带: 最深一层的 LL 与每一层的 LH/HL/HH
+
+        Returns:
+            bands: {(level, block_type): 系数}
+        """
+        bands = {(self.level - 1, "LL"): self.coeffs[self.level - 1][0]}
+        for level in range(self.level):
+            for block_type, band in zip(("LH", "HL", "HH"), self.coeffs[level][1:]):
+                bands[(level, block_type)] = band
+        return bands
+
+    def _choose_steps(self, target_psnr, target_bpp, peak):
+        """按目标 PSNR 或码率选择参与重建的子带的死区量化步长, 像素数按这些子带的系数个数近似
+
+        full 计划中中间层的 LL 不参与重建, 保持按最小/最大值量化。
+
+        Returns:
+            steps: {(level, block_type): step}
+        """
+        bands = self._reconstruction_bands()
+        gains = synthesis_gains(self.wavelet, self.level) if self.wavelet is not None else {}
+        integer = np.issubdtype(self.coeffs[0][1].dtype, np.integer)
+        steps = choose_steps(bands, gains, sum(band.size for band in bands.values()), target_psnr, target_bpp,
+                             peak, integer)
+        described = ", ".join(f"{block_type}{level}={step:.4g}" for (level, block_type), step in steps.items()
+                              if step is not None)
+        print(f"Dead-zone quantization steps: {described or 'lossless'}")
+        return steps
+
+    def _step(self, level, block_type):
+        """子带的死区量化步长, None 表示按最小/最大值量化到 16 位"""
+        return self.steps.get((level, block_type))
+
+    def _distortion_benefits(self, queue):
+        """估计每个传输单元到达后图像域失真(误差平方和)的下降量
+
+        失真下降量由系数能量估计: 整块传输为子带增益乘以系数平方和(死区量化时减去量化误差); 位平面传输为该次传输前后
+        系数量化误差平方和之差乘以子带增益。full 计划中中间层的 LL 不参与重建, 失真下降量为 0。
+
+        Args:
+            queue: _create_transmission_queue 得到的传输队列
+
+        Returns:
+            benefits: 与 queue 一一对应的失真下降量
+            units: {(block_type, level, tile_index): [该分块各次传输在 queue 中的下标, ...]}
+            total: 尚未传输任何单元时的失真, 即全部参与重建的系数能量与增益之积的和
+        """
+        gains = synthesis_gains(self.wavelet, self.level) if self.wavelet is not None else {}
+        # 每个分块的各次传输按队列中的先后顺序排列
+        units = {}
+        for index, (block_type, level, tile_index, data, plane, _) in enumerate(queue):
+            units.setdefault((block_type, level, tile_index), []).append(index)
+
+        benefits = [0.0] * len(queue)
+        total = 0.0
+        for (block_type, level, _), indices in units.items():
+            if self.schedule == "full" and block_type == "LL" and level < self.level - 1:
+                continue
+            gain = gains.get((level, block_type), 1.0)
+            block_type, level, tile_index, data, plane, _ = queue[indices[0]]
+            energy = float(np.sum(np.square(data, dtype=np.float64)))
+            total += gain * energy
+            if plane is None:
+                step = self._step(level, block_type)
+                if step is not None:
+                    error = data - deadzone_dequantize(deadzone_quantize(data, step), step)
+                    energy -= float(np.sum(np.square(error, dtype=np.float64)))
+                benefits[indices[0]] = gain * energy
+                continue
+            step = plane[0]
+            magnitude, negative = quantize(data, step)
+            data = data.astype(np.float64)
+            error = energy
+            for index in indices:
+                plane_lo = queue[index][4][2]
+                known = magnitude & np.uint32(~((1 << plane_lo) - 1) & 0xFFFFFFFF)
+                refined = float(np.sum((data - dequantize(known, negative, step, plane_lo)) ** 2))
+                benefits[index] = gain * (error - refined)
+                error = refined
+        return benefits, units, total
+
+    @traced("rate_distortion_order", "transmission")
+    def _rate_distortion_order(self, queue, benefits, units):
+        """预先编码全部传输单元, 按失真下降量/字节数贪心排序
+
+        同一分块的位平面传输保持由高到低的先后顺序, 失真下降量为 0 的单元排在最后。
+
+        Args:
+            queue: _create_transmission_queue 得到的传输队列
+            benefits: _distortion_benefits 估计的失真下降量
+            units: _distortion_benefits 得到的每个分块的传输下标
+
+        Returns:
+            queue: 重新排序并带有预先编码结果的传输队列
+        """
+        data_list = [entry[3] for entry in queue]
+        planes = [entry[4] for entry in queue]
+        codecs = [self._codec(entry[1]) for entry in queue]
+        steps = [self._step(entry[1], entry[0]) for entry in queue]
+        if self.executor is None:
+            encoded = [encode_unit(data, self.quality, plane, codec, step)
+                       for data, plane, codec, step in zip(data_list, planes, codecs, steps)]
+        else:
+            encoded = list(self.executor.map(encode_unit, data_list, repeat(self.quality), planes, codecs, steps))
+
+        # 贪心选择: 每个分块只有下一次未发送的传输参与比较
+        heap = []
+        for indices in units.values():
+            index = indices[0]
+            heapq.heappush(heap, (-benefits[index] / max(len(encoded[index][1]), 1), index, deque(indices[1:])))
+        ordered = []
+        while heap:
+            _, index, rest = heapq.heappop(heap)
+            ordered.append((*queue[index][:5], encoded[index]))
+            if rest:
+                index = rest.popleft()
+                heapq.heappush(heap, (-benefits[index] / max(len(encoded[index][1]), 1), index, rest))
+        return ordered
+
+    def _intersects_roi(self, entry):
+        """判断传输单元是否与感兴趣区域在其所在层级的系数范围相交
 
-    def encode_frequency_data(self, data):
-        """使用JPEG2000对频域数据进行编码
+        Args:
+            entry: 传输队列中的一项
+
+        Returns:
+            inside: 是否属于感兴趣区域
+        """
+        block_type, level, tile_index = entry[:3]
+        # full 计划中中间层的 LL 不参与重建
+        if block_type == "LL" and level != self.level - 1:
+            return False
+        row_start, row_end, col_start, col_end = self.footprints[level]
+        rows, cols = entry[3].shape
+        tile_row, tile_col = tile_index[0] * self.tile_size, tile_index[1] * self.tile_size
+        return (tile_row < row_end and row_start < tile_row + rows and
+                tile_col < col_end and col_start < tile_col + cols)
+
+    def _split_tiles(self, block_type, level, data):
+        """将子带按 tile_size 切分为分块, 按行优先顺序排列
+
+        Args:
+            block_type: 数据块类型
+            level: 数据块所在的层级
+            data: 子带数据
+
+        Returns:
+            tiles: [(block_type, level, tile_index, tile_data), ...]
+        """
+        if self.tile_size is None:
+            return [(block_type, level, (0, 0), data)]
+        rows, cols = data.shape
+        return [
+            (block_type, level, (r, c),
+             data[r * self.tile_size:(r + 1) * self.tile_size, c * self.tile_size:(c + 1) * self.tile_size])
+            for r in range((rows + self.tile_size - 1) // self.tile_size)
+            for c in range((cols + self.tile_size - 1) // self.tile_size)
+        ]
+
+    def _codec(self, level):
+        """该层级整块编码使用的编码名称"""
+        return self.codecs[min(level, len(self.codecs) - 1)]
+
+    def encode_frequency_data(self, data, plane=None, codec="jp2", step=None):
+        """使用注册的整块编码或位平面编码对频域数据进行编码
 
         Args:
             data: 频域数据
+            plane: None 表示整块编码, 否则为位平面传输 (step, plane_hi, plane_lo)
+            codec: 整块编码使用的编码名称
+            step: 整块编码的死区量化步长
 
         Returns:
+            codec: 编码类型
             compressed_data: 编码后的数据块
             block_min: 块中最小的元素
             block_max: 块中最大的元素
@@ -56,10 +387,10 @@ class ProgressiveTransmission:
             compressed_size: 编码后的数据块的大小
         """        
 
-        compressed_data, block_min, block_max = encode_block(data, self.quality)
+        codec, compressed_data, block_min, block_max = encode_unit(data, self.quality, plane, codec, step)
         original_size = data.nbytes
         compressed_size = len(compressed_data)
-        return compressed_data, block_min, block_max, original_size, compressed_size
+        return codec, compressed_data, block_min, block_max, original_size, compressed_size
 
     def transmit_next(self):
         """模拟传输频域数据块
@@ -68,45 +399,174 @@ class ProgressiveTransmission:
             ValueError: 当数据块大小超过带宽时报错
 
         Returns:
-            block_type: 数据块类型
-            level: 数据块所在的层级
-            compressed_data: 编码后的数据块
-            block_min: 块中最小的元素
-            block_max: 块中最大的元素
+            EncodedBlock: (block_type, level, tile_index, shape, compressed_data, block_min, block_max)
         """        
-        if not self.transmission_queue:
+        if not self.transmission_queue and not self.pending and not self.encoded_units:
             print("All frequency domain data has been transmitted.")
             return None
 
-        # 获取队列中的下一个数据块
-        block_type, level, data = self.transmission_queue.pop(0)
-        compressed_data, block_min, block_max, original_size, compressed_size = self.encode_frequency_data(data)
-        block_size = len(compressed_data)
+        with span("transmit_next", "transmission") as event:
+            # 获取队列中的下一个数据块
+            plane = None
+            if self.encoded_units:
+                encoded_block, original_size = self.encoded_units.popleft()
+                (block_type, level, tile_index, shape, compressed_data, block_min, block_max, codec,
+                 step) = encoded_block
+                compressed_size = len(compressed_data)
+            elif self.executor is None:
+                block_type, level, tile_index, data, plane, encoded = self.transmission_queue.pop(0)
+                if encoded is None:
+                    codec, compressed_data, block_min, block_max, original_size, compressed_size = \
+                        self.encode_frequency_data(data, plane, self._codec(level), self._step(level, block_type))
+                else:
+                    codec, compressed_data, block_min, block_max = encoded
+                    original_size, compressed_size = data.nbytes, len(compressed_data)
+                shape = data.shape
+                step = self._step(level, block_type) if plane is None else None
+            else:
+                self._fill_pipeline()
+                block_type, level, tile_index, data, plane, future = self.pending.popleft()
+                codec, compressed_data, block_min, block_max = future.result()
+                original_size, compressed_size = data.nbytes, len(compressed_data)
+                shape = data.shape
+                step = self._step(level, block_type) if plane is None else None
+                # 当前块"在线路上"时, 后台继续编码后续的数据块
+                self._fill_pipeline()
+            block_size = len(compressed_data)
+            if self.distortion is not None:
+                self.distortion -= self.unit_benefits.pop((block_type, level, tile_index, plane), 0.0)
+                self.distortion_estimates.append(max(self.distortion, 0.0) / self.num_pixels)
+                event.set(estimated_mse=self.distortion_estimates[-1])
         
-        efficiency = compressed_size / original_size
-        self.efficiency_list.append(efficiency)
+            efficiency = compressed_size / original_size
+            self.efficiency_list.append(efficiency)
 
-        if block_size > self.bandwidth:
-            raise ValueError(f"Block size ({block_size} bytes) exceeds bandwidth ({self.bandwidth} bytes).")
+            if block_size > self.bandwidth:
+                raise ValueError(f"Block size ({block_size} bytes) exceeds bandwidth ({self.bandwidth} bytes).")
+            self.bytes_sent += block_size
         
-        print(f"Transmitting {block_type} block from level {level}, original size: {data.shape}, "
-              f"encoded size: {block_size} bytes, efficiency: {efficiency:.4f}.")
-        return block_type, level, compressed_data, block_min, block_max
+            planes = "" if plane is None else f" bit-planes [{plane[2]}, {plane[1]})"
+            print(f"Transmitting {block_type} block {tile_index}{planes} from level {level}, original size: {shape}, "
+                  f"encoded size: {block_size} bytes, efficiency: {efficiency:.4f}.")
+            if self.link is not None:
+                arrival = self.link.send(block_size, level, block_type, tile_index)
+                print(f"Block arrives at {arrival:.3f}s on the simulated link.")
+                event.set(arrival=arrival)
+            encoded_block = EncodedBlock(block_type, level, tile_index, shape, compressed_data, block_min, block_max,
+                                         codec, step)
+            if self.keep_sent:
+                self.sent_units.append((encoded_block, original_size))
+            event.set(level=level, band=block_type, tile=list(tile_index), bytes=block_size)
+            return encoded_block
+
+    def resume(self, acknowledged, planes=None):
+        """断点续传: 从传输队列中去掉接收端已经收到的数据单元, 需在开始传输之前调用
+
+        位平面模式下同一数据单元有多次细化, 给出 planes 时只跳过最低位平面在其中的细化, 中间丢失的
+        细化会重新发送; 否则按队列顺序跳过前若干次。跳过后 sent_units 不再完整, 因此不再记录已发送的
+        数据块(不写入缓存)。
+
+        Args:
+            acknowledged: {(level, block_type, tile_index): 次数}, 接收端断点中已到达的数据单元
+            planes: {(level, block_type, tile_index): {最低位平面}}, 位平面模式下接收端已收到的细化
+
+        Returns:
+            skipped: 跳过的数据块个数
+        """
+        remaining = dict(acknowledged)
+        planes = planes or {}
+
+        def keep(block_type, level, tile_index, plane=None):
+            unit = (level, block_type, tuple(tile_index))
+            if unit in planes and plane is not None:
+                if plane[2] not in planes[unit]:
+                    return True
+            elif remaining.get(unit, 0) <= 0:
+                return True
+            else:
+                remaining[unit] -= 1
+            if self.distortion is not None:
+                self.distortion -= self.unit_benefits.pop((block_type, level, tile_index, plane), 0.0)
+            return False
+
+        total = len(self.encoded_units) + len(self.transmission_queue)
+        self.encoded_units = deque(unit for unit in self.encoded_units
+                                   if keep(*unit[0][:3], self._cached_plane(unit[0])))
+        self.transmission_queue = [entry for entry in self.transmission_queue
+                                   if keep(entry[0], entry[1], entry[2], entry[4])]
+        skipped = total - len(self.encoded_units) - len(self.transmission_queue)
+        if skipped:
+            self.keep_sent = False
+            self.sent_units = []
+        print(f"Resuming: skipped {skipped} of {total} units already at the receiver.")
+        return skipped
+
+    @staticmethod
+    def _cached_plane(encoded_block):
+        """缓存中位平面细化的 (step, plane_hi, plane_lo), 由数据包头读出; 整块编码时为 None"""
+        if encoded_block.codec != "bitplane":
+            return None
+        return PASS_HEADER.unpack_from(encoded_block.compressed_data)
+
+    def _fill_pipeline(self):
+        """按队列顺序提交后续数据块的编码任务, 直到在途数据块达到 prefetch 上限
+        """
+        while self.transmission_queue and len(self.pending) < self.prefetch:
+            block_type, level, tile_index, data, plane, encoded = self.transmission_queue.pop(0)
+            if encoded is None:
+                future = self.executor.submit(encode_unit, data, self.quality, plane, self._codec(level),
+                                              self._step(level, block_type))
+            else:
+                # 已预先编码的单元不再提交编码任务
+                future = Future()
+                future.set_result(encoded)
+            self.pending.append((block_type, level, tile_index, data, plane, future))
+
+    def next_ready(self, callback=None):
+        """判断 transmit_next 能否不等待编码直接返回, 用于在多个会话之间调度
+
+        同步编码时总是返回 True(transmit_next 在调用线程中编码); 后台编码时提交后续的编码任务,
+        下一个数据块尚未编码完成时返回 False。
+
+        Args:
+            callback: 未就绪时, 在下一个数据块编码完成后调用的无参函数(可能在工作线程中调用)
+
+        Returns:
+            ready: transmit_next 是否可以立即返回(包括全部传输完成时返回 None)
+        """
+        if self.encoded_units or self.executor is None:
+            return True
+        self._fill_pipeline()
+        if not self.pending or self.pending[0][-1].done():
+            return True
+        if callback is not None:
+            self.pending[0][-1].add_done_callback(lambda _: callback())
+        return False
+
+    def close(self):
+        """取消尚未开始的编码任务, 并关闭自行创建的 Executor
+        """
+        for *_, future in self.pending:
+            future.cancel()
+        self.pending.clear()
+        if self.executor is not None and self.owns_executor:
+            self.executor.shutdown()
+        self.executor = None
 
     def decode_received_data(self, encoded_data):
         """解码接收到的频域数据
 
         Args:
-            encoded_data: (block_type, level, compressed_data, block_min, block_max)
+            encoded_data: EncodedBlock
 
         Returns:
             level: 数据块所在的层级
             block_type: 数据块类型
-            restored_data: 解码后的频域数据
+            restored_data: 解码后的频域数据, 位平面模式下为 RefinementPass
+            tile_index: 数据块在子带中的分块坐标
         """        
-        block_type, level, compressed_data, block_min, block_max = encoded_data
-        restored_data = decode_block(compressed_data, block_min, block_max)
-        return level, block_type, restored_data
+        restored_data = decode_encoded_block(encoded_data)
+        return encoded_data.level, encoded_data.block_type, restored_data, encoded_data.tile_index
 
     def plot_efficiency(self, encode_efficiency_dir):
         """绘制编码效率的折线图，并保存
@@ -0,0 +1,254 @@
+import asyncio
+import json
+import os
+import socket
+import time
+from itertools import count
+from src.Protocol import (parse_address, read_frame, pack_frame, pack_json, parse_json, pack_block,
+                          FRAME_HELLO, FRAME_SESSION, FRAME_END, FRAME_ERROR)
+
+# 每个会话已取出、等待写入 socket 的数据块上限, 写得慢的会话不会占用调度
+OUTBOX_SIZE = 2
+
+class Session:
+    def __init__(self, session_id, name, transmission):
+        """服务端的一个传输会话, 持有自己的 ProgressiveTransmission 与统计信息
+
+        Args:
+            session_id: 会话编号
+            name: 会话请求的图像名
+            transmission: ProgressiveTransmission 对象
+        """
+        self.session_id = session_id
+        self.name = name
+        self.transmission = transmission
+        # 调度器取出的数据块, None 表示传输结束
+        self.outbox = asyncio.Queue(maxsize=OUTBOX_SIZE)
+        # 差额轮询(deficit round robin)中本会话尚可发送的字节数
+        self.deficit = 0
+        self.finished = False
+        self.blocks_sent = 0
+        self.bytes_sent = 0
+        self.start = time.perf_counter()
+        self.end = None
+
+    def elapsed(self):
+        """会话持续的时间（秒）"""
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def summary(self):
+        """会话统计信息
+
+        Returns:
+            summary: 包含数据块数、字节数、耗时与吞吐量(bit/s)的字典
+        """
+        elapsed = self.elapsed()
+        return {
+            "session": self.session_id,
+            "image": self.name,
+            "blocks": self.blocks_sent,
+            "bytes": self.bytes_sent,
+            "elapsed": elapsed,
+            "throughput": self.bytes_sent * 8 / elapsed if elapsed > 0 else 0.0,
+        }
+
+class TransmissionServer:
+    def __init__(self, open_session, quantum=1 << 16, report_interval=10.0):
+        """同时服务多个传输会话的长驻服务端
+
+        每个连接是一个独立的会话, 拥有自己的 ProgressiveTransmission; 各会话的小波变换与编码提交到
+        open_session 中共享的 Executor。调度器在事件循环中按差额轮询在会话之间分配发送机会: 每一轮
+        每个会话获得 quantum 字节的额度, 只取出已经编码完成的数据块, 额度用完或下一个数据块尚未
+        编码完成时轮到下一个会话, 因此大图像不会阻塞小图像, 编码慢的会话也不会阻塞其他会话。
+
+        Args:
+            open_session: open_session(request) -> (transmission, session_info, on_finish), request 为
+                HELLO 的内容, session_info 为 SESSION 帧的内容, on_finish 在传输结束后调用(可以为 None);
+                在线程中调用, 请求无效时抛出 ValueError 或 OSError
+            quantum: 每一轮每个会话可以发送的字节数
+            report_interval: 打印吞吐量的间隔（秒）, 0 表示只在会话结束时打印
+        """
+        self.open_session = open_session
+        self.quantum = quantum
+        self.report_interval = report_interval
+        self.session_ids = count()
+        self.active = []
+        self.completed = []
+        self.bytes_sent = 0
+        self.start = time.perf_counter()
+        self.wake = None
+        self.loop = None
+
+    async def serve(self, address):
+        """在指定地址上监听并持续服务, 直到被取消
+
+        Args:
+            address: "host:port" 或 Unix socket 路径
+        """
+        self.loop = asyncio.get_running_loop()
+        self.wake = asyncio.Event()
+        family, address = parse_address(address)
+        if family == socket.AF_UNIX:
+            if os.path.exists(address):
+                os.unlink(address)
+            server = await asyncio.start_unix_server(self._handle, address)
+        else:
+            server = await asyncio.start_server(self._handle, *address)
+        tasks = [asyncio.create_task(self._schedule())]
+        if self.report_interval > 0:
+            tasks.append(asyncio.create_task(self._report_loop()))
+        print(f"Serving transmission sessions on {address}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+            for session in self.active:
+                session.transmission.close()
+
+    async def _handle(self, reader, writer):
+        """处理一个连接: 建立会话, 把调度器取出的数据块写入 socket
+
+        Args:
+            reader: asyncio.StreamReader
+            writer: asyncio.StreamWriter
+        """
+        session = None
+        try:
+            frame_type, body = await read_frame(reader)
+            if frame_type != FRAME_HELLO:
+                raise ValueError(f"Expected a HELLO frame, got frame type {frame_type}.")
+            request = parse_json(body)
+            try:
+                transmission, session_info, on_finish = await self.loop.run_in_executor(
+                    None, self.open_session, request)
+            except (ValueError, OSError) as e:
+                writer.write(pack_json(FRAME_ERROR, {"error": str(e)}))
+                await writer.drain()
+                print(f"Rejected session request {request}: {e}")
+                return
+            writer.write(pack_json(FRAME_SESSION, session_info))
+
+            session = Session(next(self.session_ids), request.get("image"), transmission)
+            self.active.append(session)
+            self.wake.set()
+            print(f"Session {session.session_id} started: {session.name}, {len(self.active)} active.")
+            while True:
+                encoded_block = await session.outbox.get()
+                # 队列有空位后调度器可以继续为本会话取出数据块
+                self.wake.set()
+                if encoded_block is None:
+                    break
+                writer.writelines(pack_block(encoded_block))
+                await writer.drain()
+                nbytes = len(encoded_block.compressed_data)
+                session.blocks_sent += 1
+                session.bytes_sent += nbytes
+                self.bytes_sent += nbytes
+            writer.write(pack_frame(FRAME_END))
+            await writer.drain()
+            session.end = time.perf_counter()
+            if on_finish is not None:
+                await self.loop.run_in_executor(None, on_finish)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            print(f"Session closed: {e}")
+        finally:
+            writer.close()
+            if session is not None:
+                self._finish(session)
+
+    def _finish(self, session):
+        """结束会话, 记录统计信息并打印
+
+        Args:
+            session: Session 对象
+        """
+        if session in self.active:
+            self.active.remove(session)
+        session.transmission.close()
+        if session.end is None:
+            session.end = time.perf_counter()
+        summary = session.summary()
+        self.completed.append(summary)
+        print(f"Session {summary['session']} ({summary['image']}) finished: {summary['blocks']} blocks, "
+              f"{summary['bytes']} bytes in {summary['elapsed']:.3f}s, {summary['throughput'] / 1e6:.2f} Mbps.")
+
+    async def _schedule(self):
+        """差额轮询调度: 依次为每个会话取出已编码完成的数据块, 放入该会话的发送队列
+        """
+        def wake_threadsafe():
+            self.loop.call_soon_threadsafe(self.wake.set)
+
+        while True:
+            self.wake.clear()
+            # 有会话只因额度不足而没有发送时, 立即进入下一轮, 否则等待编码完成或发送队列空出
+            next_round = False
+            for session in list(self.active):
+                if session.finished or session.outbox.full():
+                    continue
+                session.deficit += self.quantum
+                next_round = next_round or session.deficit <= 0
+                while session.deficit > 0 and not session.outbox.full():
+                    if not session.transmission.next_ready(wake_threadsafe):
+                        break
+                    try:
+                        encoded_block = session.transmission.transmit_next()
+                    except Exception as e:
+                        # 单个会话的错误(例如数据块超过带宽)只结束该会话, 不影响其他会话
+                        print(f"Session {session.session_id} aborted: {e}")
+                        encoded_block = None
+                    if encoded_block is None:
+                        session.finished = True
+                        session.outbox.put_nowait(None)
+                        break
+                    session.deficit -= len(encoded_block.compressed_data)
+                    session.outbox.put_nowait(encoded_block)
+                # 没有用完的额度不累积, 暂时无数据可发的会话之后不会突发占用链路
+                session.deficit = min(session.deficit, self.quantum)
+            if next_round:
+                await asyncio.sleep(0)
+            else:
+                await self.wake.wait()
+
+    async def _report_loop(self):
+        """定期打印各会话与总体的吞吐量
+        """
+        last_bytes, last_time = self.bytes_sent, time.perf_counter()
+        while True:
+            await asyncio.sleep(self.report_interval)
+            now = time.perf_counter()
+            rate = (self.bytes_sent - last_bytes) * 8 / (now - last_time)
+            last_bytes, last_time = self.bytes_sent, now
+            print(f"[server] {len(self.active)} active, {len(self.completed)} completed, "
+                  f"{rate / 1e6:.2f} Mbps over the last {self.report_interval:g}s")
+            for session in self.active:
+                summary = session.summary()
+                print(f"[server]   session {summary['session']} ({summary['image']}): {summary['blocks']} blocks, "
+                      f"{summary['bytes']} bytes, {summary['throughput'] / 1e6:.2f} Mbps")
+
+    def summary(self):
+        """服务端统计信息
+
+        Returns:
+            summary: 总字节数、运行时间、总体吞吐量(bit/s)与每个已结束会话的统计
+        """
+        uptime = time.perf_counter() - self.start
+        return {
+            "active": len(self.active),
+            "completed": len(self.completed),
+            "bytes": self.bytes_sent,
+            "uptime": uptime,
+            "throughput": self.bytes_sent * 8 / uptime if uptime > 0 else 0.0,
+            "sessions": self.completed,
+        }
+
+    def save_stats(self, stats_dir):
+        """将统计信息保存为 JSON
+
+        Args:
+            stats_dir: 保存统计信息的文件夹目录
+        """
+        stats_path = os.path.join(stats_dir, "server_stats.json")
+        with open(stats_path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
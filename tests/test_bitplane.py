@@ -0,0 +1,19 @@
+import numpy as np
+from utils.bitplane import dequantize, encode_pass, decode_pass, plan_passes
+
+def test_dequantize_negative_with_integer_step():
+    values = dequantize(np.array([3, 5, 0], dtype=np.uint32), np.array([True, False, True]), 1, 0)
+    assert values.dtype == np.float64
+    assert np.array_equal(values, [-3.0, 5.0, 0.0])
+
+def test_integer_passes_are_lossless():
+    block = np.array([[-7, 3], [0, -1]], dtype=np.int32)
+    step, passes = plan_passes(block, 2)
+    assert step == 1
+    magnitude = np.zeros(block.shape, dtype=np.uint32)
+    negative = np.zeros(block.shape, dtype=bool)
+    for plane_hi, plane_lo in passes:
+        refinement = decode_pass(encode_pass(block, step, plane_hi, plane_lo), block.shape)
+        magnitude |= refinement.increment
+        negative |= refinement.negative
+    assert np.array_equal(dequantize(magnitude, negative, step, passes[-1][1]), block)
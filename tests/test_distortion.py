@@ -0,0 +1,16 @@
+from benchmark.common import generate_xray
+from src.ImageProcess import ImageTransform
+from src.Transmission import ProgressiveTransmission
+
+def test_lossless_int53_estimate_ends_at_zero():
+    image = generate_xray(256)
+    coeffs, _ = ImageTransform(image, "int53", 3).wavelet_transform()
+    transmission = ProgressiveTransmission(coeffs, 3, tile_size=64, bitplane_passes=3, wavelet="int53",
+                                           estimate_distortion=True)
+    for _ in iter(transmission.transmit_next, None):
+        pass
+    transmission.close()
+    estimates = transmission.distortion_estimates
+    assert estimates[0] > 1.0
+    assert abs(estimates[-1]) < 1e-6
+    assert all(later <= earlier + 1e-6 for earlier, later in zip(estimates, estimates[1:]))
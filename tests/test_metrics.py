@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+from benchmark.common import generate_xray
+from utils.metrics import QualityMetrics
+
+@pytest.mark.parametrize("stride", [1, 2])
+def test_incremental_ssim_matches_full_recompute(stride):
+    reference = generate_xray(256)
+    rng = np.random.default_rng(0)
+    image = reference.astype(np.float32) + rng.normal(0, 20, reference.shape).astype(np.float32)
+    incremental = QualityMetrics(reference, stride=stride, ssim=True)
+    incremental.update(image)
+
+    # 只改变 [100, 128) 行, 这些行紧邻条带边界 128
+    image[100:128] += rng.normal(0, 50, (28, reference.shape[1])).astype(np.float32)
+    quality = incremental.update(image, (100, 128))
+    expected = QualityMetrics(reference, stride=stride, ssim=True).update(image)
+    assert quality["ssim"] == pytest.approx(expected["ssim"], abs=1e-9)
+    assert quality["mse"] == pytest.approx(expected["mse"], rel=1e-9)
@@ -0,0 +1,78 @@
+import numpy as np
+from benchmark.common import generate_xray
+from main import resume_transmission
+from src.Checkpoint import ReceiverCheckpoint
+from src.DisplaySink import create_sink
+from src.ImageProcess import ImageTransform
+from src.ImageReconstruction import ImageReconstruction
+from src.Transmission import ProgressiveTransmission
+
+SIZE = 128
+LEVEL = 3
+WAVELET = "int53"
+PASSES = 3
+TILE_SIZE = 32
+
+def create_session(image):
+    coeffs, block_size = ImageTransform(image, WAVELET, LEVEL).wavelet_transform()
+    transmission = ProgressiveTransmission(coeffs, LEVEL, tile_size=TILE_SIZE, bitplane_passes=PASSES,
+                                           wavelet=WAVELET)
+    session = {"wavelet": WAVELET, "level": LEVEL, "block_size": [list(size) for size in block_size],
+               "tile_size": TILE_SIZE, "bitplane_passes": PASSES}
+    return transmission, block_size, session
+
+def create_reconstruction(image, block_size):
+    return ImageReconstruction(image, block_size, LEVEL, WAVELET, TILE_SIZE, create_sink("headless"))
+
+def apply(transmission, reconstruction, skip=None):
+    """传输全部数据块并写入重建, skip(encoded_block) 为真的数据块视为丢失; 返回发送的数据块"""
+    sent = []
+    for encoded_block in iter(transmission.transmit_next, None):
+        sent.append(encoded_block)
+        if skip is not None and skip(encoded_block):
+            continue
+        level, block_type, restored_data, tile_index = transmission.decode_received_data(encoded_block)
+        reconstruction.place_block(level, block_type, restored_data, tile_index)
+    transmission.close()
+    return sent
+
+def test_resume_resends_a_lost_middle_pass(tmp_path):
+    image = generate_xray(SIZE)
+
+    # 完整传输作为参照
+    transmission, block_size, _ = create_session(image)
+    expected = create_reconstruction(image, block_size)
+    apply(transmission, expected)
+    expected_image, _ = expected.render()
+
+    # 第一次传输中某个数据单元的第二次细化(中间的一次)丢失, 其后的细化仍然到达
+    transmission, block_size, session = create_session(image)
+    reconstruction = create_reconstruction(image, block_size)
+    lost_unit = (0, "HH", (1, 1))
+    passes = []
+
+    def lose_middle_pass(encoded_block):
+        unit = (encoded_block.level, encoded_block.block_type, encoded_block.tile_index)
+        if unit != lost_unit:
+            return False
+        passes.append(encoded_block)
+        return len(passes) == 2
+
+    sent = apply(transmission, reconstruction, lose_middle_pass)
+    assert len(passes) == PASSES
+    checkpoint = ReceiverCheckpoint(str(tmp_path / "checkpoint.npz"))
+    checkpoint.save(reconstruction, session)
+
+    # 断点续传只重新发送丢失的那一次细化
+    transmission, block_size, session = create_session(image)
+    resume_transmission(transmission, session, checkpoint.resume_request())
+    assert session["resumed"] == len(sent) - 1
+    resumed = create_reconstruction(image, block_size)
+    checkpoint.restore(resumed)
+    resent = apply(transmission, resumed)
+    assert len(resent) == 1
+    assert bytes(resent[0].compressed_data) == bytes(passes[1].compressed_data)
+
+    resumed_image, _ = resumed.render()
+    assert np.array_equal(resumed_image, expected_image)
+    assert np.array_equal(resumed_image, image)
@@ -0,0 +1,114 @@
+import struct
+import zlib
+from collections import namedtuple
+import numpy as np
+from utils.tracing import traced
+
+# 位平面数据包头: 量化步长(d) 最高位平面(B, 不含) 最低位平面(B, 含)
+PASS_HEADER = struct.Struct("!dBB")
+
+# 解码后的一次细化: 本次位平面贡献的幅值增量、增量非零处的符号、量化步长与最低位平面
+RefinementPass = namedtuple("RefinementPass", ["increment", "negative", "step", "plane_lo"])
+
+def quantize(block, step):
+    """将系数量化为符号与幅值
+
+    Args:
+        block: 系数块
+        step: 量化步长
+
+    Returns:
+        magnitude: uint32 幅值, 即 round(|block| / step)
+        negative: 系数是否为负
+    """
+    if np.issubdtype(block.dtype, np.integer) and step == 1:
+        magnitude = np.abs(block).astype(np.uint32)
+    else:
+        magnitude = np.floor(np.abs(block) / step + 0.5).astype(np.uint32)
+    return magnitude, block < 0
+
+def plan_passes(block, num_passes):
+    """确定系数块的量化步长, 并把位平面从高到低划分为若干次传输
+
+    整数块(整数小波)步长为 1, 全部位平面传完即无损; 浮点块的步长使最大幅值占 15 个位平面,
+    与 encode_block 的 16 位量化精度相当。
+
+    Args:
+        block: 系数块
+        num_passes: 划分的传输次数
+
+    Returns:
+        step: 量化步长
+        passes: [(plane_hi, plane_lo), ...], 由高位到低位, 每次传输位平面 [plane_lo, plane_hi)
+    """
+    max_abs = float(np.abs(block).max()) if block.size else 0.0
+    if np.issubdtype(block.dtype, np.integer):
+        step = 1
+    else:
+        step = max_abs / 32767 if max_abs > 0 else 1.0
+    num_planes = int(np.floor(max_abs / step + 0.5)).bit_length()
+    groups = [group for group in np.array_split(np.arange(num_planes - 1, -1, -1), num_passes) if group.size]
+    return step, [(int(group[0]) + 1, int(group[-1])) for group in groups]
+
+@traced("encode_pass", "codec")
+def encode_pass(block, step, plane_hi, plane_lo):
+    """编码一次位平面传输: 位平面 plane_hi-1 .. plane_lo 以及本次幅值增量非零的系数的符号
+
+    Args:
+        block: 系数块
+        step: 量化步长
+        plane_hi: 最高位平面(不含)
+        plane_lo: 最低位平面(含)
+
+    Returns:
+        compressed_data: 包头 + zlib 压缩后的位平面数据
+    """
+    magnitude, negative = quantize(block, step)
+    increment = magnitude & np.uint32(((1 << plane_hi) - 1) ^ ((1 << plane_lo) - 1))
+    chunks = [np.packbits((magnitude >> np.uint32(plane)) & 1) for plane in range(plane_hi - 1, plane_lo - 1, -1)]
+    chunks.append(np.packbits(negative[increment != 0]))
+    payload = zlib.compress(b"".join(chunk.tobytes() for chunk in chunks))
+    return PASS_HEADER.pack(step, plane_hi, plane_lo) + payload
+
+@traced("decode_pass", "codec")
+def decode_pass(compressed_data, shape):
+    """解码一次位平面传输, 不依赖之前收到的数据
+
+    Args:
+        compressed_data: encode_pass 的结果
+        shape: 系数块的尺寸
+
+    Returns:
+        RefinementPass
+    """
+    step, plane_hi, plane_lo = PASS_HEADER.unpack_from(compressed_data)
+    bits = np.frombuffer(zlib.decompress(compressed_data[PASS_HEADER.size:]), dtype=np.uint8)
+    size = int(np.prod(shape))
+    plane_bytes = (size + 7) // 8
+
+    increment = np.zeros(size, dtype=np.uint32)
+    for i, plane in enumerate(range(plane_hi - 1, plane_lo - 1, -1)):
+        plane_bits = np.unpackbits(bits[i * plane_bytes:(i + 1) * plane_bytes], count=size)
+        increment |= plane_bits.astype(np.uint32) << np.uint32(plane)
+    significant = increment != 0
+    sign_bits = bits[(plane_hi - plane_lo) * plane_bytes:]
+    negative = np.zeros(size, dtype=bool)
+    negative[significant] = np.unpackbits(sign_bits, count=int(significant.sum())).astype(bool)
+    return RefinementPass(increment.reshape(shape), negative.reshape(shape), step, plane_lo)
+
+def dequantize(magnitude, negative, step, plane_lo):
+    """由当前已知的幅值重建系数, 尚未收到的低位平面取区间中点
+
+    Args:
+        magnitude: 已收到的幅值
+        negative: 符号
+        step: 量化步长
+        plane_lo: 已收到的最低位平面
+
+    Returns:
+        values: 重建的系数(float64)
+    """
+    offset = (1 << plane_lo) / 2 if plane_lo > 0 else 0.0
+    # 整数小波的步长为整数 1, 按浮点计算, 避免 uint32 幅值取负时回绕
+    values = np.where(magnitude > 0, (magnitude + offset) * float(step), 0.0)
+    return np.where(negative, -values, values)
@@ -0,0 +1,193 @@
+import lzma
+import struct
+import zlib
+import numpy as np
+from utils.util import encode_block, decode_block, normalize_block, denormalize_block, dequantize_block
+from utils.quantization import deadzone_quantize
+from utils.tracing import span
+
+# 线路上的编码编号, 0 与 1 固定为 JPEG2000 与位平面传输(位平面传输由 utils/bitplane.py 实现, 不在注册表中)
+CODEC_JP2 = 0
+CODEC_BITPLANE = 1
+
+# 字节编码的数据头: filters(B) center(I)
+BYTE_HEADER = struct.Struct("<BI")
+# filters: 按行差分 / 残差需要 32 位
+FILTER_DELTA = 1
+FILTER_WIDE = 2
+
+_codecs = {}
+_codec_names = {CODEC_BITPLANE: "bitplane"}
+
+class Codec:
+    """系数数据块编码器的接口, 通过 register_codec 注册后即可按名称选用
+
+    Attributes:
+        name: 编码名称, 命令行与 EncodedBlock.codec 中使用
+        codec_id: 数据块头中的编码编号(0-255), 接收端据此选择解码器
+    """
+    name = None
+    codec_id = None
+
+    def encode(self, block, quality, step=None):
+        """编码一个数据块
+
+        Args:
+            block: 频域数据
+            quality: JPEG2000 编码方式, 其余编码可以忽略
+            step: 死区量化步长(见 utils/quantization.py), None 表示按最小/最大值量化到 16 位
+
+        Returns:
+            compressed_data: 编码后的数据
+            block_min: 块中最小的元素
+            block_max: 块中最大的元素
+        """
+        raise NotImplementedError
+
+    def decode(self, compressed_data, block_min, block_max, shape, step=None):
+        """解码一个数据块
+
+        Args:
+            compressed_data: 编码后的数据
+            block_min: 块中最小的元素
+            block_max: 块中最大的元素
+            shape: 数据块的尺寸
+            step: 编码时的死区量化步长
+
+        Returns:
+            restored_block: 解码后的频域数据
+        """
+        raise NotImplementedError
+
+class JP2Codec(Codec):
+    """JPEG2000 编码, 见 utils/util.py 中的 encode_block / decode_block"""
+    name = "jp2"
+    codec_id = CODEC_JP2
+
+    def encode(self, block, quality, step=None):
+        return encode_block(block, quality, step)
+
+    def decode(self, compressed_data, block_min, block_max, shape, step=None):
+        return decode_block(compressed_data, block_min, block_max, step)
+
+class ByteCodec(Codec):
+    def __init__(self, name, codec_id, compress, decompress):
+        """量化系数的通用字节编码: 与 JPEG2000 相同的 16 位量化, 之后预处理并交给通用压缩器
+
+        预处理: 以系数 0 对应的量化值(中心)为参考得到残差, 或按行差分(适合 LL 等平滑子带), 取两者中
+        绝对值之和较小的一种; 残差经 zigzag 映射为无符号整数后按字节重排(同一字节位的数据放在一起,
+        细节子带的高位字节几乎全为 0), 最后压缩。没有容器开销, 小子带的编码结果远小于 JPEG2000。
+
+        Args:
+            name: 编码名称
+            codec_id: 编码编号
+            compress: bytes -> bytes 的压缩函数
+            decompress: bytes -> bytes 的解压函数
+        """
+        self.name = name
+        self.codec_id = codec_id
+        self.compress = compress
+        self.decompress = decompress
+
+    def encode(self, block, quality, step=None):
+        with span("encode_block", "codec", shape=list(block.shape), codec=self.name) as event:
+            if step is not None:
+                block = deadzone_quantize(block, step)
+            normalized_block, block_min, block_max = normalize_block(block, wide=True)
+            values = normalized_block.astype(np.int64)
+            center = self._center(block_min, block_max, normalized_block.dtype)
+            residual = values - center
+            delta = np.diff(values, axis=1, prepend=center)
+            filters = 0
+            if np.abs(delta).sum() < np.abs(residual).sum():
+                residual, filters = delta, FILTER_DELTA
+            # zigzag: 0, -1, 1, -2, ... -> 0, 1, 2, 3, ...
+            zigzag = (residual << 1) ^ (residual >> 63)
+            dtype = np.uint16
+            if zigzag.size and zigzag.max() > 0xFFFF:
+                if zigzag.max() > 0xFFFFFFFF:
+                    raise ValueError(f"The value range of the block is too large for codec {self.name}.")
+                dtype, filters = np.uint32, filters | FILTER_WIDE
+            shuffled = zigzag.astype(dtype).view(np.uint8).reshape(-1, np.dtype(dtype).itemsize).T.tobytes()
+            compressed_data = BYTE_HEADER.pack(filters, center) + self.compress(shuffled)
+            event.set(bytes=len(compressed_data))
+        return compressed_data, block_min, block_max
+
+    def decode(self, compressed_data, block_min, block_max, shape, step=None):
+        with span("decode_block", "codec", bytes=len(compressed_data), codec=self.name):
+            filters, center = BYTE_HEADER.unpack_from(compressed_data)
+            raw = self.decompress(memoryview(compressed_data)[BYTE_HEADER.size:])
+            dtype = np.uint32 if filters & FILTER_WIDE else np.uint16
+            itemsize = np.dtype(dtype).itemsize
+            zigzag = np.frombuffer(raw, dtype=np.uint8).reshape(itemsize, -1).T.copy().view(dtype)
+            zigzag = zigzag.reshape(shape).astype(np.int64)
+            residual = (zigzag >> 1) ^ -(zigzag & 1)
+            if filters & FILTER_DELTA:
+                values = np.cumsum(residual, axis=1) + center
+            else:
+                values = residual + center
+            wide = isinstance(block_min, int) and block_max - block_min > 0xFFFF
+            restored_block = denormalize_block(values.astype(np.uint32 if wide else np.uint16), block_min, block_max)
+            return dequantize_block(restored_block, step)
+
+    @staticmethod
+    def _center(block_min, block_max, dtype):
+        """系数 0 对应的量化值, 0 不在取值范围内时为最接近的端点"""
+        if isinstance(block_min, int):
+            return min(max(-block_min, 0), block_max - block_min)
+        if block_max == block_min:
+            return 0
+        return int(np.clip(round(-block_min / (block_max - block_min) * 65535), 0, np.iinfo(dtype).max))
+
+def register_codec(codec):
+    """注册编码器, 名称与编号都不能与已注册的编码重复
+
+    Args:
+        codec: Codec 对象
+    """
+    if codec.name in _codecs or codec.codec_id in _codec_names:
+        raise ValueError(f"Codec {codec.name} (id {codec.codec_id}) is already registered.")
+    if not 0 <= codec.codec_id <= 255:
+        raise ValueError(f"Codec id must fit in one byte, got {codec.codec_id}.")
+    _codecs[codec.name] = codec
+    _codec_names[codec.codec_id] = codec.name
+
+def get_codec(name):
+    """按名称取得编码器
+
+    Args:
+        name: 编码名称
+
+    Raises:
+        ValueError: 未注册的编码名称
+
+    Returns:
+        codec: Codec 对象
+    """
+    if name not in _codecs:
+        raise ValueError(f"Unknown codec: {name}, choose from {', '.join(available_codecs())}.")
+    return _codecs[name]
+
+def available_codecs():
+    """已注册的编码名称"""
+    return list(_codecs)
+
+def codec_id(name):
+    """编码名称对应的数据块头编号, 包括位平面传输"""
+    if name == "bitplane":
+        return CODEC_BITPLANE
+    return get_codec(name).codec_id
+
+def codec_name(codec_id):
+    """数据块头编号对应的编码名称
+
+    Raises:
+        ValueError: 未知的编码编号
+    """
+    if codec_id not in _codec_names:
+        raise ValueError(f"Unknown codec id: {codec_id}.")
+    return _codec_names[codec_id]
+
+register_codec(JP2Codec())
+register_codec(ByteCodec("zlib", 2, lambda data: zlib.compress(data, 3), zlib.decompress))
+register_codec(ByteCodec("lzma", 3, lambda data: lzma.compress(data, preset=1), lzma.decompress))
@@ -0,0 +1,43 @@
+import numpy as np
+
+def xor_parity(payloads):
+    """计算一组数据包的 XOR 校验包: 各数据包补零到最长的长度后逐字节异或
+
+    一组中任意一个数据包丢失或损坏时, 可以由校验包与其余数据包恢复(见 recover_payload)。
+
+    Args:
+        payloads: 同一组的数据包字节串列表
+
+    Returns:
+        lengths: 各数据包的长度, 恢复时用于截去补零
+        parity: 校验包字节串
+    """
+    lengths = [len(payload) for payload in payloads]
+    parity = np.zeros(max(lengths, default=0), dtype=np.uint8)
+    for payload in payloads:
+        data = np.frombuffer(payload, dtype=np.uint8)
+        parity[:data.size] ^= data
+    return lengths, parity.tobytes()
+
+def recover_payload(lengths, parity, payloads, missing):
+    """由校验包与同组其余数据包恢复缺失的一个数据包
+
+    Args:
+        lengths: xor_parity 得到的各数据包长度
+        parity: 校验包字节串
+        payloads: {组内序号: 数据包字节串}, 除 missing 外的全部数据包
+        missing: 缺失数据包的组内序号
+
+    Raises:
+        ValueError: 除 missing 外还有数据包缺失时报错, XOR 校验只能恢复一个数据包
+
+    Returns:
+        payload: 恢复得到的数据包字节串
+    """
+    if len(payloads) != len(lengths) - 1 or missing in payloads:
+        raise ValueError(f"XOR parity recovers exactly one missing packet, {len(lengths) - len(payloads)} missing.")
+    data = np.frombuffer(parity, dtype=np.uint8).copy()
+    for payload in payloads.values():
+        other = np.frombuffer(payload, dtype=np.uint8)
+        data[:other.size] ^= other
+    return data[:lengths[missing]].tobytes()
@@ -0,0 +1,154 @@
+import math
+import cv2
+import numpy as np
+
+# SSIM 的常数与高斯窗口(Wang et al. 2004)
+SSIM_K1 = 0.01
+SSIM_K2 = 0.03
+SSIM_WINDOW = 11
+SSIM_SIGMA = 1.5
+
+def peak_value(image):
+    """按图像的位深估计 PSNR 的峰值, 例如 8 位图像为 255, 12 位图像为 4095
+
+    Args:
+        image: 原始图像
+
+    Returns:
+        peak: 峰值
+    """
+    if image.dtype == np.uint8:
+        return 255.0
+    maximum = float(np.max(image))
+    return float(2 ** max(8, math.ceil(math.log2(maximum + 1))) - 1)
+
+def mse(original_image, reconstructed_image):
+    """计算两幅同尺寸图像之间的均方误差, 使用 OpenCV 单次遍历, 不产生与图像同尺寸的临时数组
+
+    Args:
+        original_image: 原始图像
+        reconstructed_image: 重建图像
+
+    Returns:
+        loss: 均方误差
+    """
+    original_image = np.asarray(original_image, dtype=np.float32)
+    reconstructed_image = np.asarray(reconstructed_image, dtype=np.float32)
+    if original_image.size == 0:
+        return 0.0
+    return cv2.norm(original_image, reconstructed_image, cv2.NORM_L2SQR) / original_image.size
+
+def psnr(loss, peak):
+    """由均方误差计算峰值信噪比
+
+    Args:
+        loss: 均方误差
+        peak: 峰值
+
+    Returns:
+        psnr: 峰值信噪比(dB), 无误差时为 inf
+    """
+    if loss <= 0:
+        return math.inf
+    return 10 * math.log10(peak ** 2 / loss)
+
+def _blur(image):
+    return cv2.GaussianBlur(image, (SSIM_WINDOW, SSIM_WINDOW), SSIM_SIGMA)
+
+class QualityMetrics:
+    def __init__(self, reference, peak=None, stride=1, ssim=False, strip_rows=64):
+        """逐步重建过程中的画质指标(MSE / PSNR / SSIM), 增量计算
+
+        图像按行分为条带, 缓存每个条带的误差平方和与 SSIM 之和; 每一步只重新计算自上一步以来发生
+        变化的行所在的条带。stride 大于 1 时只在每隔 stride 行、stride 列的采样网格上计算,
+        MSE 为全图 MSE 的无偏估计, 计算量降为 1/stride^2; SSIM 在采样网格上计算。
+
+        Args:
+            reference: 原始图像
+            peak: PSNR 与 SSIM 使用的峰值, 默认由 peak_value 按位深估计
+            stride: 采样间隔
+            ssim: 是否计算 SSIM
+            strip_rows: 采样网格上每个条带的行数
+        """
+        if stride < 1:
+            raise ValueError(f"The metric stride must be positive, got {stride}.")
+        self.shape = reference.shape
+        self.stride = stride
+        self.peak = peak if peak is not None else peak_value(reference)
+        self.strip_rows = strip_rows
+        # stride 为 1 且已是 float32 时不复制原图
+        self.reference = np.ascontiguousarray(np.asarray(reference, dtype=np.float32)[::stride, ::stride])
+        rows = self.reference.shape[0]
+        self.strips = [(start, min(start + strip_rows, rows)) for start in range(0, rows, strip_rows)]
+        self.strip_errors = np.zeros(len(self.strips), dtype=np.float64)
+        self.ssim = ssim
+        if ssim:
+            # 原图一侧的局部均值与方差只需计算一次
+            self.ref_mean = _blur(self.reference)
+            self.ref_var = _blur(self.reference * self.reference) - self.ref_mean ** 2
+            self.strip_ssim = np.zeros(len(self.strips), dtype=np.float64)
+            self.c1 = (SSIM_K1 * self.peak) ** 2
+            self.c2 = (SSIM_K2 * self.peak) ** 2
+        self.initialized = False
+
+    def update(self, image, rows=None):
+        """计算重建图像的画质指标
+
+        Args:
+            image: 重建图像, 尺寸大于原图时只比较原图范围内的部分
+            rows: 自上一次调用以来发生变化的图像行范围 (row_start, row_end), None 表示整幅图像;
+                调用者需保证范围之外的像素与上一次调用时相同
+
+        Returns:
+            quality: {"mse", "psnr"}, 计算 SSIM 时还包含 "ssim"
+        """
+        image = image[:self.shape[0]:self.stride, :self.shape[1]:self.stride]
+        if rows is None or not self.initialized:
+            changed = range(len(self.strips))
+        else:
+            # 变化范围换算到采样网格上的行, SSIM 窗口跨越条带边界, 相邻条带在半个窗口内的像素同样变化
+            start, end = -(-rows[0] // self.stride), -(-rows[1] // self.stride)
+            if self.ssim:
+                start, end = start - SSIM_WINDOW // 2, end + SSIM_WINDOW // 2
+            first = start // self.strip_rows
+            last = (end - 1) // self.strip_rows
+            changed = range(max(first, 0), min(last + 1, len(self.strips)))
+        for index in changed:
+            start, end = self.strips[index]
+            strip = np.ascontiguousarray(image[start:end], dtype=np.float32)
+            self.strip_errors[index] = cv2.norm(self.reference[start:end], strip, cv2.NORM_L2SQR)
+            if self.ssim:
+                self.strip_ssim[index] = self._strip_ssim(image, start, end)
+        self.initialized = True
+
+        loss = float(self.strip_errors.sum()) / self.reference.size
+        quality = {"mse": loss, "psnr": psnr(loss, self.peak)}
+        if self.ssim:
+            quality["ssim"] = float(self.strip_ssim.sum()) / self.reference.size
+        return quality
+
+    def _strip_ssim(self, image, start, end):
+        """计算一个条带内 SSIM 之和, 上下各多取半个窗口的行, 结果与整幅图像计算时相同
+
+        Args:
+            image: 采样网格上的重建图像
+            start: 条带的起始行
+            end: 条带的结束行(不含)
+
+        Returns:
+            total: 条带内每个像素 SSIM 之和
+        """
+        halo = SSIM_WINDOW // 2
+        lo, hi = max(start - halo, 0), min(end + halo, self.reference.shape[0])
+        x = self.reference[lo:hi]
+        y = np.ascontiguousarray(image[lo:hi], dtype=np.float32)
+        mu_y = _blur(y)
+        var_y = _blur(y * y) - mu_y ** 2
+        cov = _blur(x * y)
+        inner = slice(start - lo, end - lo)
+        mu_x, var_x = self.ref_mean[start:end], self.ref_var[start:end]
+        mu_y, var_y = mu_y[inner], var_y[inner]
+        cov = cov[inner] - mu_x * mu_y
+        ssim_map = ((2 * mu_x * mu_y + self.c1) * (2 * cov + self.c2) /
+                    ((mu_x ** 2 + mu_y ** 2 + self.c1) * (var_x + var_y + self.c2)))
+        return float(np.sum(ssim_map, dtype=np.float64))
@@ -0,0 +1,112 @@
+import math
+import numpy as np
+
+# 反量化时非零系数重建在量化区间内的位置, 0.5 为区间中点; 系数分布陡峭时略小的值(如 0.375)
+# 可以降低均方误差, 在合成 12 位图像上中点的码率略低
+DEADZONE_BIAS = 0.5
+# 选择步长时每个子带最多使用的样本数
+SAMPLE_SIZE = 1 << 15
+# 二分查找的次数, 步长的相对精度约为 2^(-BISECT_STEPS / 2)
+BISECT_STEPS = 40
+
+def deadzone_quantize(block, step):
+    """死区均匀量化: q = sign(x) * floor(|x| / step), 零点两侧各有一个步长宽的死区
+
+    Args:
+        block: 系数块
+        step: 量化步长
+
+    Returns:
+        quantized: int32 量化值
+    """
+    quantized = np.floor(np.abs(block) / step).astype(np.int32)
+    return np.where(block < 0, -quantized, quantized)
+
+def deadzone_dequantize(quantized, step):
+    """deadzone_quantize 的反量化, 非零值重建在量化区间内偏移 DEADZONE_BIAS 处
+
+    Args:
+        quantized: 整数量化值
+        step: 量化步长
+
+    Returns:
+        restored: float32 系数
+    """
+    quantized = np.asarray(quantized)
+    magnitude = (np.abs(quantized) + DEADZONE_BIAS) * step
+    return np.where(quantized == 0, 0, np.copysign(magnitude, quantized)).astype(np.float32)
+
+def _sample(block):
+    """按行列等间隔抽取不超过 SAMPLE_SIZE 个系数, 返回样本与每个样本代表的系数个数"""
+    stride = max(1, math.ceil(math.sqrt(block.size / SAMPLE_SIZE)))
+    sample = np.asarray(block[::stride, ::stride], dtype=np.float64).ravel()
+    return sample, block.size / max(sample.size, 1)
+
+def _entropy(quantized):
+    """量化值的零阶经验熵(比特/系数)"""
+    _, counts = np.unique(quantized, return_counts=True)
+    probabilities = counts / quantized.size
+    return float(-np.sum(probabilities * np.log2(probabilities)))
+
+def choose_steps(bands, gains, num_pixels, target_psnr=None, target_bpp=None, peak=4095.0, integer=False):
+    """按目标 PSNR 或目标码率为每个子带选择死区量化步长
+
+    各子带的步长取 delta / sqrt(gain), 使每个子带的量化误差在图像域中的权重相同; 在各子带的抽样
+    系数上二分查找全局的 delta: 失真为抽样系数量化误差平方和乘以子带增益, 码率为量化值的零阶熵,
+    两者均按子带系数个数放大后除以像素数。
+
+    Args:
+        bands: {(level, block_type): 系数}, 参与重建的子带
+        gains: synthesis_gains 得到的子带增益
+        num_pixels: 像素数, 用于换算 MSE 与每像素比特数
+        target_psnr: 目标 PSNR(dB), 与 target_bpp 二选一
+        target_bpp: 目标码率(比特/像素)
+        peak: PSNR 的峰值
+        integer: 系数是否为整数(整数小波), 此时步长不超过 1 的子带不量化, 保持无损
+
+    Raises:
+        ValueError: target_psnr 与 target_bpp 没有恰好给出一个时报错
+
+    Returns:
+        steps: {(level, block_type): 步长}, 不量化的子带为 None
+    """
+    if (target_psnr is None) == (target_bpp is None):
+        raise ValueError("Exactly one of target_psnr and target_bpp must be given.")
+    samples = {key: _sample(block) for key, block in bands.items()}
+    weights = {key: math.sqrt(gains.get(key, 1.0)) for key in bands}
+
+    def band_step(key, delta):
+        step = delta / weights[key]
+        return None if integer and step <= 1 else step
+
+    def evaluate(delta):
+        distortion, bits = 0.0, 0.0
+        for key, (sample, scale) in samples.items():
+            step = band_step(key, delta)
+            if step is None:
+                # 整数系数不量化时无损, 码率按整数值的熵估计
+                bits += scale * _entropy(sample) * sample.size
+                continue
+            quantized = deadzone_quantize(sample, step)
+            error = sample - deadzone_dequantize(quantized, step)
+            distortion += gains.get(key, 1.0) * scale * float(np.dot(error, error))
+            bits += scale * _entropy(quantized) * sample.size
+        return distortion / num_pixels, bits / num_pixels
+
+    # 上界使全部系数落入死区, 下界为其 2^-32
+    max_weighted = max((float(np.max(np.abs(sample))) * weights[key] if sample.size else 0.0)
+                       for key, (sample, _) in samples.items())
+    hi = math.log2(max(max_weighted, 1e-12)) + 1
+    lo = hi - 32
+    target_mse = peak ** 2 / 10 ** (target_psnr / 10) if target_psnr is not None else None
+    for _ in range(BISECT_STEPS):
+        mid = (lo + hi) / 2
+        mse, bpp = evaluate(2 ** mid)
+        # 步长越大, 失真越大、码率越低; 在满足目标的前提下取最大的步长
+        satisfied = mse <= target_mse if target_mse is not None else bpp <= target_bpp
+        if satisfied == (target_mse is not None):
+            lo = mid
+        else:
+            hi = mid
+    delta = 2 ** (lo if target_mse is not None else hi)
+    return {key: band_step(key, delta) for key in bands}
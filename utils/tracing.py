@@ -0,0 +1,151 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+# 全局开关, 关闭时 span 只返回同一个空对象, traced 只多一次判断, 可以常驻在生产环境中
+_enabled = False
+_origin_ns = 0
+_events = deque()
+
+class _Span:
+    __slots__ = ("name", "category", "args", "start")
+
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = 0
+
+    def set(self, **args):
+        """补充事件参数, 例如编码后的字节数"""
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        # deque.append 是原子操作, 多个线程可以同时记录
+        _events.append((self.name, self.category, self.start, end - self.start, threading.get_ident(), self.args))
+        return False
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+def enable(max_events=None):
+    """开启记录, 清空之前的事件
+
+    Args:
+        max_events: 最多保留的事件数, 超出时丢弃最早的事件, 用于长驻进程; None 表示不限制
+    """
+    global _enabled, _origin_ns, _events
+    _events = deque(maxlen=max_events)
+    _origin_ns = time.perf_counter_ns()
+    _enabled = True
+
+def disable():
+    """关闭记录, 已记录的事件保留到下一次 enable"""
+    global _enabled
+    _enabled = False
+
+def is_enabled():
+    """是否正在记录"""
+    return _enabled
+
+def span(name, category, **args):
+    """记录一个阶段的耗时, 用法: with span("encode_block", "codec") as s: ...; s.set(bytes=n)
+
+    Args:
+        name: 阶段名称
+        category: 阶段类别(transform / codec / transmission / wire / reconstruction / display)
+        args: 附加在事件上的参数, 其中 bytes 会在汇总表中累加
+
+    Returns:
+        上下文管理器, 关闭记录时为共享的空对象
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, category, args)
+
+def traced(name, category):
+    """记录函数每次调用耗时的装饰器
+
+    Args:
+        name: 阶段名称
+        category: 阶段类别
+    """
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(name, category, {}):
+                return func(*args, **kwargs)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        wrapper.__wrapped__ = func
+        return wrapper
+    return decorator
+
+def summary():
+    """按阶段汇总已记录的事件
+
+    Returns:
+        rows: [{"name", "category", "count", "total", "mean", "max", "bytes"}, ...], 按总耗时从大到小排列,
+            时间单位为秒
+    """
+    stats = defaultdict(lambda: {"count": 0, "total": 0, "max": 0, "bytes": 0})
+    for name, category, _, duration, _, args in list(_events):
+        entry = stats[(name, category)]
+        entry["count"] += 1
+        entry["total"] += duration
+        entry["max"] = max(entry["max"], duration)
+        entry["bytes"] += args.get("bytes", 0)
+    rows = [
+        {"name": name, "category": category, "count": entry["count"], "total": entry["total"] / 1e9,
+         "mean": entry["total"] / entry["count"] / 1e9, "max": entry["max"] / 1e9, "bytes": entry["bytes"]}
+        for (name, category), entry in stats.items()
+    ]
+    return sorted(rows, key=lambda row: row["total"], reverse=True)
+
+def print_summary():
+    """打印各阶段的调用次数、耗时与字节数
+    """
+    print(f"{'stage':>20} {'category':>14} {'count':>6} {'total':>10} {'mean':>10} {'max':>10} {'bytes':>12}")
+    for row in summary():
+        print(f"{row['name']:>20} {row['category']:>14} {row['count']:>6} {row['total']:>9.3f}s "
+              f"{row['mean'] * 1000:>8.2f}ms {row['max'] * 1000:>8.2f}ms {row['bytes']:>12}")
+
+def save_trace(trace_path):
+    """将已记录的事件保存为 Chrome trace / Perfetto 可以打开的 JSON 时间线
+
+    Args:
+        trace_path: 保存的文件路径
+    """
+    pid = os.getpid()
+    threads = {thread.ident: thread.name for thread in threading.enumerate()}
+    trace_events = []
+    tids = set()
+    for name, category, start, duration, tid, args in list(_events):
+        tids.add(tid)
+        trace_events.append({"name": name, "cat": category, "ph": "X", "pid": pid, "tid": tid,
+                             "ts": (start - _origin_ns) / 1000, "dur": duration / 1000, "args": args})
+    for tid in tids:
+        trace_events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                             "args": {"name": threads.get(tid, f"thread-{tid}")}})
+    os.makedirs(os.path.dirname(trace_path) or ".", exist_ok=True)
+    with open(trace_path, "w") as f:
+        json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
@@ -1,44 +1,111 @@
 import numpy as np
-import imageio
-import tempfile
+import imageio.v2 as imageio
+from utils.tracing import span
+from utils.quantization import deadzone_quantize, deadzone_dequantize
 
-def encode_block(block, quality_mode="dB"):
-    """使用 imageio 对数据块进行 JPEG2000 压缩。
+def encode_block(block, quality_mode="dB", step=None):
+    """使用 imageio 对数据块进行 JPEG2000 压缩, 编码结果直接写入内存缓冲区, 不经过临时文件。
+
+    整数数据块(整数小波的系数)在取值范围不超过 16 位时只减去最小值, 不做缩放, 可以无损还原;
+    此时返回的 block_min, block_max 为整数。给出 step 时先做死区均匀量化, 编码量化后的整数。
 
     Args:
         block: 待压缩的数据块
         quality_mode: 压缩模式， 默认为"dB"
+        step: 死区量化步长, None 表示按最小/最大值量化到 16 位
 
     Returns:
         compressed_data: 压缩后的数据块
         block_min: 块中最小的元素
         block_max: 块中最大的元素
-    """    
+    """
+    with span("encode_block", "codec", shape=list(block.shape)) as event:
+        if step is not None:
+            block = deadzone_quantize(block, step)
+        compressed_data, block_min, block_max = _encode_block(block, quality_mode)
+        event.set(bytes=len(compressed_data))
+    return compressed_data, block_min, block_max
+
+def normalize_block(block, wide=False):
+    """把数据块映射为无符号整数, JPEG2000 与字节编码共用
+
+    整数数据块在取值范围不超过 16 位时只减去最小值, 可以无损还原, 此时返回的 block_min, block_max
+    为整数; wide 为 True 时范围超过 16 位的整数数据块同样只减去最小值, 结果为 uint32。其余数据块按
+    最小/最大值线性量化到 16 位。
+
+    Args:
+        block: 数据块
+        wide: 是否允许输出 uint32
+
+    Returns:
+        normalized_block: uint16 或 uint32 数组
+        block_min: 块中最小的元素
+        block_max: 块中最大的元素
+    """
     block_min, block_max = block.min(), block.max()
-    normalized_block = ((block - block_min) / (block_max - block_min) * 65535).astype(np.uint16)
+    if np.issubdtype(block.dtype, np.integer) and int(block_max) - int(block_min) <= 65535:
+        normalized_block = (block - block_min).astype(np.uint16)
+        block_min, block_max = int(block_min), int(block_max)
+    elif np.issubdtype(block.dtype, np.integer) and wide:
+        normalized_block = (block.astype(np.int64) - int(block_min)).astype(np.uint32)
+        block_min, block_max = int(block_min), int(block_max)
+    elif block_max == block_min:
+        # 常数块(例如平坦区域的分块)直接编码为全 0, 解码时恢复为 block_min
+        normalized_block = np.zeros(block.shape, dtype=np.uint16)
+    else:
+        normalized_block = ((block - block_min) / (block_max - block_min) * 65535).astype(np.uint16)
+    return normalized_block, block_min, block_max
 
-    with tempfile.NamedTemporaryFile(suffix=".jp2", delete=False) as temp_file:
-        imageio.imwrite(temp_file.name, normalized_block, format="JP2", quality_mode=quality_mode)
-        with open(temp_file.name, "rb") as f:
-            compressed_data = f.read()
+def denormalize_block(normalized_block, block_min, block_max):
+    """normalize_block 的逆过程
+
+    Args:
+        normalized_block: 无符号整数数组
+        block_min: 块中最小的元素
+        block_max: 块中最大的元素
+
+    Returns:
+        restored_block: block_min 为整数时为 int32, 否则为 float32
+    """
+    if isinstance(block_min, int):
+        return normalized_block.astype(np.int32) + block_min
+    return normalized_block.astype(np.float32) / 65535 * (block_max - block_min) + block_min
+
+def _encode_block(block, quality_mode):
+    """encode_block 的实现, 参数与返回值见 encode_block"""
+    normalized_block, block_min, block_max = normalize_block(block)
+
+    # "<bytes>" 让 imageio 把编码结果作为 bytes 返回
+    compressed_data = imageio.imwrite("<bytes>", normalized_block, format="JP2", quality_mode=quality_mode)
 
     return compressed_data, block_min, block_max
 
-def decode_block(compressed_data, block_min, block_max):
+def decode_block(compressed_data, block_min, block_max, step=None):
     """解压JPEG2000压缩数据,并还原为float32类型
 
     Args:
         compressed_data: 压缩数据
         block_min: 块中最小的元素
         block_max: 块中最大的元素
+        step: 编码时的死区量化步长, None 表示未做死区量化
+
+    Returns:
+        restored_block: 解压后的数据块, block_min 为整数且未做死区量化时为 int32
+    """
+    with span("decode_block", "codec", bytes=len(compressed_data)):
+        decompressed_data = imageio.imread(compressed_data, format="JP2")
+        return dequantize_block(denormalize_block(decompressed_data, block_min, block_max), step)
+
+def dequantize_block(restored_block, step):
+    """对解码得到的死区量化值反量化, 量化值超过 16 位范围时解码结果为浮点数, 先取整
+
+    Args:
+        restored_block: denormalize_block 的结果
+        step: 死区量化步长, None 时原样返回
 
     Returns:
-        restored_block: 解压后的数据块
-    """    
-    with tempfile.NamedTemporaryFile(suffix=".jp2", delete=False) as temp_file:
-        temp_file.write(compressed_data)
-        temp_file.flush()
-        decompressed_data = imageio.imread(temp_file.name, format="JP2")
-
-    restored_block = decompressed_data.astype(np.float32) / 65535 * (block_max - block_min) + block_min
-    return restored_block
\ No newline at end of file
+        restored_block: 反量化后的系数
+    """
+    if step is None:
+        return restored_block
+    return deadzone_dequantize(np.rint(restored_block), step)
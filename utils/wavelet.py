@@ -0,0 +1,261 @@
+import numpy as np
+import pywt
+
+# 整数到整数的可逆小波(提升格式实现), 其余名称交给 pywt
+INTEGER_WAVELETS = ("int53",)
+
+def is_integer_wavelet(wavelet):
+    """判断小波是否为整数可逆小波
+
+    Args:
+        wavelet: 小波名称
+
+    Returns:
+        是否为整数可逆小波
+    """
+    return wavelet in INTEGER_WAVELETS
+
+def _lift53_forward(x):
+    """沿第 0 维进行一层可逆 5/3 提升变换, 奇数长度时复制最后一行补齐
+
+    Args:
+        x: int32 数组
+
+    Returns:
+        s: 低频部分
+        d: 高频部分
+    """
+    if x.shape[0] % 2:
+        x = np.concatenate([x, x[-1:]])
+    even, odd = x[0::2], x[1::2]
+    # 预测: d[n] = odd[n] - floor((even[n] + even[n+1]) / 2), 边界对称延拓
+    even_next = np.concatenate([even[1:], even[-1:]])
+    d = odd - ((even + even_next) >> 1)
+    # 更新: s[n] = even[n] + floor((d[n-1] + d[n] + 2) / 4)
+    d_prev = np.concatenate([d[:1], d[:-1]])
+    s = even + ((d_prev + d + 2) >> 2)
+    return s, d
+
+def _lift53_inverse(s, d):
+    """_lift53_forward 的逆变换, 结果为偶数长度"""
+    d_prev = np.concatenate([d[:1], d[:-1]])
+    even = s - ((d_prev + d + 2) >> 2)
+    even_next = np.concatenate([even[1:], even[-1:]])
+    odd = d + ((even + even_next) >> 1)
+    x = np.empty((2 * s.shape[0],) + s.shape[1:], dtype=s.dtype)
+    x[0::2] = even
+    x[1::2] = odd
+    return x
+
+def dwt2(image, wavelet):
+    """一层二维小波变换, 返回值与 pywt.dwt2 相同: (LL, (LH, HL, HH))
+
+    Args:
+        image: 输入图像
+        wavelet: 小波名称
+
+    Returns:
+        (LL, (LH, HL, HH)): 四个子带, 整数小波时为 int32
+    """
+    if not is_integer_wavelet(wavelet):
+        return pywt.dwt2(image, wavelet)
+    low, high = _lift53_forward(np.asarray(image, dtype=np.int32))
+    LL, HL = (band.T for band in _lift53_forward(low.T))
+    LH, HH = (band.T for band in _lift53_forward(high.T))
+    return LL, (LH, HL, HH)
+
+def idwt2(coeffs, wavelet):
+    """一层二维小波逆变换, 参数形式与 pywt.idwt2 相同, 结果可能比原尺寸多一行/列, 由调用方裁剪
+
+    Args:
+        coeffs: (LL, (LH, HL, HH))
+        wavelet: 小波名称
+
+    Returns:
+        重建结果
+    """
+    if not is_integer_wavelet(wavelet):
+        return pywt.idwt2(coeffs, wavelet)
+    LL, (LH, HL, HH) = coeffs
+    low = _lift53_inverse(LL.T, HL.T).T
+    high = _lift53_inverse(LH.T, HH.T).T
+    return _lift53_inverse(low, high)
+
+def coeff_len(length, wavelet):
+    """一层小波变换后系数的长度, 与 dwt2 的结果一致
+
+    Args:
+        length: 输入的长度
+        wavelet: 小波名称
+
+    Returns:
+        系数的长度
+    """
+    if is_integer_wavelet(wavelet):
+        return (length + 1) // 2
+    return pywt.dwt_coeff_len(length, pywt.Wavelet(wavelet).dec_len, "symmetric")
+
+def idwt_len(length, wavelet):
+    """一层小波逆变换后结果的长度, 与 idwt2 的结果一致(未裁剪)
+
+    Args:
+        length: 系数的长度
+        wavelet: 小波名称
+
+    Returns:
+        逆变换结果的长度
+    """
+    if is_integer_wavelet(wavelet):
+        return 2 * length
+    return 2 * length - pywt.Wavelet(wavelet).dec_len + 2
+
+def approximation_gain(wavelet):
+    """一层二维小波变换中 LL 子带相对于像素值的直流增益, 近似系数除以 gain^k 即为第 k 层分辨率下的图像
+
+    pywt 的低通滤波器系数之和为 sqrt(2), 每层二维变换放大 2 倍; int53 的低频部分为相邻像素的均值, 增益为 1。
+
+    Args:
+        wavelet: 小波名称
+
+    Returns:
+        gain: 每层的直流增益
+    """
+    if is_integer_wavelet(wavelet):
+        return 1.0
+    return float(sum(pywt.Wavelet(wavelet).dec_lo)) ** 2
+
+def approximation_offset(wavelet, level):
+    """第 level 层 LL 中下标为 i 的系数对应原图中坐标约为 2^level * i + offset 的位置(按合成滤波器的重心)
+
+    一层逆变换把下标 i 放到 2i 处与低通合成滤波器卷积, pywt 再去掉开头 dec_len - 2 个边界样本,
+    因此每层偏移 c = 重心 - (dec_len - 2), 逐层累积为 c * (2^level - 1); int53 的低频部分与偶数样本对齐, 偏移为 0。
+
+    Args:
+        wavelet: 小波名称
+        level: 层数
+
+    Returns:
+        offset: 原图坐标中的偏移(像素)
+    """
+    if is_integer_wavelet(wavelet):
+        return 0.0
+    w = pywt.Wavelet(wavelet)
+    rec_lo = np.asarray(w.rec_lo)
+    shift = float(np.dot(np.arange(rec_lo.size), rec_lo) / rec_lo.sum()) - (w.dec_len - 2)
+    return shift * (2 ** level - 1)
+
+def dwt2_strips(image, wavelet, out, strip_rows=256):
+    """按行条带计算一层二维小波变换, 结果与 dwt2 相同, 每次只读取一个条带及其上下的重叠行
+
+    输出的每个系数行条带对应输入中 2 倍行数的条带, 上下各多读取一个滤波器长度的行, 条带内部的
+    边界延拓只影响多读取的部分, 裁掉后与整幅变换的结果一致。image 与 out 可以是 np.memmap,
+    内存占用只与条带大小有关。
+
+    Args:
+        image: 输入图像, 二维数组
+        wavelet: 小波名称
+        out: 预先分配的 (LL, LH, HL, HH), 尺寸为 (coeff_len(rows), coeff_len(cols))
+        strip_rows: 每个条带输出的系数行数
+    """
+    dtype = np.int32 if is_integer_wavelet(wavelet) else np.float32
+    halo = 2 if is_integer_wavelet(wavelet) else pywt.Wavelet(wavelet).dec_len
+    rows = image.shape[0]
+    out_rows = out[0].shape[0]
+    for row_start in range(0, out_rows, strip_rows):
+        row_end = min(row_start + strip_rows, out_rows)
+        # 输入条带从偶数行开始, 条带内的系数下标与整幅变换相差 start // 2
+        start = max(0, 2 * (row_start - halo))
+        stop = min(rows, 2 * (row_end + halo))
+        LL, (LH, HL, HH) = dwt2(np.asarray(image[start:stop], dtype=dtype), wavelet)
+        offset = row_start - start // 2
+        for band, target in zip((LL, LH, HL, HH), out):
+            target[row_start:row_end] = band[offset:offset + row_end - row_start]
+
+def synthesis_gains(wavelet, level):
+    """估计每一层每个子带的系数误差传递到图像域后的能量增益
+
+    正交小波各子带增益均为 1; 其余小波(如 int53)在零图像的小波域放置单位冲激, 逐层逆变换后
+    计算图像域的能量得到增益。
+
+    Args:
+        wavelet: 小波名称
+        level: 小波变换的层数
+
+    Returns:
+        gains: {(level, block_type): gain}
+    """
+    bands = ("LL", "LH", "HL", "HH")
+    if not is_integer_wavelet(wavelet) and pywt.Wavelet(wavelet).orthogonal:
+        return {(k, band): 1.0 for k in range(level) for band in bands}
+
+    # 整数小波的逆变换含取整, 使用较大的冲激幅值以减小取整误差的影响
+    amplitude = 1024
+    size = 32 << level
+    current = np.zeros((size, size), dtype=np.int32 if is_integer_wavelet(wavelet) else np.float64)
+    shapes = []
+    for _ in range(level):
+        current, _ = dwt2(current, wavelet)
+        shapes.append(current.shape)
+
+    gains = {}
+    for k in range(level):
+        for band in bands:
+            zeros = np.zeros(shapes[k], dtype=current.dtype)
+            subbands = {name: zeros for name in bands}
+            impulse = zeros.copy()
+            impulse[shapes[k][0] // 2, shapes[k][1] // 2] = amplitude
+            subbands[band] = impulse
+            image = idwt2((subbands["LL"], (subbands["LH"], subbands["HL"], subbands["HH"])), wavelet)
+            for j in range(k - 1, -1, -1):
+                image = image[:shapes[j][0], :shapes[j][1]]
+                zeros = np.zeros(shapes[j], dtype=current.dtype)
+                image = idwt2((image.astype(current.dtype), (zeros, zeros, zeros)), wavelet)
+            gains[(k, band)] = float(np.sum(np.asarray(image, dtype=np.float64) ** 2)) / amplitude ** 2
+    return gains
+
+def roi_footprint(roi, wavelet, block_size):
+    """把图像域的感兴趣区域逐层映射到各层系数中影响该区域的范围
+
+    每一层的系数范围由上一层的范围折半并向两侧扩展一个滤波器长度, 保证逆变换时该区域用到的
+    系数都包含在内(略为保守)。
+
+    Args:
+        roi: 感兴趣区域 (x0, y0, x1, y1), 图像像素坐标, 不含 x1, y1
+        wavelet: 小波名称
+        block_size: 每一层系数的尺寸
+
+    Returns:
+        footprints: 每一层的系数范围 [(row_start, row_end, col_start, col_end), ...]
+    """
+    x0, y0, x1, y1 = roi
+    if not (x0 < x1 and y0 < y1):
+        raise ValueError(f"Empty region of interest: {roi}.")
+    filter_length = 5 if is_integer_wavelet(wavelet) else pywt.Wavelet(wavelet).dec_len
+    row_start, row_end, col_start, col_end = y0, y1, x0, x1
+    footprints = []
+    for rows, cols in block_size:
+        row_start, row_end = max(0, (row_start - filter_length) // 2), min(rows, (row_end + filter_length) // 2 + 1)
+        col_start, col_end = max(0, (col_start - filter_length) // 2), min(cols, (col_end + filter_length) // 2 + 1)
+        footprints.append((row_start, row_end, col_start, col_end))
+    return footprints
+
+def image_extent(start, end, level, wavelet, length):
+    """把某一层系数的范围映射到逆变换后图像中受其影响的范围, 与 roi_footprint 相反
+
+    每向上一层范围加倍并向两侧扩展一个滤波器长度(略为保守), 该范围之外的像素不受这些系数影响。
+
+    Args:
+        start: 系数范围的起点
+        end: 系数范围的终点(不含)
+        level: 系数所在的层级, 0 为最浅一层
+        wavelet: 小波名称
+        length: 图像在该方向上的长度
+
+    Returns:
+        start: 图像中受影响范围的起点
+        end: 图像中受影响范围的终点(不含)
+    """
+    filter_length = 5 if is_integer_wavelet(wavelet) else pywt.Wavelet(wavelet).dec_len
+    for _ in range(level + 1):
+        start, end = 2 * start - filter_length, 2 * end + filter_length
+    return max(0, start), min(length, end)